@@ -1,8 +1,14 @@
 """Shared Azure OpenAI client and helpers used by all agents."""
 
+import contextvars
 import json
 import os
-from openai import AzureOpenAI
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from agents.client_pool import build_pool
 
 def _get_config_value(name: str) -> str | None:
     value = os.getenv(name)
@@ -30,29 +36,148 @@ def _get_required_env(name: str) -> str:
     return value
 
 
-ENDPOINT = _get_required_env("AZURE_OPENAI_ENDPOINT")
 DEPLOYMENT = _get_config_value("AZURE_OPENAI_DEPLOYMENT") or "gpt-5.2-chat"
-SUBSCRIPTION_KEY = _get_required_env("AZURE_OPENAI_API_KEY")
 API_VERSION = _get_config_value("AZURE_OPENAI_API_VERSION") or "2024-12-01-preview"
 
-client = AzureOpenAI(
-    api_version=API_VERSION,
-    azure_endpoint=ENDPOINT,
-    api_key=SUBSCRIPTION_KEY,
-)
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+USAGE_LOG_PATH = SRC_DIR / "extraction_output" / "token_usage_log.jsonl"
+OCR_USAGE_LOG_PATH = SRC_DIR / "ocr_output" / "token_usage_log.jsonl"
+LATENCY_SEED_BYTES = 256_000
+
+
+def _seed_latencies(pool) -> None:
+    """Prime the pool's per-stage latency windows (hedge thresholds) from recent usage logs."""
+    for path in (OCR_USAGE_LOG_PATH, USAGE_LOG_PATH):
+        try:
+            with open(path, "rb") as f:
+                f.seek(0, 2)
+                f.seek(max(0, f.tell() - LATENCY_SEED_BYTES))
+                lines = f.read().decode("utf-8", errors="ignore").splitlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except Exception:
+                continue
+            if entry.get("stage") and isinstance(entry.get("latency_seconds"), (int, float)):
+                pool.record_latency(entry["stage"], float(entry["latency_seconds"]))
+
+
+class _SharedPool:
+    """
+    The pool shared by every agent, built on first use: the endpoint and key are
+    only required once a call is made, so routing, OCR helpers and --dry-run
+    estimates work without credentials.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # A single member unless AZURE_OPENAI_POOL lists more.
+                    pool = build_pool(
+                        _get_config_value("AZURE_OPENAI_POOL"),
+                        _get_required_env("AZURE_OPENAI_ENDPOINT"),
+                        _get_required_env("AZURE_OPENAI_API_KEY"),
+                        DEPLOYMENT,
+                        API_VERSION,
+                        _get_config_value,
+                    )
+                    _seed_latencies(pool)
+                    self._pool = pool
+        return self._pool
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+
+client = _SharedPool()
+
+
+# Document attributes (file, doc_type) stamped on usage log entries made inside usage_context().
+_usage_fields: contextvars.ContextVar[dict] = contextvars.ContextVar("usage_fields", default={})
+
+
+@contextmanager
+def usage_context(**fields):
+    """Tag every token usage entry logged in this block with the given fields."""
+    token = _usage_fields.set({**_usage_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _usage_fields.reset(token)
+
+
+def usage_fields() -> dict:
+    return dict(_usage_fields.get())
+
+
+def _extract_usage_dict(completion: object) -> dict | None:
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return None
+
+    if isinstance(usage, dict):
+        fields = {k: usage.get(k) for k in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    else:
+        fields = {k: getattr(usage, k, None) for k in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+    if all(v is None for v in fields.values()):
+        return None
+    return fields
+
+
+def log_token_usage(completion: object, request_mode: str, deployment: str, tier: str | None = None, **extra) -> None:
+    """Append one call's token usage to extraction_output/token_usage_log.jsonl."""
+    usage = _extract_usage_dict(completion)
+    if not usage:
+        return
+
+    entry = {
+        "timestamp_utc": datetime.now(timezone.utc).isoformat(),
+        "request_mode": request_mode,
+        "model": deployment,
+        "tier": tier,
+        **client.last_call(),
+        **usage_fields(),
+        **extra,
+        **usage,
+    }
+    try:
+        USAGE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(USAGE_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except Exception:
+        pass
 
 
-def call_extraction_agent(system_prompt: str, user_prompt: str, ocr_json_str: str) -> str:
+def call_extraction_agent(
+    system_prompt: str,
+    user_prompt: str,
+    ocr_json_str: str,
+    deployment: str | None = None,
+    tier: str | None = None,
+    request_mode: str = "extraction_from_ocr",
+) -> str:
     """Send OCR JSON to an extraction agent and return raw response text."""
+    deployment = deployment or DEPLOYMENT
     try:
         completion = client.chat.completions.create(
-            model=DEPLOYMENT,
+            stage="repair" if request_mode == "field_repair" else "extract",
+            model=deployment,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt + ocr_json_str},
             ],
             temperature=1.0,
         )
+        log_token_usage(completion, request_mode, deployment, tier, ocr_payload_chars=len(ocr_json_str))
         return completion.choices[0].message.content or ""
     except Exception as e:
         return json.dumps(
@@ -1,13 +1,14 @@
 """LLM-based document classifier. Reads OCR JSON and returns a document type label."""
 
+import json
 import re
 
-from agents import client, DEPLOYMENT
+from agents import client, log_token_usage, _get_config_value
+from agents.routing import route
+from agents import doc_type_model
+from agents.ocr_text import load_ocr, iter_sections, build_header_excerpt, estimate_tokens
 
-CLASSIFIER_PROMPT = """
-You are a document classifier. You receive OCR output (JSON) from a scanned financial document.
-
-Your ONLY task is to classify the document into exactly ONE of these categories:
+CATEGORY_GUIDE = """
 
 - "commercial_invoice"   : Product/goods invoices with barcodes, PO numbers, shipping terms, product line items
 - "travel"               : Flight tickets, travel agency invoices, itineraries with passenger/routing info
@@ -30,10 +31,26 @@ CLASSIFICATION HINTS:
 - If you see bank name, account transactions, debit/credit columns, running balance → "bank_statement"
 - If you see "Credit Note" or "CN" in the title → "credit_note"
 - Travel agency invoices for hotel bookings (with hotel name, check-in, room type but issued by a travel agent) → "travel"
+"""
 
+CLASSIFIER_PROMPT = """
+You are a document classifier. You receive an OCR excerpt (headers, key/value pairs, table headers) from a scanned financial document.
+
+Your ONLY task is to classify the document into exactly ONE of these categories:
+""" + CATEGORY_GUIDE + """
 Return ONLY the category label as a single word. No JSON. No explanation.
 """
 
+BATCH_CLASSIFIER_PROMPT = """
+You are a document classifier. You receive OCR excerpts from SEVERAL scanned financial documents.
+Each document starts with a line "=== DOCUMENT <id> ===".
+
+Your ONLY task is to classify EACH document into exactly ONE of these categories:
+""" + CATEGORY_GUIDE + """
+Classify every document independently. Return ONLY a JSON array with one object per document,
+in the order given: [{"id": <id>, "label": "<category>"}]. No markdown. No explanation.
+"""
+
 VALID_LABELS = {
     "commercial_invoice", "travel", "rental", "hotel",
     "utility", "soa", "bank_statement", "credit_note", "unknown",
@@ -76,7 +93,7 @@ ALIAS_MAP = {
 
 KEYWORD_RULES = [
     ("credit_note", ["credit note", "credit memo", "refund note", "cn"]),
-    ("utility", ["utility", "electricity", "water", "gas", "telecom", "telephone", "telefon", "meter", "kwh", "tariff", "sewerage", "indah water", "bil air", "bil telefon", "broadband", "wifi", "internet usage", "broadband usage", "monthly charges", "current charges", "billing period"]),
+    ("utility", ["utility", "electricity", "water", "gas", "telecom", "telephone", "telefon", "meter", "kwh", "tariff", "sewerage", "indah water", "bil air", "bil elektrik", "bil telefon", "broadband", "wifi", "internet usage", "broadband usage", "monthly charges", "current charges", "billing period"]),
     ("bank_statement", ["bank statement", "running balance", "account transactions", "opening balance", "closing balance"]),
     ("soa", ["statement of account", "outstanding", "aging", "balance brought forward"]),
     ("hotel", ["hotel", "folio", "check-in", "check out", "room charge", "guest"]),
@@ -86,12 +103,122 @@ KEYWORD_RULES = [
 ]
 
 
-def _keyword_match_label(text: str) -> str:
-    lower_text = (text or "").lower()
+# Term weights: alias phrases are document titles ("statement of account"), so they
+# carry more signal than the loose hint keywords in KEYWORD_RULES.
+ALIAS_TERM_WEIGHT = 2.0
+KEYWORD_TERM_WEIGHT = 1.0
+
+# Generic words that appear on almost every financial document.
+GENERIC_TERM_WEIGHTS = {
+    "invoice": 0.25,
+    "tax invoice": 0.5,
+    "cn": 0.5,
+}
+
+# Where a term is found matters: the first header of page 1 is usually the title.
+TITLE_WEIGHT = 4.0
+SECTION_WEIGHTS = {
+    "header": 2.5,
+    "key_value": 1.5,
+    "table_header": 1.5,
+    "subtotal": 1.0,
+    "table_row": 1.0,
+    "paragraph": 1.0,
+    "address": 0.5,
+    "footer": 0.5,
+}
+
+# Skip the LLM when the local winner leads the runner-up by at least this share of its
+# score and has enough evidence on its own (e.g. a title hit or several header hits).
+LOCAL_MARGIN_THRESHOLD = float(_get_config_value("CLASSIFIER_LOCAL_MARGIN") or 0.5)
+LOCAL_MIN_SCORE = float(_get_config_value("CLASSIFIER_LOCAL_MIN_SCORE") or 3.0)
+
+# Trust the offline-trained model (agents/doc_type_model.py) at or above this probability.
+MODEL_MIN_PROBABILITY = float(_get_config_value("CLASSIFIER_MODEL_MIN_PROB") or 0.8)
+
+
+def _build_term_table() -> dict[str, list[tuple[str, float]]]:
+    table: dict[str, dict[str, float]] = {}
     for canonical, keywords in KEYWORD_RULES:
-        if any(keyword in lower_text for keyword in keywords):
-            return canonical
-    return "unknown"
+        for keyword in keywords:
+            table.setdefault(keyword, {})
+            table[keyword][canonical] = max(table[keyword].get(canonical, 0.0), KEYWORD_TERM_WEIGHT)
+    for alias, canonical in ALIAS_MAP.items():
+        table.setdefault(alias, {})
+        table[alias][canonical] = max(table[alias].get(canonical, 0.0), ALIAS_TERM_WEIGHT)
+    for term, weight in GENERIC_TERM_WEIGHTS.items():
+        for canonical in table.get(term, {}):
+            table[term][canonical] = weight
+    return {term: list(labels.items()) for term, labels in table.items()}
+
+
+TERM_LABELS = _build_term_table()
+
+# One alternation over every term, longest first so "tax invoice" wins over "invoice".
+# Word boundaries stop short terms such as "cn" or "gas" matching inside other words.
+TERM_PATTERN = re.compile(
+    r"(?<![a-z0-9])("
+    + "|".join(
+        re.escape(term).replace(r"\ ", r"\s+")
+        for term in sorted(TERM_LABELS, key=len, reverse=True)
+    )
+    + r")(?![a-z0-9])",
+    re.IGNORECASE,
+)
+
+
+def _weighted_texts(ocr_json_str: str) -> list[tuple[str, float]]:
+    sections = iter_sections(load_ocr(ocr_json_str))
+    if not sections:
+        return [(ocr_json_str or "", 1.0)]
+
+    weighted: list[tuple[str, float]] = []
+    title_seen = False
+    for page_idx, section in sections:
+        sec_type = str(section.get("type") or "")
+        weight = SECTION_WEIGHTS.get(sec_type, 1.0)
+        if sec_type == "header" and page_idx == 0 and not title_seen:
+            weight = TITLE_WEIGHT
+            title_seen = True
+        weighted.append((str(section.get("content") or ""), weight))
+    return weighted
+
+
+def score_document(ocr_json_str: str) -> tuple[str, float, dict[str, float]]:
+    """
+    Score every label from keyword and alias hits in the OCR output.
+
+    Each distinct term counts once, weighted by the most prominent section it
+    appears in (title > header > key/value and table headers > body text).
+
+    Returns:
+        (best_label, margin, scores) where margin is (best - runner_up) / best.
+    """
+    best_weight: dict[str, float] = {}
+    for text, section_weight in _weighted_texts(ocr_json_str):
+        for match in TERM_PATTERN.finditer(text):
+            term = re.sub(r"\s+", " ", match.group(1).lower())
+            if section_weight > best_weight.get(term, 0.0):
+                best_weight[term] = section_weight
+
+    scores: dict[str, float] = {}
+    for term, section_weight in best_weight.items():
+        for canonical, term_weight in TERM_LABELS.get(term, []):
+            scores[canonical] = scores.get(canonical, 0.0) + term_weight * section_weight
+
+    if not scores:
+        return "unknown", 0.0, scores
+
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    best_label, best_score = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+    margin = (best_score - runner_up) / best_score if best_score > 0 else 0.0
+    return best_label, margin, scores
+
+
+def _keyword_match_label(text: str) -> str:
+    label, _margin, _scores = score_document(text)
+    return label
 
 
 def _normalize_label(text: str) -> str:
@@ -103,36 +230,65 @@ def _normalize_label(text: str) -> str:
     if cleaned in ALIAS_MAP:
         return ALIAS_MAP[cleaned]
 
-    for canonical, keywords in KEYWORD_RULES:
-        if any(keyword in cleaned for keyword in keywords):
-            return canonical
+    return _keyword_match_label(cleaned)
 
-    return "unknown"
+
+# Batch classification: excerpts are packed into one request up to this prompt budget.
+BATCH_TOKEN_BUDGET = int(_get_config_value("CLASSIFIER_BATCH_TOKEN_BUDGET") or 12000)
+BATCH_MAX_DOCUMENTS = 50
+
+# The LLM only sees the first pages' headers, key/values and table headers.
+EXCERPT_TOKEN_BUDGET = int(_get_config_value("CLASSIFIER_EXCERPT_TOKENS") or 600)
+
+
+def _local_label(ocr_json_str: str) -> tuple[str | None, str]:
+    """
+    Run the local stages (trained model, keyword scoring).
+
+    Returns:
+        (confident_label or None, keyword_guess) — the guess is the fallback when the LLM fails.
+    """
+    # Offline-trained model first, if one has been trained and is confident.
+    model_label, model_prob = doc_type_model.predict(ocr_json_str)
+    if model_label in VALID_LABELS and model_label != "unknown" and model_prob >= MODEL_MIN_PROBABILITY:
+        return model_label, model_label
+
+    # Deterministic local scoring; only ambiguous documents go to the LLM.
+    keyword_guess, margin, scores = score_document(ocr_json_str)
+    if (
+        keyword_guess != "unknown"
+        and margin >= LOCAL_MARGIN_THRESHOLD
+        and scores.get(keyword_guess, 0.0) >= LOCAL_MIN_SCORE
+    ):
+        return keyword_guess, keyword_guess
+    return None, keyword_guess
 
 
 def classify_document(ocr_json_str: str) -> str:
     """Classify the OCR output into a document type. Returns the category label string."""
-    ocr_excerpt = ocr_json_str[:12000]
-
-    # Fast deterministic fallback based on OCR text itself.
-    keyword_guess = _keyword_match_label(ocr_excerpt)
+    local_label, keyword_guess = _local_label(ocr_json_str)
+    if local_label:
+        return local_label
 
+    tier, deployment = route("classify")
     try:
         completion = client.chat.completions.create(
-            model=DEPLOYMENT,
+            stage="classify",
+            model=deployment,
             messages=[
                 {"role": "system", "content": CLASSIFIER_PROMPT},
                 {
                     "role": "user",
                     "content": (
                         "Classify this document. Return ONLY the category label.\n\n"
-                        "OCR OUTPUT:\n" + ocr_json_str[:8000]  # Truncate to save tokens — headers are enough
+                        "OCR EXCERPT:\n" + build_header_excerpt(ocr_json_str, EXCERPT_TOKEN_BUDGET)
                     ),
                 },
             ],
             temperature=1.0,
             max_tokens=20,
         )
+        log_token_usage(completion, "classification", deployment, tier)
         raw = completion.choices[0].message.content or ""
         normalized = _normalize_label(raw)
         if normalized != "unknown":
@@ -143,3 +299,114 @@ def classify_document(ocr_json_str: str) -> str:
     except Exception:
         # Fallback even when LLM classification fails (auth/content filter/transient errors).
         return keyword_guess
+
+
+def _pack_batches(excerpts: dict[int, str], token_budget: int) -> list[list[int]]:
+    """Group document indices so each batch's excerpts stay within the token budget."""
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for idx, excerpt in excerpts.items():
+        tokens = estimate_tokens(excerpt)
+        if current and (current_tokens + tokens > token_budget or len(current) >= BATCH_MAX_DOCUMENTS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(idx)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_batch_labels(raw: str, ids: list[int]) -> dict[int, str]:
+    """Parse the model's JSON array into {id: normalized label}; tolerant of fences and bare strings."""
+    text = raw.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    try:
+        parsed = json.loads(text)
+    except Exception:
+        match = re.search(r"\[.*\]", text, re.DOTALL)
+        if not match:
+            return {}
+        try:
+            parsed = json.loads(match.group(0))
+        except Exception:
+            return {}
+    if not isinstance(parsed, list):
+        return {}
+
+    labels: dict[int, str] = {}
+    for position, entry in enumerate(parsed):
+        if isinstance(entry, dict):
+            try:
+                doc_id = int(entry.get("id"))
+            except (TypeError, ValueError):
+                doc_id = ids[position] if position < len(ids) else None
+            label = entry.get("label")
+        else:
+            doc_id = ids[position] if position < len(ids) else None
+            label = entry
+        if doc_id in ids:
+            labels[doc_id] = _normalize_label(str(label or ""))
+    return labels
+
+
+def _classify_batch(excerpts: dict[int, str]) -> dict[int, str]:
+    ids = list(excerpts)
+    body = "\n\n".join(f"=== DOCUMENT {idx} ===\n{excerpts[idx]}" for idx in ids)
+    tier, deployment = route("classify")
+    try:
+        completion = client.chat.completions.create(
+            stage="classify",
+            model=deployment,
+            messages=[
+                {"role": "system", "content": BATCH_CLASSIFIER_PROMPT},
+                {
+                    "role": "user",
+                    "content": (
+                        f"Classify these {len(ids)} documents. Return ONLY the JSON array.\n\n" + body
+                    ),
+                },
+            ],
+            temperature=1.0,
+            max_tokens=16 * len(ids) + 32,
+        )
+        log_token_usage(completion, "classification_batch", deployment, tier, document_count=len(ids))
+        return _parse_batch_labels(completion.choices[0].message.content or "", ids)
+    except Exception:
+        return {}
+
+
+def classify_documents(ocr_json_strs: list[str], token_budget: int | None = None) -> list[str]:
+    """
+    Classify many OCR outputs, packing the ones the local stages can't settle into
+    as few LLM requests as the token budget allows.
+
+    Args:
+        ocr_json_strs: Raw OCR JSON strings.
+        token_budget: Max estimated prompt tokens of excerpts per request.
+
+    Returns:
+        One category label per input, in input order.
+    """
+    token_budget = token_budget or BATCH_TOKEN_BUDGET
+    labels: list[str] = ["unknown"] * len(ocr_json_strs)
+    fallbacks: list[str] = ["unknown"] * len(ocr_json_strs)
+    excerpts: dict[int, str] = {}
+
+    for idx, ocr_json_str in enumerate(ocr_json_strs):
+        local_label, keyword_guess = _local_label(ocr_json_str)
+        if local_label:
+            labels[idx] = local_label
+        else:
+            fallbacks[idx] = keyword_guess
+            excerpts[idx] = build_header_excerpt(ocr_json_str, EXCERPT_TOKEN_BUDGET)
+
+    for batch in _pack_batches(excerpts, token_budget):
+        batch_labels = _classify_batch({idx: excerpts[idx] for idx in batch})
+        for idx in batch:
+            label = batch_labels.get(idx, "unknown")
+            labels[idx] = label if label != "unknown" else fallbacks[idx]
+
+    return labels
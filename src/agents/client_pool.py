@@ -0,0 +1,478 @@
+"""
+Pool of Azure OpenAI endpoints behind one client-shaped object.
+
+The pool is a drop-in for an AzureOpenAI client: callers keep using
+`client.chat.completions.create(model=..., messages=...)`. Each request goes
+to the least-loaded healthy member (in-flight requests divided by weight)
+that serves the requested model, with `model` rewritten to that member's own
+deployment name, so endpoints may name their deployments differently. A member that answers with a
+429, a 5xx or a connection error is taken out of rotation for a cool-down
+(Retry-After when the service sends one, else exponential backoff) and the
+request is retried on another member. Once every member has been tried, the
+request waits for the first cool-down to end (at most RETRY_WAIT_MAX_SECONDS)
+and goes round again, up to LLM_RETRIES times, so a single-endpoint pool still
+rides out a 429 or a transient 5xx like the SDK's own retries did.
+
+Calls may name their pipeline stage (create(stage="ocr", ...)). The pool keeps
+a rolling window of latencies per stage and applies two tail-latency controls:
+  - a per-stage deadline (opt-in): the whole call, failovers and hedges
+    included, is abandoned with TimeoutError once the deadline passes. The
+    clock starts when the call is first sent to a member, so time spent
+    queueing for a call thread under load does not count;
+  - hedging (opt-in): when a call has not returned by the stage's p95 latency,
+    a duplicate is sent, normally to another member, and the first answer wins.
+    Hedges are limited to a fraction of requests so extra spend stays bounded.
+
+Config:
+    AZURE_OPENAI_POOL   JSON list of members, e.g.
+        [{"endpoint": "https://a.openai.azure.com/", "api_key_env": "AZURE_KEY_A",
+          "deployment": "gpt-5.2-chat", "weight": 2},
+         {"endpoint": "https://b.openai.azure.com/", "api_key": "...",
+          "deployment": "gpt52-eastus", "model": "gpt-5.2-chat",
+          "api_version": "2024-12-01-preview"}]
+    "model" is the name callers pass as model= (default: the member's deployment).
+    When unset, the pool has one member built from AZURE_OPENAI_ENDPOINT,
+    AZURE_OPENAI_API_KEY and AZURE_OPENAI_DEPLOYMENT.
+    LLM_DEADLINES       "1" enables STAGE_DEADLINES; JSON {stage: seconds} enables them with overrides
+    LLM_HEDGING         "1" enables hedged requests
+    LLM_HEDGE_BUDGET    max hedges as a fraction of requests (default 0.05)
+    LLM_RETRIES         rounds over the members after all have failed (default 2)
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+
+from openai import AzureOpenAI
+
+COOLDOWN_BASE_SECONDS = 10.0
+COOLDOWN_MAX_SECONDS = 120.0
+RETRYABLE_STATUS = {408, 409, 429}
+DEFAULT_RETRIES = 2
+RETRY_WAIT_MAX_SECONDS = 10.0
+
+# Seconds a call of each stage may take in total (failovers and hedges included),
+# when LLM_DEADLINES enables deadlines. Generous: a large-tier extraction of a long
+# document legitimately takes minutes.
+STAGE_DEADLINES: dict[str, float] = {
+    "ocr": 180.0,
+    "ocr_batch": 900.0,
+    "classify": 60.0,
+    "extract": 600.0,
+    "repair": 120.0,
+}
+HEDGE_STAGES = {"ocr", "ocr_batch", "extract"}
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 0.95
+LATENCY_WINDOW = 200
+
+
+def _status_code(error: Exception) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: Exception) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value:
+            return float(value) / 1000
+        value = headers.get("retry-after")
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Throttling, server errors and connection problems are worth retrying elsewhere."""
+    status = _status_code(error)
+    if status is None:
+        name = type(error).__name__
+        return name in {"APIConnectionError", "APITimeoutError"} or isinstance(error, (ConnectionError, TimeoutError))
+    return status in RETRYABLE_STATUS or status >= 500
+
+
+class _Deadline:
+    """
+    One logical call's deadline. It starts when the first attempt is sent to a
+    member, not when the call is queued for a worker thread.
+    """
+
+    def __init__(self, seconds: float | None):
+        self.seconds = seconds
+        self.at: float | None = None
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.at is None and self.seconds:
+                self.at = time.monotonic() + self.seconds
+        self.started.set()
+
+    def remaining(self) -> float | None:
+        return None if self.at is None else self.at - time.monotonic()
+
+    def passed(self) -> bool:
+        return self.at is not None and time.monotonic() >= self.at
+
+
+class PoolMember:
+    def __init__(self, name: str, client: object, deployment: str, weight: float = 1.0, model: str | None = None):
+        self.name = name
+        self.client = client
+        self.deployment = deployment
+        self.model = model or deployment
+        self.weight = max(weight, 0.01)
+        self.in_flight = 0
+        self.requests = 0
+        self.successes = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.other_errors = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.total_latency = 0.0
+        self.total_tokens = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def load(self) -> float:
+        return self.in_flight / self.weight
+
+    def metrics(self, now: float) -> dict:
+        return {
+            "member": self.name,
+            "model": self.model,
+            "deployment": self.deployment,
+            "weight": self.weight,
+            "healthy": self.healthy(now),
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - now), 1),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "server_errors": self.server_errors,
+            "other_errors": self.other_errors,
+            "avg_latency_seconds": round(self.total_latency / self.successes, 2) if self.successes else None,
+            "total_tokens": self.total_tokens,
+        }
+
+
+class ClientPool:
+    """Load-balancing, failover wrapper exposing chat.completions.create()."""
+
+    def __init__(
+        self,
+        members: list[PoolMember],
+        deadlines: dict[str, float] | None = None,
+        hedging: bool = False,
+        hedge_budget: float = 0.05,
+        retries: int = DEFAULT_RETRIES,
+    ):
+        if not members:
+            raise ValueError("ClientPool needs at least one member")
+        self.members = members
+        self.deadlines = dict(deadlines or {})
+        self.hedging = hedging
+        self.hedge_budget = hedge_budget
+        self.retries = max(0, retries)
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque] = {}
+        self._stage_stats: dict[str, dict] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._local = threading.local()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _candidates(self, model: str | None) -> list[PoolMember]:
+        """Members serving the requested model (any member when the call names none)."""
+        if model is None:
+            return self.members
+        matching = [m for m in self.members if m.model == model]
+        if not matching:
+            raise RuntimeError(
+                f"No AZURE_OPENAI_POOL member serves model {model!r} "
+                f"(configured: {sorted({m.model for m in self.members})})"
+            )
+        return matching
+
+    def _acquire(self, model: str | None, tried: set[int]) -> PoolMember | None:
+        with self._lock:
+            now = time.monotonic()
+            candidates = [m for m in self._candidates(model) if id(m) not in tried]
+            if not candidates:
+                return None
+            healthy = [m for m in candidates if m.healthy(now)]
+            # Everyone cooling down: use the member that recovers first rather than failing outright.
+            pool = healthy or [min(candidates, key=lambda m: m.cooldown_until)]
+            member = min(pool, key=lambda m: (m.load(), -m.weight))
+            member.in_flight += 1
+            member.requests += 1
+            return member
+
+    def _retry_wait(self, model: str | None) -> float:
+        """Seconds until the first member serving the model is out of its cool-down (capped)."""
+        with self._lock:
+            recovers_at = min(m.cooldown_until for m in self._candidates(model))
+        return min(max(0.0, recovers_at - time.monotonic()), RETRY_WAIT_MAX_SECONDS)
+
+    def _release(self, member: PoolMember, started: float, completion: object = None, error: Exception | None = None) -> None:
+        with self._lock:
+            member.in_flight -= 1
+            if error is None:
+                member.successes += 1
+                member.consecutive_failures = 0
+                member.total_latency += time.monotonic() - started
+                usage = getattr(completion, "usage", None)
+                member.total_tokens += int(getattr(usage, "total_tokens", 0) or 0)
+                return
+
+            status = _status_code(error)
+            if status == 429:
+                member.throttled += 1
+            elif status is None or status >= 500:
+                member.server_errors += 1
+            else:
+                member.other_errors += 1
+            if is_retryable(error):
+                member.consecutive_failures += 1
+                backoff = COOLDOWN_BASE_SECONDS * 2 ** (member.consecutive_failures - 1)
+                cooldown = _retry_after(error) or min(backoff, COOLDOWN_MAX_SECONDS)
+                member.cooldown_until = time.monotonic() + cooldown
+
+    def _stats(self, stage: str) -> dict:
+        return self._stage_stats.setdefault(
+            stage, {"requests": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+        )
+
+    def record_latency(self, stage: str, seconds: float) -> None:
+        """Add one observed call latency (also used to seed from usage logs)."""
+        with self._lock:
+            self._latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def percentile(self, stage: str, q: float = HEDGE_PERCENTILE) -> float | None:
+        with self._lock:
+            samples = sorted(self._latencies.get(stage) or [])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(q * (len(samples) - 1))]
+
+    def _hedge_allowed(self, stage: str) -> bool:
+        with self._lock:
+            stats = self._stats(stage)
+            total_requests = sum(st["requests"] for st in self._stage_stats.values())
+            total_hedges = sum(st["hedges"] for st in self._stage_stats.values())
+            if total_hedges + 1 > self.hedge_budget * total_requests:
+                return False
+            stats["hedges"] += 1
+            return True
+
+    def _call(self, kwargs: dict, deadline: _Deadline) -> tuple[object, PoolMember]:
+        """
+        One logical request: try members in order of load, failing over on
+        retryable errors; when all have failed, wait for the first to recover
+        and go round again (self.retries times).
+        """
+        deadline.start()
+        model = kwargs.get("model")
+        tried: set[int] = set()
+        rounds = 0
+        last_error: Exception | None = None
+        while True:
+            remaining = deadline.remaining()
+            if remaining is not None and remaining <= 0:
+                raise last_error or TimeoutError("LLM call deadline exceeded")
+            member = self._acquire(model, tried)
+            if member is None:
+                if last_error is None or rounds >= self.retries:
+                    raise last_error or RuntimeError("No pool member available")
+                rounds += 1
+                wait_seconds = self._retry_wait(model)
+                time.sleep(wait_seconds if remaining is None else min(wait_seconds, remaining))
+                tried.clear()
+                continue
+            tried.add(id(member))
+            call_kwargs = {**kwargs, "model": member.deployment}
+            if remaining is not None:
+                call_kwargs["timeout"] = remaining
+            started = time.monotonic()
+            try:
+                completion = member.client.chat.completions.create(**call_kwargs)
+            except Exception as e:
+                self._release(member, started, error=e)
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                continue
+            self._release(member, started, completion=completion)
+            return completion, member
+
+    def _call_hedged(self, stage: str, kwargs: dict, deadline: _Deadline, hedge_after: float | None) -> tuple[object, PoolMember, bool]:
+        """
+        Run the call on a worker thread so the deadline holds even if the HTTP
+        timeout does not, and hedge it after hedge_after seconds when given.
+        Both clocks start once a worker thread has sent the call.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+        primary = self._executor.submit(self._call, kwargs, deadline)
+        deadline.started.wait()
+        done = set()
+        if hedge_after is not None:
+            done, _ = wait([primary], timeout=hedge_after)
+        if done or hedge_after is None or not self._hedge_allowed(stage):
+            remaining = deadline.remaining()
+            completion, member = primary.result(timeout=None if remaining is None else max(0.0, remaining))
+            return completion, member, False
+
+        hedge = self._executor.submit(self._call, kwargs, deadline)
+        pending = {primary, hedge}
+        error: BaseException | None = None
+        while pending:
+            remaining = deadline.remaining()
+            remaining = None if remaining is None else max(0.0, remaining)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    # The losing call is left to finish in the background; its answer is dropped.
+                    completion, member = future.result()
+                    if future is hedge:
+                        with self._lock:
+                            self._stats(stage)["hedge_wins"] += 1
+                    return completion, member, True
+                error = future.exception()
+        raise error or TimeoutError(f"{stage} call exceeded its deadline")
+
+    def create(self, stage: str | None = None, **kwargs) -> object:
+        """
+        Send a chat completion to the best member, failing over on retryable
+        errors, within the stage deadline and hedged at the stage's p95 latency.
+        """
+        stage = stage or "default"
+        deadline = _Deadline(self.deadlines.get(stage))
+        started = time.monotonic()
+        with self._lock:
+            self._stats(stage)["requests"] += 1
+
+        hedge_after = self.percentile(stage) if self.hedging and stage in HEDGE_STAGES else None
+        try:
+            if hedge_after is None and not deadline.seconds:
+                completion, member = self._call(kwargs, deadline)
+                hedged = False
+            else:
+                completion, member, hedged = self._call_hedged(stage, kwargs, deadline, hedge_after)
+        except Exception as e:
+            if deadline.passed():
+                with self._lock:
+                    self._stats(stage)["deadline_exceeded"] += 1
+                raise TimeoutError(f"{stage} call exceeded its {deadline.seconds:g}s deadline") from e
+            raise
+
+        latency = time.monotonic() - started
+        self.record_latency(stage, latency)
+        self._local.last_call = {
+            "stage": stage,
+            "endpoint": member.name,
+            "latency_seconds": round(latency, 3),
+            "hedged": hedged,
+        }
+        return completion
+
+    def last_call(self) -> dict:
+        """Endpoint, latency and hedging of the calling thread's most recent request."""
+        return dict(getattr(self._local, "last_call", None) or {})
+
+    def stage_metrics(self) -> list[dict]:
+        """Per-stage request counts, p50/p95 latency, hedges and deadline misses."""
+        rows = []
+        for stage in sorted(set(self._stage_stats) | set(self._latencies)):
+            with self._lock:
+                stats = dict(self._stats(stage))
+                samples = len(self._latencies.get(stage) or [])
+            rows.append({
+                "stage": stage,
+                **stats,
+                "samples": samples,
+                "p50_seconds": self.percentile(stage, 0.5),
+                "p95_seconds": self.percentile(stage),
+                "deadline_seconds": self.deadlines.get(stage),
+            })
+        return rows
+
+    def metrics(self) -> list[dict]:
+        """Per-member health, load, error and latency counters."""
+        with self._lock:
+            now = time.monotonic()
+            return [m.metrics(now) for m in self.members]
+
+
+def build_pool(
+    pool_config: str | None,
+    endpoint: str,
+    api_key: str,
+    deployment: str,
+    api_version: str,
+    get_config=None,
+) -> ClientPool:
+    """
+    Build the pool from AZURE_OPENAI_POOL JSON, or a single member from the
+    plain endpoint settings when no pool is configured. Deadline and hedging
+    settings are read through get_config.
+    """
+    get_config = get_config or (lambda _name: None)
+    entries = []
+    if pool_config:
+        try:
+            entries = [e for e in json.loads(pool_config) if isinstance(e, dict) and e.get("endpoint")]
+        except Exception as e:
+            raise RuntimeError(f"Invalid AZURE_OPENAI_POOL config: {e}") from e
+
+    if not entries:
+        entries = [{"endpoint": endpoint, "api_key": api_key, "deployment": deployment}]
+
+    members = []
+    for idx, entry in enumerate(entries, start=1):
+        key = entry.get("api_key")
+        if not key and entry.get("api_key_env"):
+            key = get_config(entry["api_key_env"])
+        client = AzureOpenAI(
+            api_version=entry.get("api_version") or api_version,
+            azure_endpoint=entry["endpoint"],
+            api_key=key or api_key,
+            max_retries=0,  # the pool does the failover
+        )
+        members.append(PoolMember(
+            name=entry.get("name") or f"{idx}:{entry['endpoint']}",
+            client=client,
+            deployment=entry.get("deployment") or deployment,
+            weight=float(entry.get("weight") or 1.0),
+            model=entry.get("model"),
+        ))
+
+    deadlines = {}
+    deadline_config = get_config("LLM_DEADLINES")
+    if deadline_config and deadline_config != "0":
+        deadlines = dict(STAGE_DEADLINES)
+        try:
+            overrides = json.loads(deadline_config)
+            if isinstance(overrides, dict):
+                deadlines.update({k: float(v) for k, v in overrides.items()})
+        except Exception:
+            pass
+    return ClientPool(
+        members,
+        deadlines=deadlines,
+        hedging=(get_config("LLM_HEDGING") or "0") == "1",
+        hedge_budget=float(get_config("LLM_HEDGE_BUDGET") or "0.05"),
+        retries=int(get_config("LLM_RETRIES") or DEFAULT_RETRIES),
+    )
@@ -0,0 +1,257 @@
+"""
+Lightweight document-type model trained offline on our own labelled OCR history.
+
+A hashing vectorizer over compacted OCR text feeds a multinomial logistic
+regression, implemented with NumPy only. The trained model is a single .npz file.
+
+Usage:
+    python -m agents.doc_type_model train
+    python -m agents.doc_type_model train --ocr-dir ocr_output --labels-dir extraction_output --labels-dir extraction_output_ori
+    python -m agents.doc_type_model predict ocr_output/TNB.json
+"""
+
+import argparse
+import json
+import re
+import sys
+import threading
+import zlib
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # the model stage is simply disabled without NumPy
+    np = None
+
+from agents import _get_config_value
+from agents.ocr_text import load_ocr, compact_text
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_MODEL_PATH = SRC_DIR / "models" / "doc_type_model.npz"
+
+N_FEATURES = 2 ** 14
+# Sections that identify the document get their own feature namespace.
+PROMINENT_SECTION_TYPES = {"header", "key_value", "table_header"}
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9\-]+")
+
+
+def _hash_token(token: str) -> int:
+    # crc32 is stable across processes, unlike the salted built-in hash().
+    return zlib.crc32(token.encode("utf-8")) % N_FEATURES
+
+
+def _features(text: str) -> list[str]:
+    features: list[str] = []
+    for line in text.splitlines():
+        sec_type, _, content = line.partition(": ")
+        if not content:
+            sec_type, content = "", line
+        words = TOKEN_PATTERN.findall(content.lower())
+        features.extend(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        if sec_type in PROMINENT_SECTION_TYPES:
+            features.extend(f"{sec_type}:{w}" for w in words)
+    return features
+
+
+def vectorize(texts: list[str]) -> "np.ndarray":
+    """Hash compacted OCR texts into L2-normalised log term-frequency rows."""
+    matrix = np.zeros((len(texts), N_FEATURES), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            matrix[row, _hash_token(feature)] += 1.0
+    np.log1p(matrix, out=matrix)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _softmax(logits: "np.ndarray") -> "np.ndarray":
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def train(
+    texts: list[str],
+    labels: list[str],
+    epochs: int = 300,
+    learning_rate: float = 0.5,
+    l2: float = 1e-3,
+) -> dict:
+    """Fit a multinomial logistic regression with full-batch gradient descent."""
+    classes = sorted(set(labels))
+    x = vectorize(texts)
+    y = np.zeros((len(labels), len(classes)), dtype=np.float32)
+    for row, label in enumerate(labels):
+        y[row, classes.index(label)] = 1.0
+
+    weights = np.zeros((N_FEATURES, len(classes)), dtype=np.float32)
+    bias = np.zeros(len(classes), dtype=np.float32)
+    for _ in range(epochs):
+        probs = _softmax(x @ weights + bias)
+        grad = (probs - y) / len(labels)
+        weights -= learning_rate * (x.T @ grad + l2 * weights)
+        bias -= learning_rate * grad.sum(axis=0)
+
+    return {"weights": weights, "bias": bias, "classes": classes}
+
+
+def save_model(model: dict, path: str | Path) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez_compressed(
+            f,
+            weights=model["weights"],
+            bias=model["bias"],
+            classes=np.array(model["classes"]),
+            n_features=np.array(N_FEATURES),
+        )
+
+
+_model_cache: dict[str, dict | None] = {}
+_model_lock = threading.Lock()
+
+
+def model_path() -> Path:
+    return Path(_get_config_value("CLASSIFIER_MODEL_PATH") or DEFAULT_MODEL_PATH)
+
+
+def load_model(path: str | Path | None = None) -> dict | None:
+    """Load the model once per process. Returns None when NumPy or the file is missing."""
+    path = Path(path) if path else model_path()
+    key = str(path)
+    if key in _model_cache:
+        return _model_cache[key]
+
+    with _model_lock:
+        if key not in _model_cache:
+            model = None
+            if np is not None and path.exists():
+                try:
+                    with np.load(path) as data:
+                        if int(data["n_features"]) == N_FEATURES:
+                            model = {
+                                "weights": data["weights"],
+                                "bias": data["bias"],
+                                "classes": [str(c) for c in data["classes"]],
+                            }
+                except Exception:
+                    model = None
+            _model_cache[key] = model
+    return _model_cache[key]
+
+
+def predict_proba(ocr_json_str: str, model: dict | None = None) -> dict[str, float]:
+    """Return {label: probability} for one OCR output, or {} when no model is available."""
+    model = model or load_model()
+    if model is None:
+        return {}
+    text = compact_text(load_ocr(ocr_json_str))
+    probs = _softmax(vectorize([text]) @ model["weights"] + model["bias"])[0]
+    return {label: float(p) for label, p in zip(model["classes"], probs)}
+
+
+def predict(ocr_json_str: str, model: dict | None = None) -> tuple[str, float]:
+    """Return (label, probability) of the most likely document type, or ("unknown", 0.0)."""
+    probs = predict_proba(ocr_json_str, model)
+    if not probs:
+        return "unknown", 0.0
+    label = max(probs, key=probs.get)
+    return label, probs[label]
+
+
+def _extraction_labels(labels_dirs: list[Path]) -> dict[str, str]:
+    """Map normalised extraction stems to classifier labels."""
+    from agents.classifier import _normalize_label
+
+    labels: dict[str, str] = {}
+    for labels_dir in labels_dirs:
+        if not labels_dir.exists():
+            continue
+        for path in sorted(labels_dir.glob("*.json")):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                continue
+            if not isinstance(data, dict) or not data.get("document_type"):
+                continue
+            label = _normalize_label(str(data["document_type"]))
+            if label != "unknown":
+                labels[_stem_key(path.stem)] = label
+    return labels
+
+
+def _stem_key(stem: str) -> str:
+    stem = re.sub(r"_extracted\d*$", "", stem)
+    return re.sub(r"[\s_\-]+", "", stem.lower())
+
+
+def load_training_data(ocr_dir: Path, labels_dirs: list[Path]) -> tuple[list[str], list[str], list[str]]:
+    """Pair ocr_dir/*.json with document_type labels from extraction outputs by file stem."""
+    labels = _extraction_labels(labels_dirs)
+    texts: list[str] = []
+    targets: list[str] = []
+    names: list[str] = []
+    for path in sorted(ocr_dir.glob("*.json")):
+        label = labels.get(_stem_key(path.stem))
+        if not label:
+            continue
+        text = compact_text(load_ocr(path.read_text(encoding="utf-8")))
+        if text:
+            texts.append(text)
+            targets.append(label)
+            names.append(path.name)
+    return texts, targets, names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train or query the local document-type model")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = sub.add_parser("train", help="Train from labelled OCR history")
+    train_parser.add_argument("--ocr-dir", default=str(SRC_DIR / "ocr_output"), help="Directory of OCR JSON files")
+    train_parser.add_argument("--labels-dir", action="append", default=None,
+                              help="Directory of extraction JSON files with document_type (repeatable)")
+    train_parser.add_argument("--output", "-o", default=None, help="Model file path (.npz)")
+    train_parser.add_argument("--epochs", type=int, default=300, help="Gradient descent epochs (default: 300)")
+
+    predict_parser = sub.add_parser("predict", help="Predict the type of one OCR JSON file")
+    predict_parser.add_argument("input", help="Path to OCR output JSON file")
+    predict_parser.add_argument("--model", default=None, help="Model file path (.npz)")
+    args = parser.parse_args()
+
+    if np is None:
+        print("ERROR: NumPy is required for the document-type model.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == "train":
+        labels_dirs = [Path(d) for d in (args.labels_dir or [str(SRC_DIR / "extraction_output")])]
+        texts, targets, names = load_training_data(Path(args.ocr_dir), labels_dirs)
+        if len(set(targets)) < 2:
+            print(f"ERROR: Need at least two labelled document types, found {sorted(set(targets))}.", file=sys.stderr)
+            sys.exit(1)
+
+        model = train(texts, targets, epochs=args.epochs)
+        output_path = Path(args.output) if args.output else model_path()
+        save_model(model, output_path)
+
+        predictions = _softmax(vectorize(texts) @ model["weights"] + model["bias"]).argmax(axis=1)
+        correct = sum(model["classes"][p] == t for p, t in zip(predictions, targets))
+        print(f"Trained on {len(texts)} document(s), {len(model['classes'])} type(s): {', '.join(model['classes'])}")
+        print(f"  Training accuracy: {correct}/{len(texts)}")
+        print(f"  Saved to: {output_path}")
+    else:
+        model = load_model(args.model)
+        if model is None:
+            print(f"ERROR: No model found at {args.model or model_path()}", file=sys.stderr)
+            sys.exit(1)
+        ocr_json_str = Path(args.input).read_text(encoding="utf-8")
+        for label, prob in sorted(predict_proba(ocr_json_str, model).items(), key=lambda kv: -kv[1]):
+            print(f"  {label:20s} {prob:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 """Extraction agent for BANK STATEMENTS — transaction listings from bank accounts."""
 
+from agents.schema import ExtractionSchema
+
 SYSTEM_PROMPT = """
 You are a data extraction engine specialized in BANK STATEMENTS — documents listing deposits, withdrawals, and account balances from a banking institution.
 
@@ -68,3 +70,13 @@ USER_PROMPT = (
     "Extract all fields per your instructions. Return a single valid JSON object.\n\n"
     "OCR OUTPUT:\n"
 )
+
+SCHEMA: ExtractionSchema = {
+    "required": ["bank_name", "account_number", "closing_balance"],
+    "money_fields": ["opening_balance", "closing_balance", "total_debits", "total_credits"],
+    "items_key": "transactions",
+    "item_required": ["date", "description"],
+    "item_money_fields": ["debit", "credit", "balance"],
+    "item_amount_field": "",
+    "items_total": [],
+}
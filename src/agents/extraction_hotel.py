@@ -1,5 +1,7 @@
 """Extraction agent for HOTEL INVOICES / FOLIOS (room charges, hotel bills)."""
 
+from agents.schema import ExtractionSchema
+
 SYSTEM_PROMPT = """
 You are a data extraction engine specialized in HOTEL INVOICES AND FOLIOS — room charges, F&B, laundry, and other hotel services.
 
@@ -72,3 +74,13 @@ USER_PROMPT = (
     "Extract all fields per your instructions. Return a single valid JSON object.\n\n"
     "OCR OUTPUT:\n"
 )
+
+SCHEMA: ExtractionSchema = {
+    "required": ["vendor_name", "invoice_number", "grand_total"],
+    "money_fields": ["subtotal", "tax_total", "advances", "grand_total"],
+    "items_key": "line_items",
+    "item_required": ["description", "amount"],
+    "item_money_fields": ["unit_price", "tax", "amount"],
+    "item_amount_field": "amount",
+    "items_total": ["subtotal", "grand_total"],
+}
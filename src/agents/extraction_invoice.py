@@ -1,5 +1,7 @@
 """Extraction agent for COMMERCIAL INVOICES (product/goods invoices with barcodes, PO numbers, shipping)."""
 
+from agents.schema import ExtractionSchema
+
 SYSTEM_PROMPT = """
 You are a data extraction engine specialized in COMMERCIAL INVOICES for product/goods shipments.
 
@@ -72,3 +74,13 @@ USER_PROMPT = (
     "Extract all fields per your instructions. Return a single valid JSON object.\n\n"
     "OCR OUTPUT:\n"
 )
+
+SCHEMA: ExtractionSchema = {
+    "required": ["vendor_name", "invoice_number", "invoice_date", "grand_total"],
+    "money_fields": ["subtotal", "tax_total", "freight_charges", "grand_total"],
+    "items_key": "line_items",
+    "item_required": ["description", "amount"],
+    "item_money_fields": ["unit_price", "discount", "tax", "amount"],
+    "item_amount_field": "amount",
+    "items_total": ["subtotal", "grand_total"],
+}
@@ -1,5 +1,7 @@
 """Extraction agent for RENTAL / LEASE INVOICES (mall rental, service charges, tenancy)."""
 
+from agents.schema import ExtractionSchema
+
 SYSTEM_PROMPT = """
 You are a data extraction engine specialized in RENTAL AND LEASE INVOICES — mall base rent, service charges, promotion charges, and tenancy-related billing.
 
@@ -74,3 +76,13 @@ USER_PROMPT = (
     "Extract all fields per your instructions. Return a single valid JSON object.\n\n"
     "OCR OUTPUT:\n"
 )
+
+SCHEMA: ExtractionSchema = {
+    "required": ["vendor_name", "invoice_number", "invoice_date", "grand_total"],
+    "money_fields": ["subtotal", "tax_total", "grand_total"],
+    "items_key": "line_items",
+    "item_required": ["description", "amount"],
+    "item_money_fields": ["tax", "amount"],
+    "item_amount_field": "amount",
+    "items_total": ["subtotal", "grand_total"],
+}
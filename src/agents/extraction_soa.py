@@ -1,5 +1,7 @@
 """Extraction agent for STATEMENTS OF ACCOUNT (SOA) — outstanding balance summaries, aging reports."""
 
+from agents.schema import ExtractionSchema
+
 SYSTEM_PROMPT = """
 You are a data extraction engine specialized in STATEMENTS OF ACCOUNT (SOA) — documents listing outstanding invoices, credits, payments, and balance summaries.
 
@@ -73,3 +75,13 @@ USER_PROMPT = (
     "Extract all fields per your instructions. Return a single valid JSON object.\n\n"
     "OCR OUTPUT:\n"
 )
+
+SCHEMA: ExtractionSchema = {
+    "required": ["vendor_name", "statement_date", "total_outstanding"],
+    "money_fields": ["total_outstanding"],
+    "items_key": "transactions",
+    "item_required": ["date"],
+    "item_money_fields": ["debit", "credit", "balance"],
+    "item_amount_field": "",
+    "items_total": [],
+}
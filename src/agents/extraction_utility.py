@@ -1,5 +1,7 @@
 """Extraction agent for UTILITY & TELECOM BILLS (electricity, water, internet, phone)."""
 
+from agents.schema import ExtractionSchema
+
 SYSTEM_PROMPT = """
 You are a data extraction engine specialized in UTILITY AND TELECOM BILLS — electricity, water, gas, internet, telephone, and similar recurring service bills.
 
@@ -91,3 +93,17 @@ USER_PROMPT = (
     "Extract all fields per your instructions. Return a single valid JSON object.\n\n"
     "OCR OUTPUT:\n"
 )
+
+SCHEMA: ExtractionSchema = {
+    "required": ["vendor_name", "invoice_number", "invoice_date", "grand_total"],
+    "money_fields": [
+        "subtotal", "tax_total", "previous_balance", "payment_received",
+        "adjustments", "current_charges", "grand_total",
+    ],
+    "items_key": "line_items",
+    "item_required": ["description", "amount"],
+    "item_money_fields": ["tax", "amount"],
+    "item_amount_field": "amount",
+    # Line items are the base charges; surcharges sit between subtotal and grand_total.
+    "items_total": ["subtotal"],
+}
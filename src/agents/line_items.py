@@ -0,0 +1,294 @@
+"""
+Local line-item extraction from OCR table sections.
+
+The OCR stage already emits table_header / table_row sections delimited by " | ".
+This module maps header columns to schema fields with per-type synonym tables and
+assembles the line_items / transactions array without asking the LLM to re-emit
+every row. The LLM only supplies header-level fields and, optionally, a column
+mapping that overrides the synonyms.
+"""
+
+import copy
+import re
+
+from agents.ocr_text import iter_pages
+
+# Schema item fields per document type (matches the extraction_* OUTPUT SCHEMA blocks).
+ITEM_FIELDS: dict[str, list[str]] = {
+    "commercial_invoice": ["barcode", "description", "quantity", "unit_price", "discount", "tax", "amount"],
+    "credit_note":        ["barcode", "description", "quantity", "unit_price", "discount", "tax", "amount"],
+    "utility":            ["description", "quantity", "unit_rate", "tax", "amount"],
+    "rental":             ["description", "period_from", "period_to", "tax", "amount"],
+    "hotel":              ["date", "description", "reference", "quantity", "unit_price", "tax", "amount"],
+    "travel":             ["item_number", "description", "quantity", "unit_price", "tax", "amount"],
+    "soa":                ["date", "document_number", "description", "type", "debit", "credit", "balance"],
+    "bank_statement":     ["date", "value_date", "description", "reference", "debit", "credit", "balance"],
+}
+
+ITEMS_KEY: dict[str, str] = {
+    "soa": "transactions",
+    "bank_statement": "transactions",
+}
+
+MONEY_FIELDS = {"unit_price", "unit_rate", "discount", "tax", "amount", "debit", "credit", "balance"}
+# A row needs one of these to be an item of its own; otherwise it is a description
+# continuation (description only) or a barcode/SKU sub-info row (skipped).
+PRIMARY_VALUE_FIELDS = {"amount", "debit", "credit", "balance"}
+
+# Header synonyms, most specific first. Earlier entries win when two columns compete
+# for the same field (e.g. "Amt Incl. SST" beats "Amt Excl. SST" for amount).
+COLUMN_SYNONYMS: dict[str, list[str]] = {
+    "barcode": ["outer barcode", "barcode", "ean code", "ean", "upc"],
+    "description": ["product description", "item description", "description", "particulars",
+                    "details", "jenis caj", "perkara", "keterangan", "item"],
+    "quantity": ["quantity", "qty", "units", "unit", "kuantiti", "pcs"],
+    "unit_price": ["unit price", "unit fare", "price per unit", "cost price per unit", "retail price per unit",
+                   "price per", "price"],
+    "unit_rate": ["unit rate", "rate", "kadar", "tariff"],
+    "discount": ["discount", "disc amt", "disc"],
+    "tax": ["sst amt", "sst amount", "tax amount", "gst amt", "gst amount", "sst", "gst", "tax"],
+    "amount": ["amt incl", "amount incl", "total payable", "net amount", "jumlah", "amount", "amt", "total"],
+    "date": ["transaction date", "trans date", "posting date", "txn date", "date", "tarikh"],
+    "value_date": ["value date"],
+    "reference": ["reference", "ref no", "ref", "cheque no", "chq no"],
+    "document_number": ["doc no", "document no", "invoice no", "inv no", "reference", "ref no"],
+    "period_from": ["from date", "period from", "from", "start date"],
+    "period_to": ["to date", "period to", "to", "end date"],
+    "item_number": ["no.", "no", "item no", "#"],
+    "type": ["doc type", "type"],
+    "debit": ["debit", "withdrawal", "dr", "doc amt", "amount"],
+    "credit": ["credit", "deposit", "cr"],
+    "balance": ["running balance", "balance", "outstanding", "baki"],
+}
+
+# Per-type overrides where the shared table would pick the wrong field.
+TYPE_COLUMN_SYNONYMS: dict[str, dict[str, list[str]]] = {
+    "rental": {
+        "description": ["item description", "description", "particulars", "details", "item"],
+    },
+    "hotel": {
+        "reference": ["reference", "ref", "room"],
+    },
+    "travel": {
+        "item_number": ["no.", "item no", "#"],
+    },
+}
+
+# Columns the extractor needs before it trusts a table as the line-item table.
+REQUIRED_ANY: dict[str, tuple[set[str], set[str]]] = {
+    "soa": ({"date", "document_number", "description"}, {"debit", "credit", "balance"}),
+    "bank_statement": ({"date", "description"}, {"debit", "credit", "balance"}),
+}
+DEFAULT_REQUIRED_ANY = ({"description"}, {"amount"})
+
+LINE_ITEMS_NOTE = (
+    "NOTE: The \"{key}\" array is assembled locally from the OCR table rows. "
+    "Return \"{key}\": [] and add a \"column_mapping\" object that maps each column header of the "
+    "line-item table ({header}) to one of these fields, or null: {fields}. "
+    "Only a few sample rows of that table are included in the OCR output.\n\n"
+)
+
+CURRENCY_PREFIX = re.compile(r"^(?:RM|MYR|USD|SGD|HKD|\$)\s*", re.IGNORECASE)
+LOW_CONFIDENCE_THRESHOLD = 0.90
+
+
+def items_key(doc_type: str) -> str:
+    return ITEMS_KEY.get(doc_type, "line_items")
+
+
+def _split_cells(content: str) -> list[str]:
+    return [cell.strip() for cell in str(content or "").split(" | ")]
+
+
+def _normalize_header(cell: str) -> str:
+    text = cell.lower().replace("\n", " ")
+    text = re.sub(r"\((?:rm|myr|usd|sgd|hkd)\)|\b(?:rm|myr)\b", " ", text)
+    return " ".join(text.split())
+
+
+def _synonyms(doc_type: str) -> dict[str, list[str]]:
+    fields = ITEM_FIELDS.get(doc_type, ITEM_FIELDS["commercial_invoice"])
+    overrides = TYPE_COLUMN_SYNONYMS.get(doc_type, {})
+    return {field: overrides.get(field, COLUMN_SYNONYMS.get(field, [])) for field in fields}
+
+
+def _synonym_rank(header: str, synonym: str) -> int | None:
+    """0 for an exact match, 1 for a whole-word containment, None otherwise."""
+    if header == synonym:
+        return 0
+    if re.search(r"(?<![a-z0-9])" + re.escape(synonym) + r"(?![a-z0-9])", header):
+        return 1
+    return None
+
+
+def map_columns(header_cells: list[str], doc_type: str) -> dict[int, str]:
+    """
+    Map header column positions to schema item fields using the synonym tables.
+
+    Each field is assigned to at most one column; each column gets at most one field.
+    """
+    headers = [_normalize_header(c) for c in header_cells]
+    candidates: list[tuple[int, int, int, str]] = []  # (priority, exactness, column, field)
+    for field, synonyms in _synonyms(doc_type).items():
+        for priority, synonym in enumerate(synonyms):
+            for col, header in enumerate(headers):
+                if not header:
+                    continue
+                rank = _synonym_rank(header, synonym)
+                if rank is not None:
+                    candidates.append((priority, rank, col, field))
+
+    mapping: dict[int, str] = {}
+    assigned: set[str] = set()
+    for _priority, _rank, col, field in sorted(candidates):
+        if col in mapping or field in assigned:
+            continue
+        mapping[col] = field
+        assigned.add(field)
+    return mapping
+
+
+def mapping_from_llm(header_cells: list[str], column_mapping: dict, doc_type: str) -> dict[int, str]:
+    """Translate an LLM column_mapping {"<header text>": "<field>"} into column positions."""
+    fields = set(ITEM_FIELDS.get(doc_type, ITEM_FIELDS["commercial_invoice"]))
+    by_header = {_normalize_header(str(k)): v for k, v in (column_mapping or {}).items()}
+    mapping: dict[int, str] = {}
+    for col, cell in enumerate(header_cells):
+        field = by_header.get(_normalize_header(cell))
+        if isinstance(field, str) and field in fields and field not in mapping.values():
+            mapping[col] = field
+    return mapping
+
+
+def _qualifies(mapping: dict[int, str], doc_type: str) -> bool:
+    key_fields, value_fields = REQUIRED_ANY.get(doc_type, DEFAULT_REQUIRED_ANY)
+    fields = set(mapping.values())
+    return bool(fields & key_fields) and bool(fields & value_fields)
+
+
+def find_item_table(ocr_obj: object, doc_type: str) -> dict | None:
+    """
+    Locate the line-item table: the first table_header whose columns map to a
+    description/date column and a value column. Identical headers repeated on later
+    pages continue the same table; stacked sub-header rows directly under a header
+    (e.g. "Inner Barcode | SKU") are skipped. A different header or a subtotal ends it.
+
+    Returns:
+        {"header": [...], "mapping": {col: field}, "rows": [(page_idx, section_idx, section)],
+         "mismatched": <rows whose cell count differs from the header>}
+        or None when no table qualifies.
+    """
+    table: dict | None = None
+    in_table = False
+    prev_type = None
+    for page_idx, page in enumerate(iter_pages(ocr_obj)):
+        for section_idx, section in enumerate(page.get("sections", []) or []):
+            if not isinstance(section, dict):
+                continue
+            sec_type = section.get("type")
+            if sec_type == "table_header":
+                cells = _split_cells(section.get("content"))
+                if table is None:
+                    mapping = map_columns(cells, doc_type)
+                    if _qualifies(mapping, doc_type):
+                        table = {"header": cells, "mapping": mapping, "rows": [], "mismatched": 0}
+                        in_table = True
+                elif cells == table["header"]:
+                    in_table = True
+                elif not (in_table and prev_type == "table_header" and len(cells) == len(table["header"])):
+                    in_table = False
+            elif sec_type == "table_row":
+                if table is not None and in_table:
+                    cells = _split_cells(section.get("content"))
+                    if len(cells) == len(table["header"]):
+                        table["rows"].append((page_idx, section_idx, section))
+                    else:
+                        table["mismatched"] += 1
+            elif sec_type == "subtotal":
+                in_table = False
+            prev_type = sec_type
+    return table
+
+
+def _clean_value(field: str, value: str) -> str | None:
+    value = value.strip()
+    if not value or value in {"-", "—"}:
+        return None
+    if field in MONEY_FIELDS:
+        value = CURRENCY_PREFIX.sub("", value).strip()
+    return value or None
+
+
+def assemble_items(table: dict, doc_type: str, mapping: dict[int, str] | None = None) -> tuple[list[dict], list[int]]:
+    """
+    Build schema item dicts from the table rows.
+
+    Rows with only a description continue the previous item's description
+    (joined with a newline); rows with neither description nor values
+    (barcode/SKU sub-info rows) are skipped.
+
+    Returns:
+        (items, indexes of items whose OCR row confidence is below
+        LOW_CONFIDENCE_THRESHOLD). The flags stay out of the item dicts, which
+        hold only schema fields.
+    """
+    mapping = mapping or table["mapping"]
+    fields = ITEM_FIELDS.get(doc_type, ITEM_FIELDS["commercial_invoice"])
+    items: list[dict] = []
+    low_confidence: list[int] = []
+    for _page_idx, _section_idx, section in table["rows"]:
+        cells = _split_cells(section.get("content"))
+        values = {
+            field: _clean_value(field, cells[col])
+            for col, field in mapping.items()
+            if col < len(cells)
+        }
+        description = values.get("description")
+        if not any(values.get(f) for f in PRIMARY_VALUE_FIELDS):
+            only_description = description and not any(v for f, v in values.items() if f != "description")
+            if only_description and items:
+                previous = items[-1].get("description") or ""
+                items[-1]["description"] = f"{previous}\n{description}" if previous else description
+            continue
+
+        confidence = section.get("confidence")
+        if isinstance(confidence, (int, float)) and confidence < LOW_CONFIDENCE_THRESHOLD:
+            low_confidence.append(len(items))
+        items.append({field: values.get(field) for field in fields})
+    return items, low_confidence
+
+
+def extract_line_items(
+    table: dict | None, doc_type: str, column_mapping: dict | None = None
+) -> tuple[list[dict], list[int]] | None:
+    """
+    Extract line items locally. Returns None when no line-item table is recognised
+    or when some of its rows don't line up with the header (the LLM handles those).
+
+    Args:
+        table: The document's find_item_table() result.
+        doc_type: Classifier label.
+        column_mapping: Optional {"<header text>": "<field>"} from the LLM; overrides synonyms.
+
+    Returns:
+        (items, low-confidence item indexes), as from assemble_items().
+    """
+    if table is None or not table["rows"] or table["mismatched"]:
+        return None
+
+    mapping = None
+    if column_mapping:
+        llm_mapping = mapping_from_llm(table["header"], column_mapping, doc_type)
+        if _qualifies(llm_mapping, doc_type):
+            mapping = llm_mapping
+    return assemble_items(table, doc_type, mapping)
+
+
+def strip_item_rows(ocr_obj: object, table: dict, keep_rows: int = 2) -> object:
+    """Return a copy of the OCR object without the item table's rows, keeping a few samples."""
+    drop = {(page_idx, section_idx) for page_idx, section_idx, _ in table["rows"][keep_rows:]}
+    stripped = copy.deepcopy(ocr_obj)
+    for page_idx, page in enumerate(iter_pages(stripped)):
+        sections = page.get("sections", []) or []
+        page["sections"] = [s for idx, s in enumerate(sections) if (page_idx, idx) not in drop]
+    return stripped
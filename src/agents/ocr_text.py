@@ -0,0 +1,122 @@
+"""Helpers for walking OCR output JSON regardless of the mode it was produced in."""
+
+import json
+
+
+def load_ocr(ocr_json_str: str) -> object:
+    """Parse OCR JSON text, returning the raw string when it is not valid JSON."""
+    try:
+        return json.loads(ocr_json_str)
+    except Exception:
+        return ocr_json_str
+
+
+def iter_pages(ocr_obj: object) -> list[dict]:
+    """Return the list of page dicts for batch, per-image and plain OCR outputs."""
+    if not isinstance(ocr_obj, dict):
+        return []
+
+    if isinstance(ocr_obj.get("pages"), list):
+        return [p for p in ocr_obj["pages"] if isinstance(p, dict)]
+
+    model_output = ocr_obj.get("model_output")
+    if isinstance(model_output, dict) and isinstance(model_output.get("pages"), list):
+        return [p for p in model_output["pages"] if isinstance(p, dict)]
+
+    pages: list[dict] = []
+    for result in ocr_obj.get("results", []) or []:
+        if not isinstance(result, dict):
+            continue
+        mo = result.get("model_output")
+        if isinstance(mo, dict) and isinstance(mo.get("pages"), list):
+            pages.extend(p for p in mo["pages"] if isinstance(p, dict))
+    return pages
+
+
+def iter_sections(ocr_obj: object, max_pages: int | None = None) -> list[tuple[int, dict]]:
+    """Return (page_index, section) pairs in document order, zero-based page index."""
+    pages = iter_pages(ocr_obj)
+    if max_pages is not None:
+        pages = pages[:max_pages]
+
+    sections: list[tuple[int, dict]] = []
+    for page_idx, page in enumerate(pages):
+        for section in page.get("sections", []) or []:
+            if isinstance(section, dict):
+                sections.append((page_idx, section))
+    return sections
+
+
+def compact_text(ocr_obj: object, max_pages: int | None = None) -> str:
+    """Flatten OCR sections into "type: content" lines, one section per line."""
+    if not isinstance(ocr_obj, dict):
+        return str(ocr_obj or "")
+
+    lines: list[str] = []
+    for _page_idx, section in iter_sections(ocr_obj, max_pages=max_pages):
+        content = " ".join(str(section.get("content") or "").split())
+        if content:
+            lines.append(f"{section.get('type') or 'text'}: {content}")
+    return "\n".join(lines)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt-token estimate (~4 characters per token for our OCR text)."""
+    return len(text) // 4 + 1
+
+
+EXCERPT_SECTION_TYPES = {"header", "key_value", "table_header"}
+
+
+def build_header_excerpt(
+    ocr_json_str: str,
+    token_budget: int = 600,
+    max_pages: int = 2,
+    max_table_headers: int = 3,
+    max_table_rows: int = 3,
+) -> str:
+    """
+    Build a compact classification excerpt from the first pages' structure.
+
+    Keeps only header, key_value, the first few table_header sections and the
+    first few table rows (charge descriptions such as "broadband usage" decide
+    utility vs rental), as "type: content" lines, and stops at the token budget.
+    Address blocks, paragraphs and footers are dropped. Falls back to a plain
+    prefix for non-JSON input.
+    """
+    max_chars = token_budget * 4
+    ocr_obj = load_ocr(ocr_json_str)
+    sections = iter_sections(ocr_obj, max_pages=max_pages)
+    if not sections:
+        return (ocr_json_str or "")[:max_chars]
+
+    lines: list[str] = []
+    used = 0
+    table_headers = 0
+    table_rows = 0
+    for _page_idx, section in sections:
+        sec_type = str(section.get("type") or "")
+        if sec_type == "table_row":
+            if table_rows >= max_table_rows:
+                continue
+            table_rows += 1
+        elif sec_type not in EXCERPT_SECTION_TYPES:
+            continue
+        elif sec_type == "table_header":
+            if table_headers >= max_table_headers:
+                continue
+            table_headers += 1
+
+        content = " ".join(str(section.get("content") or "").split())
+        if not content:
+            continue
+        line = f"{sec_type}: {content}"
+        if used + len(line) > max_chars:
+            remaining = max_chars - used
+            if remaining > 40:
+                lines.append(line[:remaining])
+            break
+        lines.append(line)
+        used += len(line) + 1
+
+    return "\n".join(lines) or (ocr_json_str or "")[:max_chars]
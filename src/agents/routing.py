@@ -0,0 +1,107 @@
+"""
+Per-stage model routing.
+
+Every LLM call asks route() which deployment to use. A call is described by
+its stage ("ocr", "classify", "extract", "repair"), the document type (when
+known) and a size class derived from page count and OCR size. The first
+matching rule in ROUTING_TABLE picks a tier; tiers map to deployments through
+config, so a deployment that is not configured falls back to the default one.
+
+Config:
+    AZURE_OPENAI_DEPLOYMENT_SMALL   cheaper/faster deployment (defaults to AZURE_OPENAI_DEPLOYMENT)
+    AZURE_OPENAI_DEPLOYMENT_LARGE   stronger deployment used for escalation (defaults to AZURE_OPENAI_DEPLOYMENT)
+    MODEL_ROUTING                   JSON list of [stage, doc_type, size_class, tier] rules, tried before the table
+    MODEL_ESCALATION                "0" disables escalation after failed validation
+"""
+
+import json
+
+from agents import DEPLOYMENT, _get_config_value
+
+TIER_DEPLOYMENTS: dict[str, str] = {
+    "small": _get_config_value("AZURE_OPENAI_DEPLOYMENT_SMALL") or DEPLOYMENT,
+    "standard": DEPLOYMENT,
+    "large": _get_config_value("AZURE_OPENAI_DEPLOYMENT_LARGE") or DEPLOYMENT,
+}
+
+# Next tier up when an extraction still fails validation after repair.
+ESCALATION: dict[str, str] = {
+    "small": "standard",
+    "standard": "large",
+}
+ESCALATION_ENABLED = (_get_config_value("MODEL_ESCALATION") or "1") != "0"
+
+# Size classes by page count and OCR JSON characters (whichever is larger wins).
+SIZE_CLASSES: list[tuple[str, int, int]] = [
+    ("small", 2, 15_000),
+    ("medium", 6, 60_000),
+]
+
+# (stage, doc_type, size_class) → tier. "*" matches anything; first match wins.
+ROUTING_TABLE: list[tuple[str, str, str, str]] = [
+    ("classify", "*",          "*",      "small"),     # one-word answer from a header excerpt
+    ("repair",   "*",          "*",      "small"),     # a few fields from a small excerpt
+    ("ocr",      "*",          "*",      "standard"),  # transcription quality drives everything downstream
+    ("extract",  "*",          "large",  "large"),
+    ("extract",  "utility",    "small",  "small"),
+    ("extract",  "rental",     "small",  "small"),
+    ("extract",  "hotel",      "small",  "small"),
+    ("extract",  "travel",     "small",  "small"),
+    ("extract",  "*",          "*",      "standard"),
+    ("*",        "*",          "*",      "standard"),
+]
+
+
+def _custom_rules() -> list[tuple[str, str, str, str]]:
+    raw = _get_config_value("MODEL_ROUTING")
+    if not raw:
+        return []
+    try:
+        rules = json.loads(raw)
+    except Exception:
+        return []
+    return [tuple(r) for r in rules if isinstance(r, list) and len(r) == 4]
+
+
+CUSTOM_RULES = _custom_rules()
+
+
+def size_class(pages: int | None = None, chars: int | None = None) -> str:
+    """Classify a document as "small", "medium" or "large"."""
+    for name, max_pages, max_chars in SIZE_CLASSES:
+        if (pages or 0) <= max_pages and (chars or 0) <= max_chars:
+            return name
+    return "large"
+
+
+def route(stage: str, doc_type: str | None = None, pages: int | None = None, chars: int | None = None) -> tuple[str, str]:
+    """
+    Pick the model for one call.
+
+    Returns:
+        (tier, deployment)
+    """
+    size = size_class(pages, chars)
+    for rule_stage, rule_type, rule_size, tier in CUSTOM_RULES + ROUTING_TABLE:
+        if (
+            rule_stage in {"*", stage}
+            and rule_type in {"*", doc_type or "*"}
+            and rule_size in {"*", size}
+            and tier in TIER_DEPLOYMENTS
+        ):
+            return tier, TIER_DEPLOYMENTS[tier]
+    return "standard", DEPLOYMENT
+
+
+def escalate(tier: str) -> tuple[str, str] | None:
+    """
+    Return the (tier, deployment) to retry with after failed validation, or None
+    when escalation is disabled or would not change the deployment.
+    """
+    next_tier = ESCALATION.get(tier)
+    if not ESCALATION_ENABLED or next_tier is None:
+        return None
+    if TIER_DEPLOYMENTS[next_tier] == TIER_DEPLOYMENTS[tier]:
+        # Skip tiers that share a deployment (e.g. small == standard by default).
+        return escalate(next_tier) if next_tier in ESCALATION else None
+    return next_tier, TIER_DEPLOYMENTS[next_tier]
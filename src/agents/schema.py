@@ -0,0 +1,19 @@
+"""Typed description of an extraction agent's output, used by agents/validation.py."""
+
+from typing import TypedDict
+
+
+class ExtractionSchema(TypedDict):
+    # Top-level fields that must be present and non-empty.
+    required: list[str]
+    # Top-level fields that must look like numbers when present.
+    money_fields: list[str]
+    # Name of the line-item array ("line_items" or "transactions").
+    items_key: str
+    # Fields every line item must have, and those that must look like numbers.
+    item_required: list[str]
+    item_money_fields: list[str]
+    # Item field summed for the total check, and the totals it may match (first present wins).
+    # An empty items_total disables the check.
+    item_amount_field: str
+    items_total: list[str]
@@ -0,0 +1,290 @@
+"""
+Schema validation and targeted repair for extraction results.
+
+Each extraction_* module declares a SCHEMA (see agents/schema.py). After an
+extraction, validate() lists the fields that are missing or malformed. Instead
+of re-running the whole extraction, repair() asks the model only for those
+fields, sending a small OCR excerpt (the sections that mention the field, or
+the line-item table), and merges the answers back in place.
+"""
+
+import json
+import re
+
+from agents import call_extraction_agent, maybe_parse_json, _get_config_value
+from agents import line_items
+from agents.ocr_text import load_ocr, iter_pages, estimate_tokens
+from agents.routing import route
+from agents.schema import ExtractionSchema
+from agents import extraction_invoice
+from agents import extraction_travel
+from agents import extraction_rental
+from agents import extraction_hotel
+from agents import extraction_utility
+from agents import extraction_soa
+from agents import extraction_bank
+
+# Registry: maps classifier label → output schema (mirrors orchestrator.AGENT_REGISTRY)
+SCHEMA_REGISTRY: dict[str, ExtractionSchema] = {
+    "commercial_invoice": extraction_invoice.SCHEMA,
+    "credit_note":        extraction_invoice.SCHEMA,
+    "travel":             extraction_travel.SCHEMA,
+    "rental":             extraction_rental.SCHEMA,
+    "hotel":              extraction_hotel.SCHEMA,
+    "utility":            extraction_utility.SCHEMA,
+    "soa":                extraction_soa.SCHEMA,
+    "bank_statement":     extraction_bank.SCHEMA,
+}
+
+REPAIR_MAX_ROUNDS = int(_get_config_value("EXTRACTION_REPAIR_ROUNDS") or "1")
+REPAIR_TOKEN_BUDGET = 1500
+# Item sums may differ from the printed total by rounding.
+SUM_TOLERANCE = 0.05
+
+# Words that label a field on the document, beyond the field name itself.
+FIELD_HINTS: dict[str, list[str]] = {
+    "invoice_number": ["invoice", "inv", "bill no", "folio", "invois", "document no", "doc no"],
+    "invoice_date": ["date", "tarikh"],
+    "due_date": ["due", "pay before", "bayar sebelum"],
+    "statement_date": ["date", "tarikh"],
+    "grand_total": ["total", "amount due", "payable", "jumlah", "balance due", "net amount"],
+    "subtotal": ["sub total", "subtotal", "total"],
+    "tax_total": ["sst", "gst", "tax", "cukai"],
+    "total_outstanding": ["outstanding", "balance", "total", "amount due"],
+    "closing_balance": ["closing", "balance"],
+    "opening_balance": ["opening", "balance", "brought forward", "b/f"],
+    "account_number": ["account", "acc", "akaun"],
+}
+
+REPAIR_SYSTEM_PROMPT = """
+You correct specific fields of a document extraction.
+
+You receive the field paths to fill, the current (invalid or missing) values and
+an OCR excerpt of the document. Return ONLY a valid JSON object whose keys are
+exactly the requested field paths.
+
+Rules:
+1. Extract values EXACTLY as they appear in the OCR — no reformatting or recalculating.
+2. For monetary fields, return number-only text (no currency code/symbol).
+3. A path like "line_items[2]" is one line-item object; a path like "line_items" is the full array.
+   Line-item objects use these keys: {item_fields}, low_confidence.
+4. If the value is not in the excerpt, return null for that path.
+"""
+
+REPAIR_USER_PROMPT = (
+    "Fields to fill: {paths}\n"
+    "Current values:\n{current}\n\n"
+    "Problems found:\n{problems}\n\n"
+    "OCR EXCERPT:\n"
+)
+
+ITEM_PATH = re.compile(r"^(\w+)\[(\d+)\]$")
+
+
+def get_schema(doc_type: str) -> ExtractionSchema:
+    return SCHEMA_REGISTRY.get(doc_type, extraction_invoice.SCHEMA)
+
+
+def parse_amount(value: object) -> float | None:
+    """Parse a money string such as "1,234.50", "RM 20.00", "(12.00)" or "45.10 CR"."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = line_items.CURRENCY_PREFIX.sub("", str(value or "").strip())
+    text = re.sub(r"\s*(?:CR|DR)$", "", text, flags=re.IGNORECASE).replace(",", "").replace(" ", "")
+    negative = text.startswith("(") and text.endswith(")")
+    text = text.strip("()")
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return -number if negative else number
+
+
+def _is_empty(value: object) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _looks_numeric(value: object) -> bool:
+    # Tax columns often print the rate ("6%") rather than an amount.
+    return parse_amount(value) is not None or bool(re.fullmatch(r"\d+(?:\.\d+)?\s*%", str(value).strip()))
+
+
+def validate(data: object, doc_type: str) -> list[dict]:
+    """
+    Check an extraction against its schema.
+
+    Returns:
+        A list of {"path", "problem"} issues; empty when the extraction is valid.
+    """
+    if not isinstance(data, dict):
+        return [{"path": "", "problem": "extraction is not a JSON object"}]
+
+    schema = get_schema(doc_type)
+    issues: list[dict] = []
+    for field in schema["required"]:
+        if _is_empty(data.get(field)):
+            issues.append({"path": field, "problem": "missing"})
+    for field in schema["money_fields"]:
+        value = data.get(field)
+        if not _is_empty(value) and not _looks_numeric(value):
+            issues.append({"path": field, "problem": f"not a number: {value!r}"})
+
+    key = schema["items_key"]
+    items = data.get(key)
+    if items is None:
+        items = []
+    if not isinstance(items, list):
+        return issues + [{"path": key, "problem": "not an array"}]
+
+    for idx, item in enumerate(items):
+        path = f"{key}[{idx}]"
+        if not isinstance(item, dict):
+            issues.append({"path": path, "problem": "not an object"})
+            continue
+        missing = [f for f in schema["item_required"] if _is_empty(item.get(f))]
+        malformed = [
+            f for f in schema["item_money_fields"]
+            if not _is_empty(item.get(f)) and not _looks_numeric(item.get(f))
+        ]
+        if missing:
+            issues.append({"path": path, "problem": f"missing {', '.join(missing)}"})
+        if malformed:
+            issues.append({"path": path, "problem": f"not a number: {', '.join(malformed)}"})
+
+    amount_field = schema["item_amount_field"]
+    totals = [(f, parse_amount(data.get(f))) for f in schema["items_total"] if parse_amount(data.get(f)) is not None]
+    if amount_field and items and totals and not any(i["path"].startswith(key) for i in issues):
+        item_sum = sum(parse_amount(item.get(amount_field)) or 0.0 for item in items)
+        if not any(abs(item_sum - total) <= SUM_TOLERANCE for _field, total in totals):
+            expected = ", ".join(f"{f}={t:,.2f}" for f, t in totals)
+            issues.append({"path": key, "problem": f"item amounts sum to {item_sum:,.2f}, expected {expected}"})
+    return issues
+
+
+def _field_hints(path: str) -> list[str]:
+    words = [w for w in path.split(".")[-1].split("_") if w not in {"number", "total", "date"}]
+    hints = FIELD_HINTS.get(path, [])
+    return [h.lower() for h in hints + [" ".join(words)] if h]
+
+
+def build_repair_excerpt(ocr_obj: object, paths: list[str], doc_type: str, token_budget: int = REPAIR_TOKEN_BUDGET) -> str:
+    """
+    Collect the OCR sections relevant to the paths: the line-item table for item
+    paths, and header plus labelled sections mentioning the field for the rest.
+    """
+    items_key = get_schema(doc_type)["items_key"]
+    want_items = any(p == items_key or p.startswith(f"{items_key}[") for p in paths)
+    hints = [h for p in paths if not p.startswith(items_key) for h in _field_hints(p)]
+
+    table_rows: set[tuple[int, int]] = set()
+    if want_items:
+        table = line_items.find_item_table(ocr_obj, doc_type)
+        if table is not None:
+            table_rows = {(page_idx, section_idx) for page_idx, section_idx, _ in table["rows"]}
+
+    lines: list[str] = []
+    used = 0
+    for page_idx, page in enumerate(iter_pages(ocr_obj)):
+        for section_idx, section in enumerate(page.get("sections", []) or []):
+            if not isinstance(section, dict):
+                continue
+            sec_type = section.get("type")
+            content = " ".join(str(section.get("content") or "").split())
+            if not content:
+                continue
+            if sec_type in {"table_header", "table_row"}:
+                keep = want_items and (not table_rows or sec_type == "table_header" or (page_idx, section_idx) in table_rows)
+            else:
+                lowered = content.lower()
+                keep = bool(hints) and (
+                    (sec_type == "header" and page_idx == 0)
+                    or sec_type == "subtotal"
+                    or any(h in lowered for h in hints)
+                )
+            if not keep:
+                continue
+            line = f"p{page_idx + 1} {sec_type}: {content}"
+            used += estimate_tokens(line)
+            if used > token_budget:
+                return "\n".join(lines)
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def _set_path(data: dict, path: str, value: object) -> None:
+    match = ITEM_PATH.match(path)
+    if match:
+        key, idx = match.group(1), int(match.group(2))
+        items = data.get(key)
+        if isinstance(items, list) and idx < len(items) and isinstance(value, dict):
+            items[idx] = value
+        return
+    if value is not None or _is_empty(data.get(path)):
+        data[path] = value
+
+
+def repair(data: dict, doc_type: str, ocr_json_str: str, issues: list[dict]) -> dict:
+    """Ask the model for the invalid paths only and merge the answers into data in place."""
+    paths = list(dict.fromkeys(i["path"] for i in issues if i["path"]))
+    if not paths:
+        return data
+
+    ocr_obj = load_ocr(ocr_json_str)
+    excerpt = build_repair_excerpt(ocr_obj, paths, doc_type)
+    if not excerpt:
+        return data
+
+    current = {}
+    for path in paths:
+        match = ITEM_PATH.match(path)
+        if match:
+            items = data.get(match.group(1)) or []
+            idx = int(match.group(2))
+            current[path] = items[idx] if idx < len(items) else None
+        else:
+            current[path] = data.get(path)
+
+    item_fields = line_items.ITEM_FIELDS.get(doc_type, line_items.ITEM_FIELDS["commercial_invoice"])
+    system_prompt = REPAIR_SYSTEM_PROMPT.format(item_fields=", ".join(item_fields))
+    user_prompt = REPAIR_USER_PROMPT.format(
+        paths=", ".join(paths),
+        current=json.dumps(current, ensure_ascii=False, indent=2),
+        problems="\n".join(f"- {i['path']}: {i['problem']}" for i in issues),
+    )
+    tier, deployment = route("repair", doc_type)
+    answer = maybe_parse_json(
+        call_extraction_agent(system_prompt, user_prompt, excerpt, deployment, tier, request_mode="field_repair")
+    )
+    if not isinstance(answer, dict) or "error" in answer:
+        return data
+
+    answered = [path for path in paths if path in answer]
+    for path in answered:
+        _set_path(data, path, answer[path])
+    if answered:
+        print(f"  Repaired field(s): {', '.join(answered)}")
+    return data
+
+
+def validate_and_repair(data: object, doc_type: str, ocr_json_str: str, max_rounds: int | None = None) -> object:
+    """
+    Validate an extraction and run up to max_rounds targeted repair calls.
+
+    Issues that remain are recorded in data["validation_issues"] for review.
+    """
+    if not isinstance(data, dict) or "error" in data:
+        return data
+
+    max_rounds = REPAIR_MAX_ROUNDS if max_rounds is None else max_rounds
+    issues = validate(data, doc_type)
+    for _ in range(max_rounds):
+        if not issues:
+            break
+        repair(data, doc_type, ocr_json_str, issues)
+        issues = validate(data, doc_type)
+
+    if issues:
+        data["validation_issues"] = [f"{i['path']}: {i['problem']}" for i in issues]
+    else:
+        data.pop("validation_issues", None)
+    return data
@@ -0,0 +1,710 @@
+"""
+Vendor templates for recurring billers whose layouts never change.
+
+A template is learned from a verified extraction (extraction_output/*.json marked
+"verified" on the Report Format page) and the OCR it was produced from. It records:
+  - an anchor that identifies the vendor (TIN, else the vendor name on the first page)
+  - a layout hash over the first page's key/value labels and table headers
+  - field locators: "<label> : <value>" positions or whole sections (e.g. the address block)
+  - the line-item table handling (rows to drop, rows that are surcharges)
+
+When a new document matches a template's anchor and layout, header fields and
+line items are extracted deterministically. The LLM is only called when no
+template matches or a validation check fails. Every attempt is logged so hit
+rate and time saved can be reported per vendor.
+
+Usage:
+    python metadata_store.py --learn-templates   # from extractions verified in the app
+    python -m agents.vendor_templates learn --extraction-dir checked/   # hand-checked files
+    python -m agents.vendor_templates stats
+    python -m agents.vendor_templates match ocr_output/TNB.json
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from agents import _get_config_value
+from agents import line_items
+from agents.ocr_text import load_ocr, iter_pages
+from agents.validation import parse_amount, validate
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_TEMPLATES_PATH = SRC_DIR / "templates" / "vendor_templates.json"
+USAGE_LOG_PATH = SRC_DIR / "templates" / "template_usage_log.jsonl"
+
+# Copied from the verified extraction as-is: they don't change between bills of one vendor.
+CONSTANT_FIELDS = {"document_type", "vendor_name", "currency", "currency_note"}
+# A template is only usable when every one of these that the verified extraction filled was located.
+KEY_FIELDS = {
+    "invoice_number", "document_number", "statement_number", "account_number",
+    "invoice_date", "document_date", "statement_date", "due_date",
+    "billing_period_from", "billing_period_to",
+    "subtotal", "tax_total", "total_amount", "grand_total", "current_charges", "total_due",
+}
+DATE_FIELD_PATTERN = re.compile(r"date|period", re.IGNORECASE)
+MONEY_FIELD_PATTERN = re.compile(r"(?:amount|total|balance|charges|due)$", re.IGNORECASE)
+# First-page sections that make up the biller's letterhead (the leading run of these, plus any header).
+LETTERHEAD_TYPES = {"header", "paragraph"}
+TIN_PATTERN = re.compile(r"\bTIN\s*(?:No\.?)?\s*[:\-]?\s*([A-Z]{1,2}\s?\d{8,12})\b", re.IGNORECASE)
+
+# Assumed LLM extraction time when the log has no measured LLM runs yet.
+DEFAULT_LLM_SECONDS = 20.0
+
+
+def templates_path() -> Path:
+    return Path(_get_config_value("VENDOR_TEMPLATES_PATH") or DEFAULT_TEMPLATES_PATH)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(str(text or "").lower().split())
+
+
+def _row_pattern(description: str) -> str:
+    """Digits vary between bills ("KWTBB (1.6%)"); compare descriptions with them masked."""
+    return re.sub(r"\d+", "#", _normalize(description))
+
+
+def _value_shape(value: str) -> str:
+    return re.sub(r"\d", "9", " ".join(str(value).split()))
+
+
+def _first_page(ocr_obj: object) -> dict:
+    pages = iter_pages(ocr_obj)
+    return {"pages": pages[:1]}
+
+
+# ── Fingerprint ──────────────────────────────────────────────────────────────
+
+def _segments(content: str) -> list[str]:
+    """
+    Split section content into lines, then into columns separated by 2+ spaces.
+    A column without digits is joined with the next one, so "Issue Date:      04-FEB-26"
+    and "TOTAL (RM)    39,135.36" stay together as label and value.
+    """
+    segments: list[str] = []
+    for line in str(content or "").splitlines():
+        cells = [c.strip() for c in re.split(r"\s{2,}", line) if c.strip()]
+        idx = 0
+        while idx < len(cells):
+            if idx + 1 < len(cells) and not re.search(r"\d", cells[idx]):
+                segments.append(f"{cells[idx]} {cells[idx + 1]}")
+                idx += 2
+            else:
+                segments.append(cells[idx])
+                idx += 1
+    return segments
+
+
+def _letterhead(sections: list[dict]) -> list[dict]:
+    """
+    The vendor's own sections on the first page: its header sections and the
+    header/paragraph run the page opens with. Buyer and remittance details come
+    later (key/value, address, tables), so their TINs are not taken as the vendor's.
+    """
+    leading = []
+    for section in sections:
+        if section.get("type") not in LETTERHEAD_TYPES:
+            break
+        leading.append(section)
+    return leading + [s for s in sections[len(leading):] if s.get("type") == "header"]
+
+
+def fingerprint(ocr_obj: object) -> dict:
+    """Return {"tin", "headers", "text", "layout_hash"} for the first page of a document."""
+    pages = iter_pages(ocr_obj)
+    sections = [s for s in (pages[0].get("sections", []) if pages else []) if isinstance(s, dict)]
+
+    text = "\n".join(str(s.get("content") or "") for s in _letterhead(sections))
+    tin_match = TIN_PATTERN.search(text)
+    tin = tin_match.group(1).replace(" ", "").upper() if tin_match else None
+
+    headers = [_normalize(s.get("content")) for s in sections if s.get("type") == "header"]
+    first_page_text = _normalize(" ".join(str(s.get("content") or "") for s in sections))
+
+    layout: set[str] = set()
+    for section in sections:
+        sec_type = section.get("type")
+        if sec_type == "key_value":
+            for segment in _segments(section.get("content")):
+                label, sep, _ = segment.partition(":")
+                if sep:
+                    layout.add(f"kv:{re.sub(r'[0-9]+', '#', _normalize(label))}")
+        elif sec_type == "table_header":
+            layout.add(f"th:{_normalize(section.get('content'))}")
+    layout_hash = hashlib.sha1("\n".join(sorted(layout)).encode("utf-8")).hexdigest()[:12]
+    return {"tin": tin, "headers": headers, "text": first_page_text, "layout_hash": layout_hash}
+
+
+def _anchor_matches(anchor: dict, fp: dict) -> bool:
+    if anchor.get("tin"):
+        return anchor["tin"] == fp["tin"]
+    if anchor.get("header"):
+        return anchor["header"] in fp["headers"]
+    return bool(anchor.get("text")) and anchor["text"] in fp["text"]
+
+
+# ── Locators ─────────────────────────────────────────────────────────────────
+
+def _labelled_values(ocr_obj: object) -> list[tuple[str, str, list[str]]]:
+    """
+    (section_type, normalized label, value tokens) for every value the OCR puts
+    next to a label: "label : value", "label value", a value on the line after a
+    label line, and table rows whose first cell is a label ("Caj Semasa | RM 2,366.60").
+    """
+    found: list[tuple[str, str, list[str]]] = []
+    for page in iter_pages(ocr_obj):
+        for section in page.get("sections", []) or []:
+            if not isinstance(section, dict) or section.get("type") == "table_header":
+                continue
+            sec_type = section.get("type")
+            content = str(section.get("content") or "")
+            if sec_type == "table_row":
+                cells = line_items._split_cells(content)
+                if len(cells) > 1 and cells[0] and not re.search(r"\d", cells[0]):
+                    found.append((sec_type, _normalize(cells[0]), " ".join(cells[1:]).split()))
+                continue
+
+            for segment in _segments(content):
+                label, sep, rest = segment.partition(":")
+                if sep:
+                    found.append((sec_type, _normalize(label), rest.split()))
+                else:
+                    tokens = segment.split()
+                    for split_at in range(1, len(tokens)):
+                        head = " ".join(tokens[:split_at])
+                        if re.search(r"\d", head):
+                            break
+                        found.append((sec_type, _normalize(head), tokens[split_at:]))
+
+            lines = [line.strip() for line in content.splitlines() if line.strip()]
+            for previous, line in zip(lines, lines[1:]):
+                if not re.search(r"\d", previous):
+                    found.append((sec_type, f"{_normalize(previous)} /", line.split()))
+    return found
+
+
+def _strip_currency(tokens: list[str]) -> list[str]:
+    return [line_items.CURRENCY_PREFIX.sub("", t) or t for t in tokens]
+
+
+def _learn_locator(ocr_obj: object, value: str) -> dict | None:
+    value = str(value).strip()
+    if not value:
+        return None
+
+    sections_by_type: dict[str, int] = {}
+    for page in iter_pages(ocr_obj)[:1]:
+        for section in page.get("sections", []) or []:
+            if not isinstance(section, dict):
+                continue
+            sec_type = section.get("type")
+            index = sections_by_type.get(sec_type, 0)
+            sections_by_type[sec_type] = index + 1
+            if sec_type not in {"table_row", "table_header"} and str(section.get("content") or "").strip() == value:
+                return {"kind": "section", "type": sec_type, "index": index}
+
+    value_tokens = value.split()
+    labelled = _labelled_values(_first_page(ocr_obj))
+    # Exact tokens first; then allow "RM2,344.02" in the OCR for "2,344.02" in the extraction.
+    for strip in (False, True):
+        seen: dict[tuple[str, str], int] = {}
+        for sec_type, label, tokens in labelled:
+            occurrence = seen.get((sec_type, label), 0)
+            seen[(sec_type, label)] = occurrence + 1
+            if strip:
+                tokens = _strip_currency(tokens)
+            for start in range(len(tokens) - len(value_tokens) + 1):
+                if tokens[start:start + len(value_tokens)] == value_tokens:
+                    return {
+                        "kind": "label",
+                        "type": sec_type,
+                        "label": label,
+                        "occurrence": occurrence,
+                        "start": start,
+                        "end": start + len(value_tokens),
+                        "strip_currency": strip,
+                    }
+    return None
+
+
+def _apply_locator(ocr_obj: object, locator: dict) -> str | None:
+    page = _first_page(ocr_obj)
+    if locator["kind"] == "section":
+        matches = [
+            s for p in iter_pages(page) for s in p.get("sections", []) or []
+            if isinstance(s, dict) and s.get("type") == locator["type"]
+        ]
+        if locator["index"] < len(matches):
+            return str(matches[locator["index"]].get("content") or "").strip() or None
+        return None
+
+    matches = [
+        tokens for sec_type, label, tokens in _labelled_values(page)
+        if sec_type == locator["type"] and label == locator["label"]
+    ]
+    if locator["occurrence"] >= len(matches):
+        return None
+    tokens = matches[locator["occurrence"]]
+    if len(tokens) < locator["end"]:
+        return None
+    if locator.get("strip_currency"):
+        tokens = _strip_currency(tokens)
+    return " ".join(tokens[locator["start"]:locator["end"]]) or None
+
+
+# ── Line items ───────────────────────────────────────────────────────────────
+
+def _primary_value(item: dict) -> float | None:
+    for field in ("amount", "debit", "credit", "balance"):
+        number = parse_amount(item.get(field))
+        if number is not None:
+            return number
+    return None
+
+
+def _learn_items(ocr_obj: object, doc_type: str, verified: dict) -> dict | None:
+    """
+    Find the table handling that reproduces the verified line items: which page
+    scope to read and which rows to drop or treat as surcharges.
+    """
+    key = line_items.items_key(doc_type)
+    expected = [_primary_value(item) for item in verified.get(key) or [] if isinstance(item, dict)]
+    surcharge_amounts = {
+        parse_amount(s.get("amount")): s.get("label")
+        for s in verified.get("surcharges") or [] if isinstance(s, dict)
+    }
+
+    for first_page_only in (False, True):
+        view = _first_page(ocr_obj) if first_page_only else ocr_obj
+        table = line_items.find_item_table(view, doc_type)
+        if table is None or table["mismatched"]:
+            continue
+        kept: list[float | None] = []
+        drop: list[str] = []
+        surcharges: list[str] = []
+        for item in line_items.assemble_items(table, doc_type)[0]:
+            value = _primary_value(item)
+            if len(kept) < len(expected) and value == expected[len(kept)]:
+                kept.append(value)
+            elif value in surcharge_amounts:
+                surcharges.append(_row_pattern(item.get("description")))
+            else:
+                drop.append(_row_pattern(item.get("description")))
+        if kept != expected:
+            continue
+        rule = {
+            "first_page_only": first_page_only,
+            "drop_rows": sorted(set(drop)),
+            "surcharge_rows": sorted(set(surcharges)),
+        }
+        # A dropped pattern may also cover rows we need (e.g. the same charges on a
+        # second bill in the file); only keep rules that reproduce the items exactly.
+        applied = _apply_items(ocr_obj, doc_type, rule)
+        if applied and [_primary_value(item) for item in applied[0]] == expected:
+            return rule
+    return None
+
+
+def _apply_items(ocr_obj: object, doc_type: str, items_rule: dict) -> tuple[list[dict], list[dict]] | None:
+    view = _first_page(ocr_obj) if items_rule["first_page_only"] else ocr_obj
+    table = line_items.find_item_table(view, doc_type)
+    if table is None or not table["rows"] or table["mismatched"]:
+        return None
+
+    items: list[dict] = []
+    surcharges: list[dict] = []
+    for item in line_items.assemble_items(table, doc_type)[0]:
+        pattern = _row_pattern(item.get("description"))
+        if pattern in items_rule["surcharge_rows"]:
+            surcharges.append({"label": item.get("description"), "amount": item.get("amount")})
+        elif pattern not in items_rule["drop_rows"]:
+            items.append(item)
+    return items, surcharges
+
+
+# ── Learning ─────────────────────────────────────────────────────────────────
+
+def learn_template(ocr_obj: object, verified: dict, doc_type: str, source: str = "") -> dict:
+    """
+    Build a template from one verified extraction and its OCR.
+
+    The template is marked usable only when every key field the verified
+    extraction filled could be located and the line items were reproduced.
+    """
+    fp = fingerprint(ocr_obj)
+    vendor_name = str(verified.get("vendor_name") or verified.get("account_holder") or "").strip()
+    vendor_key = _normalize(vendor_name)
+    header = next((h for h in fp["headers"] if vendor_key and vendor_key in h), None)
+    if fp["tin"]:
+        anchor = {"tin": fp["tin"]}
+    elif header:
+        anchor = {"header": header}
+    else:
+        anchor = {"text": vendor_key if vendor_key and vendor_key in fp["text"] else None}
+
+    constants: dict[str, object] = {}
+    nested_fields: dict[str, list[str]] = {}
+    locators: dict[str, dict] = {}
+    shapes: dict[str, str] = {}
+    unlocated: list[str] = []
+    items_field = line_items.items_key(doc_type)
+    for field, value in verified.items():
+        if field in CONSTANT_FIELDS:
+            constants[field] = value
+        elif field in {items_field, "surcharges"} or value is None or isinstance(value, list):
+            continue
+        elif isinstance(value, dict):
+            nested_fields[field] = list(value.keys())
+            for sub_field, sub_value in value.items():
+                if sub_value is None or isinstance(sub_value, (dict, list)):
+                    continue
+                locator = _learn_locator(ocr_obj, str(sub_value))
+                if locator:
+                    locators[f"{field}.{sub_field}"] = locator
+                else:
+                    unlocated.append(f"{field}.{sub_field}")
+        else:
+            locator = _learn_locator(ocr_obj, str(value))
+            if locator:
+                locators[field] = locator
+                if DATE_FIELD_PATTERN.search(field):
+                    shapes[field] = _value_shape(value)
+            else:
+                unlocated.append(field)
+
+    problems = [f"key field not located: {f}" for f in unlocated if f in KEY_FIELDS]
+    if not any(anchor.values()):
+        problems.append("no vendor anchor (TIN or vendor name on the first page)")
+
+    items_rule = None
+    if verified.get(items_field):
+        items_rule = _learn_items(ocr_obj, doc_type, verified)
+        if items_rule is None:
+            problems.append("line items not reproducible from the OCR table")
+
+    return {
+        "vendor": vendor_name or "-",
+        "doc_type": doc_type,
+        "anchor": anchor,
+        "layout_hash": fp["layout_hash"],
+        "field_order": list(verified.keys()),
+        "constants": constants,
+        "nested_fields": nested_fields,
+        "locators": locators,
+        "date_shapes": shapes,
+        "items": items_rule,
+        "unlocated": unlocated,
+        "usable": not problems,
+        "problems": problems,
+        "source": source,
+        "learned_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def learn_from_directory(ocr_dir: Path, extraction_dirs: list[Path], verified: set[str] | None = None) -> list[dict]:
+    """
+    Learn one template per (anchor, layout) from extractions paired with OCR by file stem.
+
+    Only extraction files named in verified are used (the ones marked "verified" on
+    the Report Format page, see metadata_store --learn-templates): a template learned
+    from a wrong extraction would repeat its mistakes without the LLM. None uses
+    every file, for directories of hand-checked extractions.
+    """
+    from agents.classifier import _normalize_label
+    from agents.doc_type_model import _stem_key
+
+    ocr_by_stem = {_stem_key(p.stem): p for p in sorted(ocr_dir.glob("*.json"))}
+    templates: dict[tuple[str, str], dict] = {}
+    for extraction_dir in extraction_dirs:
+        for path in sorted(extraction_dir.glob("*.json")):
+            if verified is not None and path.name not in verified:
+                continue
+            ocr_path = ocr_by_stem.get(_stem_key(path.stem))
+            if ocr_path is None:
+                continue
+            try:
+                extraction = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                continue
+            if not isinstance(extraction, dict) or "error" in extraction:
+                continue
+
+            doc_type = _normalize_label(str(extraction.get("document_type") or ""))
+            ocr_obj = load_ocr(ocr_path.read_text(encoding="utf-8"))
+            template = learn_template(ocr_obj, extraction, doc_type, source=path.name)
+            key = (json.dumps(template["anchor"], sort_keys=True), template["layout_hash"])
+            current = templates.get(key)
+            # Prefer usable templates, then the one that locates more fields.
+            rank = (template["usable"], len(template["locators"]))
+            if current is None or rank > (current["usable"], len(current["locators"])):
+                templates[key] = template
+    return list(templates.values())
+
+
+def save_templates(templates: list[dict], path: str | Path | None = None) -> Path:
+    path = Path(path) if path else templates_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(templates, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+_templates_cache: dict[str, tuple[tuple[float, int], list[dict]]] = {}
+
+
+def load_templates(path: str | Path | None = None) -> list[dict]:
+    """The templates file, re-read only when it changes (match_template runs once per document)."""
+    path = Path(path) if path else templates_path()
+    try:
+        stat = path.stat()
+    except OSError:
+        return []
+    signature = (stat.st_mtime, stat.st_size)
+    cached = _templates_cache.get(str(path))
+    if cached and cached[0] == signature:
+        return cached[1]
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return []
+    templates = [t for t in data if isinstance(t, dict)] if isinstance(data, list) else []
+    _templates_cache[str(path)] = (signature, templates)
+    return templates
+
+
+# ── Extraction ───────────────────────────────────────────────────────────────
+
+def match_template(ocr_obj: object, templates: list[dict] | None = None) -> tuple[dict | None, str, str]:
+    """
+    Find the template for a document.
+
+    Returns:
+        (template or None, vendor, outcome) where outcome is "matched",
+        "no_template", "layout_changed" or "unusable".
+    """
+    templates = load_templates() if templates is None else templates
+    fp = fingerprint(ocr_obj)
+    candidates = [t for t in templates if _anchor_matches(t.get("anchor") or {}, fp)]
+    if not candidates:
+        return None, "-", "no_template"
+    for template in candidates:
+        if template.get("layout_hash") == fp["layout_hash"]:
+            if not template.get("usable"):
+                return None, template["vendor"], "unusable"
+            return template, template["vendor"], "matched"
+    return None, candidates[0]["vendor"], "layout_changed"
+
+
+def apply_template(ocr_obj: object, template: dict) -> tuple[dict | None, list[str]]:
+    """
+    Extract a document with a template.
+
+    Returns:
+        (extracted dict or None, validation failures). The dict is None when any check fails.
+    """
+    doc_type = template["doc_type"]
+    items_field = line_items.items_key(doc_type)
+    failures: list[str] = []
+    values: dict[str, object] = dict(template.get("constants") or {})
+    nested: dict[str, dict] = {}
+
+    for field, locator in (template.get("locators") or {}).items():
+        value = _apply_locator(ocr_obj, locator)
+        if value is None:
+            failures.append(f"{field}: not found")
+            continue
+        base_field = field.split(".", 1)[-1]
+        shape = (template.get("date_shapes") or {}).get(field)
+        if shape and _value_shape(value) != shape:
+            failures.append(f"{field}: '{value}' does not look like {shape}")
+        elif MONEY_FIELD_PATTERN.search(base_field) and parse_amount(value) is None:
+            failures.append(f"{field}: '{value}' is not an amount")
+        if "." in field:
+            parent, child = field.split(".", 1)
+            nested.setdefault(parent, {})[child] = value
+        else:
+            values[field] = value
+
+    items_rule = template.get("items")
+    if items_rule:
+        result = _apply_items(ocr_obj, doc_type, items_rule)
+        if result is None or not result[0]:
+            failures.append("line items: table not found")
+        else:
+            values[items_field], surcharges = result
+            if items_rule["surcharge_rows"]:
+                values["surcharges"] = surcharges
+
+    if failures:
+        return None, failures
+
+    extracted: dict[str, object] = {}
+    nested_fields = template.get("nested_fields") or {}
+    for field in template.get("field_order") or []:
+        if field in nested_fields:
+            extracted[field] = {key: nested.get(field, {}).get(key) for key in nested_fields[field]}
+        elif field == items_field:
+            extracted[field] = values.get(field, [])
+        else:
+            extracted[field] = values.get(field)
+    # Same schema and item-sum checks as an LLM extraction: a new layout variant can
+    # locate plausible-looking values in the wrong places.
+    issues = validate(extracted, doc_type)
+    if issues:
+        return None, [f"{i['path']}: {i['problem']}" for i in issues]
+    return extracted, []
+
+
+def extract_with_template(ocr_json_str: str, forced_type: str | None = None) -> tuple[str, tuple[str, dict] | None]:
+    """
+    Try the template path for one OCR output.
+
+    Returns:
+        (vendor, (doc_type, extracted)) on a hit, or (vendor, None) when the
+        caller should run the LLM extraction. vendor is "-" when unknown.
+    """
+    started = time.perf_counter()
+    ocr_obj = load_ocr(ocr_json_str)
+    template, vendor, outcome = match_template(ocr_obj)
+    if template is not None and forced_type and forced_type != template["doc_type"]:
+        template, outcome = None, "type_mismatch"
+
+    extracted = None
+    failures: list[str] = []
+    if template is not None:
+        extracted, failures = apply_template(ocr_obj, template)
+        outcome = "hit" if extracted is not None else "validation_failed"
+
+    if outcome != "no_template":
+        log_usage(vendor, outcome, time.perf_counter() - started, failures)
+    if extracted is None:
+        if failures:
+            print(f"  Template for {vendor} failed validation: {'; '.join(failures[:3])}")
+        return vendor, None
+    print(f"  Extracted with vendor template: {vendor}")
+    return vendor, (template["doc_type"], extracted)
+
+
+# ── Usage log & stats ────────────────────────────────────────────────────────
+
+def log_usage(vendor: str, outcome: str, elapsed_seconds: float, failures: list[str] | None = None) -> None:
+    """
+    Append one template attempt (or, with outcome "llm", one LLM extraction
+    after a template miss) to the usage log.
+    """
+    record = {
+        "timestamp_utc": datetime.now(timezone.utc).isoformat(),
+        "vendor": vendor,
+        "outcome": outcome,
+        "elapsed_seconds": round(elapsed_seconds, 3),
+    }
+    if failures:
+        record["failures"] = failures
+    try:
+        USAGE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(USAGE_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except Exception:
+        pass
+
+
+def usage_stats(log_path: str | Path | None = None) -> list[dict]:
+    """
+    Per-vendor template hit rate and time saved.
+
+    Time saved per hit is the vendor's average measured LLM extraction time
+    (overall average, then DEFAULT_LLM_SECONDS, when the vendor has none)
+    minus the template extraction time.
+    """
+    log_path = Path(log_path) if log_path else USAGE_LOG_PATH
+    records: list[dict] = []
+    if log_path.exists():
+        for line in log_path.read_text(encoding="utf-8").splitlines():
+            try:
+                records.append(json.loads(line))
+            except Exception:
+                continue
+
+    llm_times = [r["elapsed_seconds"] for r in records if r.get("outcome") == "llm"]
+    overall_llm = sum(llm_times) / len(llm_times) if llm_times else DEFAULT_LLM_SECONDS
+
+    vendors: dict[str, dict] = {}
+    for r in records:
+        v = vendors.setdefault(r.get("vendor") or "-", {"attempts": 0, "hits": 0, "template_s": 0.0, "llm": []})
+        if r.get("outcome") == "llm":
+            v["llm"].append(r["elapsed_seconds"])
+            continue
+        v["attempts"] += 1
+        if r.get("outcome") == "hit":
+            v["hits"] += 1
+            v["template_s"] += r.get("elapsed_seconds", 0.0)
+
+    rows: list[dict] = []
+    for vendor, v in sorted(vendors.items()):
+        if not v["attempts"]:
+            continue
+        llm_avg = sum(v["llm"]) / len(v["llm"]) if v["llm"] else overall_llm
+        rows.append({
+            "vendor": vendor,
+            "attempts": v["attempts"],
+            "hits": v["hits"],
+            "hit_rate": round(v["hits"] / v["attempts"], 3) if v["attempts"] else 0.0,
+            "time_saved_seconds": round(max(0.0, v["hits"] * llm_avg - v["template_s"]), 1),
+        })
+    return rows
+
+
+def print_learned(templates: list[dict], output_path: Path) -> None:
+    usable = [t for t in templates if t["usable"]]
+    print(f"Learned {len(templates)} template(s), {len(usable)} usable. Saved to: {output_path}")
+    for t in templates:
+        status = "usable" if t["usable"] else "; ".join(t["problems"])
+        print(f"  {t['vendor'][:40]:40s} {t['doc_type']:18s} {len(t['locators']):3d} locator(s)  {status}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Learn and inspect vendor templates")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    learn_parser = sub.add_parser("learn", help="Learn templates from hand-checked extractions")
+    learn_parser.add_argument("--ocr-dir", default=str(SRC_DIR / "ocr_output"), help="Directory of OCR JSON files")
+    learn_parser.add_argument("--extraction-dir", action="append", required=True,
+                              help="Directory of hand-checked extraction JSON files (repeatable)")
+    learn_parser.add_argument("--output", "-o", default=None, help="Templates file path (.json)")
+
+    sub.add_parser("stats", help="Show per-vendor hit rate and time saved")
+
+    match_parser = sub.add_parser("match", help="Try the templates on one OCR JSON file")
+    match_parser.add_argument("input", help="Path to OCR output JSON file")
+    args = parser.parse_args()
+
+    if args.command == "learn":
+        templates = learn_from_directory(Path(args.ocr_dir), [Path(d) for d in args.extraction_dir])
+        print_learned(templates, save_templates(templates, args.output))
+    elif args.command == "stats":
+        rows = usage_stats()
+        if not rows:
+            print("No template usage recorded yet.")
+        for row in rows:
+            print(f"  {row['vendor'][:40]:40s} {row['hits']:4d}/{row['attempts']:<4d} "
+                  f"hit rate {row['hit_rate']:.0%}  saved {row['time_saved_seconds']:.0f}s")
+    else:
+        ocr_obj = load_ocr(Path(args.input).read_text(encoding="utf-8"))
+        template, vendor, outcome = match_template(ocr_obj)
+        print(f"Vendor: {vendor}  Outcome: {outcome}")
+        if template is None:
+            sys.exit(1)
+        extracted, failures = apply_template(ocr_obj, template)
+        if failures:
+            print("Validation failed:\n  " + "\n  ".join(failures))
+            sys.exit(1)
+        print(json.dumps(extracted, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,9 @@ import streamlit as st
 import json
 import sys
 import base64
-import tempfile
+import hashlib
+import subprocess
+import time
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
@@ -15,10 +17,17 @@ from datetime import datetime
 # Add src to path so we can import our modules
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from pdf_to_images import pdf_to_images
-from ocr_agent import ocr_images_with_chat_model, ocr_image_with_chat_model, _maybe_parse_json
-from orchestrator import run as orchestrator_run, AGENT_REGISTRY
+import doc_index
+import document_catalog
+import job_queue
+import metadata_store
+import tracing
+import usage_analytics
+from orchestrator import AGENT_REGISTRY
+from report_format import REPORT_COLUMNS, format_money_with_currency
 from agents.classifier import classify_document
+from agents import client as llm_pool
+from agents.vendor_templates import usage_stats as vendor_template_stats
 
 # ─── Page Config ─────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -595,7 +604,7 @@ def display_extraction_result(data: dict, doc_type: str = "Unknown"):
             continue
         value = data[key]
         if key in core_money_keys:
-            value = _format_money_with_currency(value, currency_code)
+            value = format_money_with_currency(value, currency_code)
         displayed.append((label, str(value)))
 
     if displayed:
@@ -620,7 +629,7 @@ def display_extraction_result(data: dict, doc_type: str = "Unknown"):
         df.columns = [c.replace("_", " ").title() for c in df.columns]
         for money_col in ("Unit Price", "Tax", "Amount"):
             if money_col in df.columns:
-                df[money_col] = df[money_col].apply(lambda v: _format_money_with_currency(v, currency_code))
+                df[money_col] = df[money_col].apply(lambda v: format_money_with_currency(v, currency_code))
         df = df.dropna(axis=1, how="all")
         if "Low Confidence" in df.columns and not df["Low Confidence"].any():
             df = df.drop(columns=["Low Confidence"])
@@ -646,7 +655,7 @@ def display_extraction_result(data: dict, doc_type: str = "Unknown"):
             continue
         value = data[key]
         if key in total_money_keys:
-            value = _format_money_with_currency(value, currency_code)
+            value = format_money_with_currency(value, currency_code)
         totals.append((label, value))
     if totals:
         st.markdown("#### 💰 Totals & Summary")
@@ -754,229 +763,10 @@ def display_bank_matching(data: dict, report_path: Path = None):
 # REPORT FORMAT HELPERS
 # ═══════════════════════════════════════════════════════════════════════════
 
-REPORT_COLUMNS = [
-    "No", "Company Name", "TIN No", "Types (Inv/CN)", "Invoice No",
-    "No. Invois Cukai", "Invoice Date", "Tarikh Invois", "No. Akaun",
-    "Lot No", "Location", "Account No", "Lease ID", "Unit No", "Project",
-    "Premise Address", "Contract No / Batch No", "Contract Account No",
-    "Description", "Jumlah perlu dibayar\n(Including tax)", "Amaun Elektrik",
-    "LHDN UUID", "Validate On", "Kwh Reading Before", "Kwh Reading After",
-    "Current Reading / Total Units",
-]
-
-
-def _safe(d: dict, *keys, default=""):
-    """Dig through nested dicts safely."""
-    cur = d
-    for k in keys:
-        if isinstance(cur, dict):
-            cur = cur.get(k, default)
-        else:
-            return default
-    return cur if cur not in (None, "") else default
-
-
-def _format_money_with_currency(value: object, currency: str) -> str:
-    if value in (None, ""):
-        return ""
-
-    text = str(value).strip()
-    if not text:
-        return ""
-
-    currency_code = (currency or "").strip().upper()
-    if not currency_code:
-        return text
-
-    if text.upper().startswith(f"{currency_code} ") or text.upper() == currency_code:
-        return text
-
-    return f"{currency_code} {text}"
-
-
-def _parse_lot_no(data: dict) -> str:
-    """Extract Lot No from bill_to or additional_fields."""
-    bill_to = _safe(data, "bill_to")
-    if isinstance(bill_to, str):
-        import re
-        m = re.search(r"Lot\s*No\.?\s*[:：]?\s*(\S+)", bill_to, re.IGNORECASE)
-        if m:
-            return m.group(1)
-    return _safe(data, "additional_fields", "Lot No")
-
-
-def _parse_unit_no(data: dict) -> str:
-    """Extract Unit No from line items or additional_fields."""
-    af = _safe(data, "additional_fields", "Unit No")
-    if af:
-        return af
-    for item in data.get("line_items", []):
-        desc = item.get("description", "") or item.get("product_description", "") or ""
-        import re
-        m = re.search(r"Unit\s*No\.?\s*[:：]?\s*(\S+)", desc, re.IGNORECASE)
-        if m:
-            return m.group(1)
-    return ""
-
-
-def _parse_location(data: dict) -> str:
-    """Extract location from line items description or bill_to."""
-    for item in data.get("line_items", []):
-        desc = item.get("description", "") or ""
-        if "Mall" in desc or "Hotel" in desc or "Plaza" in desc:
-            import re
-            m = re.search(r"(?:The\s+\w+\s+Mall|[\w\s]+Mall|[\w\s]+Hotel|[\w\s]+Plaza)", desc)
-            if m:
-                return m.group(0).strip()
-    return ""
-
-
-def _parse_kwh_readings(data: dict) -> tuple:
-    """Parse kWh meter readings from utility bill line items."""
-    readings_before, readings_after, total_units = [], [], []
-    for item in data.get("line_items", []):
-        desc = item.get("description", "") or ""
-        import re
-        m = re.search(r"Meter Readings?\s*([\d,]+(?:\.\d+)?)\s*[-–]\s*([\d,]+(?:\.\d+)?)", desc)
-        if m:
-            before = m.group(1).replace(",", "")
-            after = m.group(2).replace(",", "")
-            if before not in readings_before:
-                readings_before.append(before)
-            if after not in readings_after:
-                readings_after.append(after)
-        qty = item.get("quantity")
-        if qty and desc and "Meter" in desc:
-            total_units.append(str(qty))
-    return (
-        " / ".join(readings_before) if readings_before else "",
-        " / ".join(readings_after) if readings_after else "",
-        " / ".join(total_units) if total_units else "",
-    )
-
-
-def _electricity_amount(data: dict) -> str:
-    """Sum electricity charge amounts for utility bills."""
-    for item in data.get("line_items", []):
-        desc = (item.get("description", "") or "").lower()
-        if "electricity" in desc and item.get("amount"):
-            return str(item["amount"])
-    return ""
-
-
-def _build_description(data: dict) -> str:
-    """Build a short description from line items."""
-    descs = []
-    for item in data.get("line_items", []):
-        d = item.get("description") or item.get("product_description") or ""
-        first_line = d.split("\n")[0].strip()
-        if first_line and first_line not in descs:
-            descs.append(first_line)
-    return "; ".join(descs[:4]) + ("..." if len(descs) > 4 else "")
-
-
-def _doc_type_label(data: dict) -> str:
-    """Return the document type label (Inv / CN / Utility / etc.)."""
-    dt = (_safe(data, "document_type") or "").lower()
-    if "credit" in dt:
-        return "CN"
-    if "utility" in dt:
-        return "Utility"
-    if "rental" in dt or "lease" in dt:
-        return "Rental"
-    if "statement" in dt:
-        return "SOA"
-    if "hotel" in dt:
-        return "Hotel"
-    if "travel" in dt:
-        return "Travel"
-    return "Inv"
-
-
-def map_extraction_to_report_row(data: dict, index: int) -> dict:
-    """Map a single extraction JSON to a report format row."""
-    af = data.get("additional_fields", {}) or {}
-    currency_code = str(_safe(data, "currency") or "").strip().upper()
-    kwh_before, kwh_after, total_units = _parse_kwh_readings(data)
-
-    invoice_no = (
-        _safe(data, "invoice_number")
-        or _safe(data, "document_number")
-        or _safe(data, "statement_number")
-        or ""
-    )
-    invoice_date = (
-        _safe(data, "invoice_date")
-        or _safe(data, "document_date")
-        or _safe(data, "statement_date")
-        or _safe(af, "Invoice Date")
-        or ""
-    )
-    account_no = (
-        _safe(data, "account_number")
-        or _safe(data, "customer_account")
-        or _safe(af, "Account No")
-        or _safe(data, "payment_info", "account_number")
-        or ""
-    )
-
-    return {
-        "No": index,
-        "Company Name": _safe(data, "vendor_name"),
-        "TIN No": _safe(af, "TIN No.") or _safe(af, "TIN No"),
-        "Types (Inv/CN)": _doc_type_label(data),
-        "Invoice No": invoice_no,
-        "No. Invois Cukai": _safe(af, "No. Invois Cukai") or _safe(af, "Tax Invoice No"),
-        "Invoice Date": invoice_date,
-        "Tarikh Invois": invoice_date,
-        "No. Akaun": account_no,
-        "Lot No": _parse_lot_no(data),
-        "Location": _parse_location(data),
-        "Account No": account_no,
-        "Lease ID": _safe(af, "Lease ID"),
-        "Unit No": _parse_unit_no(data),
-        "Project": _safe(af, "Project") or _safe(af, "Project Name"),
-        "Premise Address": _safe(data, "service_address") or _safe(data, "bill_to"),
-        "Contract No / Batch No": _safe(af, "Contract No") or _safe(af, "Batch No") or _safe(af, "Contract No / Batch No"),
-        "Contract Account No": _safe(af, "Contract Account No"),
-        "Description": _build_description(data),
-        "Jumlah perlu dibayar\n(Including tax)": _format_money_with_currency(
-            _safe(data, "grand_total") or _safe(data, "total_amount"),
-            currency_code,
-        ),
-        "Amaun Elektrik": _format_money_with_currency(_electricity_amount(data), currency_code),
-        "LHDN UUID": _safe(af, "LHDN UUID") or _safe(af, "e-Invoice UUID"),
-        "Validate On": _safe(af, "Validate On") or _safe(af, "Validated On"),
-        "Kwh Reading Before": kwh_before,
-        "Kwh Reading After": kwh_after,
-        "Current Reading / Total Units": total_units,
-    }
-
-
-def load_all_extraction_rows() -> pd.DataFrame:
-    """Load all extraction JSON files and map to report DataFrame."""
-    extraction_dir = Path(__file__).resolve().parent / "extraction_output"
-    rows = []
-    if extraction_dir.exists():
-        files = sorted(
-            [
-                f for f in extraction_dir.glob("*.json")
-                if f.name not in {"bank_matching_results.json"}
-            ]
-        )
-        for i, f in enumerate(files, start=1):
-            try:
-                data = json.loads(f.read_text(encoding="utf-8"))
-                if isinstance(data, dict):
-                    # Skip bank statement extractions – they lack invoice-level fields
-                    dt_lower = (data.get("document_type") or "").lower()
-                    if "bank statement" in dt_lower:
-                        continue
-                    row = map_extraction_to_report_row(data, i)
-                    row["_source_file"] = f.name
-                    rows.append(row)
-            except Exception:
-                pass
+def load_all_extraction_rows(role: str = "admin") -> pd.DataFrame:
+    """Report rows for the role's extractions, from the metadata store."""
+    metadata_store.sync()
+    rows = metadata_store.report_rows(role)
     # Re-number rows sequentially after skipping
     for idx, row in enumerate(rows, start=1):
         row["No"] = idx
@@ -990,159 +780,131 @@ def load_all_extraction_rows() -> pd.DataFrame:
     return df
 
 
-def _team_from_doc_type(doc_type: str) -> str:
-    text = (doc_type or "").strip().lower()
-    if "rental" in text or "lease" in text or "utility" in text:
-        return "rental"
-    return "sales"
+JOB_POLL_SECONDS = 2
+PAGE_SIZE = 20
 
 
-def _doc_team_map_path() -> Path:
-    return Path(__file__).resolve().parent / "docs" / "database" / "doc_teams.json"
+def ensure_pipeline_worker() -> None:
+    """Start a background worker process if none is heart-beating."""
+    if job_queue.live_workers():
+        return
+    app_dir = Path(__file__).resolve().parent
+    log_path = app_dir / "jobs" / "worker.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as log_file:
+        subprocess.Popen(
+            [sys.executable, str(app_dir / "worker.py"), "--concurrency", "2"],
+            cwd=str(app_dir),
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
 
 
-def load_doc_team_map() -> dict[str, str]:
-    path = _doc_team_map_path()
-    if not path.exists():
-        return {}
-    try:
-        data = json.loads(path.read_text(encoding="utf-8"))
-        if isinstance(data, dict):
-            return {str(k): str(v).lower() for k, v in data.items()}
-    except Exception:
-        pass
-    return {}
-
-
-def save_doc_team_map(doc_team_map: dict[str, str]) -> None:
-    path = _doc_team_map_path()
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(doc_team_map, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
-def infer_document_team(file_path: Path, doc_team_map: dict[str, str]) -> str:
-    mapped = doc_team_map.get(file_path.name)
-    if mapped in {"sales", "rental"}:
-        return mapped
-
-    extraction_dir = Path(__file__).resolve().parent / "extraction_output"
-    if extraction_dir.exists():
-        candidates = sorted(
-            [
-                p for p in extraction_dir.glob("*.json")
-                if p.name not in {"bank_matching_results.json"}
-                and (p.stem == file_path.stem or p.stem.startswith(file_path.stem + "_extracted"))
-            ],
-            key=lambda p: p.stat().st_mtime,
-            reverse=True,
-        )
-        for candidate in candidates:
-            try:
-                data = json.loads(candidate.read_text(encoding="utf-8"))
-                if isinstance(data, dict):
-                    return _team_from_doc_type(str(data.get("document_type") or ""))
-            except Exception:
-                continue
+def display_pipeline_job(job: dict) -> None:
+    """Progress, controls and (when finished) results for one queued pipeline job."""
+    label = job_queue.status_label(job)
+    st.markdown(f"**Job #{job['id']}** — {label}")
+    if job["status"] in job_queue.ACTIVE_STATES:
+        detail = f" · {job['detail']}" if job.get("detail") else ""
+        st.progress(job["progress"] / 100, text=f"{(job.get('stage') or 'waiting for a worker').title()}{detail}")
+        if job.get("error"):
+            st.caption(f"Previous attempt failed: {job['error']}")
+        if st.button("Cancel job", key=f"cancel_job_{job['id']}"):
+            job_queue.cancel(job["id"])
+            st.rerun()
+        st.caption("You can leave this page; the job keeps running in the background.")
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
+    if job["status"] in {job_queue.FAILED, job_queue.CANCELLED}:
+        if job.get("error"):
+            st.error(f"❌ {job['error']}")
+        if st.button("Retry job", key=f"retry_job_{job['id']}"):
+            job_queue.retry(job["id"])
+            ensure_pipeline_worker()
+            st.rerun()
+        return
+
+    display_pipeline_result(job.get("result") or {})
+
+
+def display_pipeline_result(result: dict) -> None:
+    """Result tabs and downloads for a finished pipeline run (or results reused from one)."""
+    ocr_parsed = load_json_file(Path(result["ocr_output"]))
+    extracted = load_json_file(Path(result["extraction_output"]))
+    doc_type_result = result.get("doc_type") or (
+        extracted.get("document_type") if isinstance(extracted, dict) else None
+    ) or "Unknown"
+    st.session_state.ocr_result = ocr_parsed
+    st.session_state.doc_type = doc_type_result
+    st.session_state.extraction_result = extracted
+
+    st.markdown("### 📋 Results")
+    tab_ext, tab_ocr, tab_json = st.tabs(["📊 Extracted Data", "🔍 OCR Output", "📝 Raw JSON"])
+    with tab_ext:
+        display_extraction_result(extracted, doc_type_result)
+    with tab_ocr:
+        display_ocr_result(ocr_parsed if isinstance(ocr_parsed, dict) else {"raw": ocr_parsed})
+    with tab_json:
+        jc1, jc2 = st.columns(2)
+        with jc1:
+            st.markdown("**OCR Output**")
+            st.json(ocr_parsed)
+        with jc2:
+            st.markdown("**Extraction Output**")
+            st.json(extracted)
+
+    st.success(
+        f"Saved results to `{Path(result['ocr_output']).name}` and `{Path(result['extraction_output']).name}`. "
+        "These are now available in OCR Viewer, Extraction Viewer, and Report Format."
+    )
+    stem = Path(result["extraction_output"]).stem
+    dc1, dc2 = st.columns(2)
+    with dc1:
+        st.download_button("⬇️ Download OCR JSON",
+            data=json.dumps(ocr_parsed, ensure_ascii=False, indent=2),
+            file_name=f"{stem}_ocr.json", mime="application/json")
+    with dc2:
+        st.download_button("⬇️ Download Extraction JSON",
+            data=json.dumps(extracted, ensure_ascii=False, indent=2),
+            file_name=f"{stem}_extracted.json", mime="application/json")
+
 
-    name_l = file_path.name.lower()
-    if any(token in name_l for token in ["rental", "lease", "ll_"]):
-        return "rental"
-    return "sales"
+def infer_document_team(file_path: Path) -> str:
+    return metadata_store.team_for(file_path.name)
 
 
-def find_source_pdf_for_extraction(source_file: str) -> Path | None:
+def find_source_pdf_for_extraction(source_file: str, catalog: dict | None = None) -> Path | None:
     """Match extraction JSON source filename to original PDF in docs/database."""
-    if not source_file:
-        return None
+    return document_catalog.source_pdf(source_file, catalog)
 
-    database_dir = Path(__file__).resolve().parent / "docs" / "database"
-    if not database_dir.exists():
-        return None
-
-    source_stem = Path(source_file).stem
-    base = source_stem.replace("_extracted", "")
-
-    exact_name = f"{base}.pdf"
-    exact_path = database_dir / exact_name
-    if exact_path.exists():
-        return exact_path
-
-    pdf_files = [p for p in database_dir.iterdir() if p.is_file() and p.suffix.lower() == ".pdf"]
-    for pdf in pdf_files:
-        if pdf.name.lower() == exact_name.lower():
-            return pdf
-
-    for pdf in pdf_files:
-        if pdf.stem.lower().startswith(base.lower()):
-            return pdf
-
-    return None
-
-
-def load_extraction_repository_items() -> list[dict]:
-    """Build row data for Extraction Viewer repository layout."""
-    extraction_dir = Path(__file__).resolve().parent / "extraction_output"
-    if not extraction_dir.exists():
-        return []
-
-    items: list[dict] = []
-    files = sorted(
-        [
-            f for f in extraction_dir.glob("*.json")
-            if f.name not in {"bank_matching_results.json"}
-        ],
-        key=lambda p: p.stat().st_mtime,
-        reverse=True,
-    )
-    for f in files:
-        try:
-            data = json.loads(f.read_text(encoding="utf-8"))
-        except Exception:
-            continue
-        if not isinstance(data, dict):
-            continue
 
-        additional = data.get("additional_fields", {}) or {}
-        invoice_id = (
-            data.get("invoice_number")
-            or data.get("document_number")
-            or data.get("statement_number")
-            or f.stem.replace("_extracted", "")
-        )
-        vendor = (
-            data.get("vendor_name")
-            or data.get("customer_name")
-            or data.get("account_holder")
-            or "-"
-        )
-        date_text = (
-            data.get("invoice_date")
-            or data.get("document_date")
-            or data.get("statement_date")
-            or "-"
-        )
-        currency_code = str(data.get("currency") or "").strip().upper()
-        total_raw = data.get("grand_total") or data.get("total_amount") or data.get("subtotal") or ""
-        total_text = _format_money_with_currency(total_raw, currency_code) if total_raw else "-"
-        team = _team_from_doc_type(str(data.get("document_type") or ""))
-
-        status_text = st.session_state["processing_doc_status"].get(f.name, "Ready for Review")
-
-        items.append(
-            {
-                "invoice_id": str(invoice_id),
-                "vendor": str(vendor),
-                "date": str(date_text),
-                "total": str(total_text),
-                "status": str(status_text),
-                "team": team,
-                "last_updated": datetime.fromtimestamp(f.stat().st_mtime).strftime("%Y-%m-%d"),
-                "source_file": f.name,
-                "data": data,
-            }
-        )
+def current_list_page(key: str, list_query: tuple) -> int:
+    """Page index to show for a paginated list; back to the first page when its query (filters, sort) changes."""
+    if st.session_state.get(f"{key}_query") != list_query:
+        st.session_state[f"{key}_query"] = list_query
+        st.session_state[f"{key}_page"] = 0
+    return st.session_state.get(f"{key}_page", 0)
+
 
-    return items
+def render_page_controls(key: str, page_index: int, total: int) -> None:
+    """Previous / Next buttons and "Page x of y" for a list of total rows, PAGE_SIZE per page."""
+    page_count = max(1, -(-total // PAGE_SIZE))
+    if page_index >= page_count:
+        # Rows were removed (or the role changed) since the page was chosen.
+        st.session_state[f"{key}_page"] = page_count - 1
+        st.rerun()
+    if page_count == 1:
+        return
+    p1, p2, p3 = st.columns([1, 2, 1])
+    if p1.button("← Previous", key=f"{key}_prev", disabled=page_index == 0):
+        st.session_state[f"{key}_page"] = page_index - 1
+        st.rerun()
+    p2.caption(f"Page {page_index + 1} of {page_count}")
+    if p3.button("Next →", key=f"{key}_next", disabled=page_index + 1 >= page_count):
+        st.session_state[f"{key}_page"] = page_index + 1
+        st.rerun()
 
 
 def _normalize_lease_id(lid: str) -> str:
@@ -1262,6 +1024,8 @@ with st.sidebar:
         "🔍 OCR Viewer",
         "📊 Extraction Viewer",
         "📋 Report Format",
+        "⏱️ Traces",
+        "💰 Usage & Cost",
     ]
     if current_role == "admin":
         _nav_pages.append("🏦 Bank Matching")
@@ -1305,12 +1069,10 @@ with st.sidebar:
 for key in ("ocr_result", "extraction_result", "doc_type", "uploaded_images", "processing_stage"):
     if key not in st.session_state:
         st.session_state[key] = None
-if "doc_status" not in st.session_state:
-    st.session_state["doc_status"] = {}  # {row_no: "verified"|"rejected"|"pending"}
-if "processing_doc_status" not in st.session_state:
-    st.session_state["processing_doc_status"] = {}
 if "processing_selected_doc" not in st.session_state:
     st.session_state["processing_selected_doc"] = None
+if "processing_saved_uploads" not in st.session_state:
+    st.session_state["processing_saved_uploads"] = {}  # {upload id: {"path", "team", "job_id", "duplicate_of", "record"}}
 if "extraction_selected_file" not in st.session_state:
     st.session_state["extraction_selected_file"] = None
 if "report_preview_source" not in st.session_state:
@@ -1336,139 +1098,106 @@ if page == "📤 Document Processing":
         ocr_mode = st.radio("OCR Mode", ["Batch (all pages)", "Per-page"], index=0)
         upload_team_choice = st.selectbox("Document Team", ["Auto", "Sales", "Rental"], index=0)
 
+    pool_rows = llm_pool.metrics()
+    if len(pool_rows) > 1 or any(row["requests"] for row in pool_rows):
+        with st.expander("🔌 Model Endpoints — load & health", expanded=False):
+            st.dataframe(pd.DataFrame(pool_rows), use_container_width=True, hide_index=True)
+            stage_rows = llm_pool.stage_metrics()
+            if stage_rows:
+                st.caption("Per-stage latency, hedged requests and deadline misses")
+                st.dataframe(pd.DataFrame(stage_rows), use_container_width=True, hide_index=True)
+
+    queue_rows = job_queue.priority_stats()
+    if any(row["queued"] or row["running"] or row["p95_wait_seconds"] is not None for row in queue_rows):
+        with st.expander("🚦 Job Queue — priority classes", expanded=False):
+            st.dataframe(
+                pd.DataFrame(queue_rows).rename(columns={
+                    "priority": "Class", "queued": "Queued", "running": "Running",
+                    "p50_wait_seconds": "p50 Wait (s)", "p95_wait_seconds": "p95 Wait (s)",
+                }),
+                use_container_width=True,
+                hide_index=True,
+            )
+            st.caption("Uploads from this page run as interactive and preempt bulk backfills at request boundaries.")
+
     if uploaded_file is not None:
-        uploaded_bytes = uploaded_file.getvalue()
         app_dir = Path(__file__).resolve().parent
         database_dir = app_dir / "docs" / "database"
         database_dir.mkdir(parents=True, exist_ok=True)
 
-        database_path = database_dir / uploaded_file.name
-        if database_path.exists():
-            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            database_path = database_dir / f"{database_path.stem}_{stamp}{database_path.suffix}"
-        database_path.write_bytes(uploaded_bytes)
-
-        doc_team_map = load_doc_team_map()
-        assigned_team = upload_team_choice.lower()
-        if assigned_team == "auto":
-            assigned_team = _team_from_doc_type(force_type if force_type != "Auto-detect" else "")
-        doc_team_map[database_path.name] = assigned_team
-        save_doc_team_map(doc_team_map)
-
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            pdf_path = Path(tmp_dir) / uploaded_file.name
-            pdf_path.write_bytes(uploaded_bytes)
-            st.markdown(f"**📄 Uploaded:** `{uploaded_file.name}` ({uploaded_file.size / 1024:.1f} KB)")
-            st.caption(f"Stored in database: `{database_path.name}` | Team: `{assigned_team.title()}`")
-
-            if st.button("🚀 Run Full Pipeline", type="primary", use_container_width=True):
-                with st.status("🔄 Processing document...", expanded=True) as status:
-                    progress = st.progress(0)
-
-                    # Step 1: PDF to Images
-                    st.write("**Step 1/4:** Converting PDF to images...")
-                    try:
-                        image_dir = Path(tmp_dir) / f"{pdf_path.stem}_images"
-                        image_paths = pdf_to_images(pdf_path, image_dir)
-                        progress.progress(20)
-                        st.write(f"  ✅ Converted to **{len(image_paths)} page(s)**")
-                        tcols = st.columns(min(len(image_paths), 6))
-                        for i, ip in enumerate(image_paths[:6]):
-                            with tcols[i]:
-                                st.image(str(ip), caption=f"Page {i+1}", width=110)
-                    except Exception as e:
-                        st.error(f"❌ PDF conversion failed: {e}")
-                        st.stop()
-
-                    # Step 2: OCR
-                    st.write("**Step 2/4:** Running AI-powered OCR...")
-                    try:
-                        user_prompt = (
-                            "Transcribe ALL visible text from this document image exactly as it appears. "
-                            "Output the result as a single valid JSON object following the schema in your instructions. "
-                            "Do NOT interpret, summarize, or calculate anything. "
-                            "Preserve all numbers, punctuation, and formatting exactly."
-                        )
-                        if ocr_mode.startswith("Batch"):
-                            raw_ocr = ocr_images_with_chat_model(image_paths, user_prompt)
-                            ocr_parsed = _maybe_parse_json(raw_ocr)
-                            ocr_json_str = raw_ocr if isinstance(raw_ocr, str) else json.dumps(ocr_parsed, ensure_ascii=False)
-                        else:
-                            pages_list = []
-                            for idx, ip in enumerate(image_paths):
-                                st.write(f"  OCR page {idx+1}/{len(image_paths)}...")
-                                raw = ocr_image_with_chat_model(ip, user_prompt)
-                                pages_list.append({"page_number": idx+1, "file": ip.name, "model_output": _maybe_parse_json(raw)})
-                            ocr_parsed = {"mode": "per_image", "results": pages_list}
-                            ocr_json_str = json.dumps(ocr_parsed, ensure_ascii=False)
-                        st.session_state.ocr_result = ocr_parsed
-                        progress.progress(60)
-                        st.write("  ✅ OCR complete")
-                    except Exception as e:
-                        st.error(f"❌ OCR failed: {e}")
-                        st.stop()
-
-                    # Step 3 & 4: Classify + Extract
-                    st.write("**Step 3/4:** Classifying & extracting...")
-                    try:
-                        forced = None if force_type == "Auto-detect" else force_type
-                        doc_type_result, extracted = orchestrator_run(ocr_json_str, forced_type=forced)
-                        st.session_state.doc_type = doc_type_result
-                        st.session_state.extraction_result = extracted
-                        progress.progress(95)
-                        st.write(f"  ✅ Classified as: **{doc_type_result.replace('_',' ').title()}**")
-                    except Exception as e:
-                        st.error(f"❌ Extraction failed: {e}")
-                        st.stop()
-
-                    progress.progress(100)
-                    status.update(label="✅ Pipeline complete!", state="complete", expanded=True)
-
-                st.divider()
-                st.markdown("### 📋 Results")
-                tab_ext, tab_ocr, tab_json = st.tabs(["📊 Extracted Data", "🔍 OCR Output", "📝 Raw JSON"])
-                with tab_ext:
-                    display_extraction_result(extracted, doc_type_result)
-                with tab_ocr:
-                    display_ocr_result(ocr_parsed if isinstance(ocr_parsed, dict) else {"raw": ocr_parsed})
-                with tab_json:
-                    jc1, jc2 = st.columns(2)
-                    with jc1:
-                        st.markdown("**OCR Output**")
-                        st.json(ocr_parsed)
-                    with jc2:
-                        st.markdown("**Extraction Output**")
-                        st.json(extracted)
-
-                save_base_name = pdf_path.stem
-                app_dir = Path(__file__).resolve().parent
-                ocr_output_dir = app_dir / "ocr_output"
-                extraction_output_dir = app_dir / "extraction_output"
-                ocr_output_dir.mkdir(parents=True, exist_ok=True)
-                extraction_output_dir.mkdir(parents=True, exist_ok=True)
-
-                ocr_output_path = ocr_output_dir / f"{save_base_name}.json"
-                extraction_output_path = extraction_output_dir / f"{save_base_name}.json"
-
-                with open(ocr_output_path, "w", encoding="utf-8") as f:
-                    json.dump(ocr_parsed, f, ensure_ascii=False, indent=2)
-                with open(extraction_output_path, "w", encoding="utf-8") as f:
-                    json.dump(extracted, f, ensure_ascii=False, indent=2)
-
-                st.success(
-                    f"Saved results to `{ocr_output_path.name}` and `{extraction_output_path.name}`. "
-                    "These are now available in OCR Viewer, Extraction Viewer, and Report Format."
+        # Store each upload once; the page reruns while a job is polled.
+        upload_key = getattr(uploaded_file, "file_id", None) or f"{uploaded_file.name}:{uploaded_file.size}"
+        saved_uploads = st.session_state["processing_saved_uploads"]
+        if upload_key not in saved_uploads:
+            upload_bytes = uploaded_file.getvalue()
+            upload_digest = hashlib.sha256(upload_bytes).hexdigest()
+            stored = doc_index.lookup(upload_digest)
+            if stored:
+                # Byte-identical to a stored document: link to it instead of storing and processing a copy.
+                if stored["file_name"] != uploaded_file.name:
+                    doc_index.link_alias(uploaded_file.name, upload_digest)
+                stored_job = job_queue.latest_jobs_by_file([stored["file_name"]]).get(stored["file_name"])
+                saved_uploads[upload_key] = {
+                    "path": stored["path"],
+                    "team": infer_document_team(Path(stored["path"])),
+                    "job_id": stored_job["id"] if stored_job else None,
+                    "duplicate_of": stored["file_name"],
+                    "record": stored,
+                }
+            else:
+                database_path = database_dir / uploaded_file.name
+                if database_path.exists():
+                    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    database_path = database_dir / f"{database_path.stem}_{stamp}{database_path.suffix}"
+                database_path.write_bytes(upload_bytes)
+
+                assigned_team = upload_team_choice.lower()
+                if assigned_team == "auto":
+                    assigned_team = metadata_store.team_from_doc_type(force_type if force_type != "Auto-detect" else "")
+                metadata_store.assign_team(database_path.name, assigned_team)
+                saved_uploads[upload_key] = {
+                    "path": str(database_path),
+                    "team": assigned_team,
+                    "job_id": None,
+                    "duplicate_of": None,
+                    "record": doc_index.register(database_path, upload_digest),
+                }
+
+        upload = saved_uploads[upload_key]
+        database_path = Path(upload["path"])
+        st.markdown(f"**📄 Uploaded:** `{uploaded_file.name}` ({uploaded_file.size / 1024:.1f} KB)")
+        st.caption(f"Stored in database: `{database_path.name}` | Team: `{upload['team'].title()}`")
+        record = upload.get("record") or {}
+        if upload.get("duplicate_of"):
+            st.info(
+                f"♻️ Identical to `{upload['duplicate_of']}` already in the database — linked to that record "
+                "instead of storing another copy."
+            )
+        elif record.get("similar_to"):
+            similar = doc_index.lookup(record["similar_to"])
+            if similar:
+                st.warning(
+                    f"⚠️ Similar to `{similar['file_name']}` ({record['similarity']:.0%} match) — "
+                    "possibly a re-scan or re-issued document. Flagged for review."
                 )
 
-                dc1, dc2 = st.columns(2)
-                with dc1:
-                    st.download_button("⬇️ Download OCR JSON",
-                        data=json.dumps(ocr_parsed, ensure_ascii=False, indent=2),
-                        file_name=f"{pdf_path.stem}_ocr.json", mime="application/json")
-                with dc2:
-                    st.download_button("⬇️ Download Extraction JSON",
-                        data=json.dumps(extracted, ensure_ascii=False, indent=2),
-                        file_name=f"{pdf_path.stem}_extracted.json", mime="application/json")
+        if st.button("🚀 Run Full Pipeline", type="primary", use_container_width=True):
+            upload["job_id"] = job_queue.enqueue(database_path, {
+                "forced_type": None if force_type == "Auto-detect" else force_type,
+                "batch_ocr": ocr_mode.startswith("Batch"),
+                "save_stem": Path(upload["duplicate_of"] or uploaded_file.name).stem,
+            }, priority=job_queue.INTERACTIVE)
+            ensure_pipeline_worker()
+            st.rerun()
+
+        job = job_queue.get_job(upload["job_id"]) if upload["job_id"] else None
+        if job is not None:
+            display_pipeline_job(job)
+        elif upload.get("duplicate_of"):
+            reused = doc_index.prior_result(upload["record"])
+            if reused:
+                st.caption("Showing the results already produced for this document.")
+                display_pipeline_result(reused)
 
     st.divider()
 
@@ -1476,20 +1205,40 @@ if page == "📤 Document Processing":
     st.caption("Upload and manage document processing")
 
     database_dir = Path(__file__).resolve().parent / "docs" / "database"
-    source_docs = (
-        sorted([p for p in database_dir.iterdir() if p.is_file()], key=lambda p: p.stat().st_mtime, reverse=True)
-        if database_dir.exists()
-        else []
+    metadata_store.sync()
+    doc_sort_options = {"Upload Date": "uploaded", "File Name": "file_name", "Size": "size", "Team": "team"}
+    d1, d2, d3, d4 = st.columns([2, 1, 1, 0.6])
+    with d1:
+        doc_name_filter = st.text_input("File name", placeholder="Filter by file name...")
+    with d2:
+        # Sales and rental only ever see their own team's documents.
+        doc_team_filter = st.selectbox(
+            "Team", ["All Teams", "Sales", "Rental"], disabled=current_role != "admin"
+        )
+    with d3:
+        doc_sort_label = st.selectbox("Sort by", list(doc_sort_options), key="doc_sort")
+    with d4:
+        doc_sort_descending = st.toggle("Descending", value=True, key="doc_sort_descending")
+
+    doc_team = None if doc_team_filter == "All Teams" or current_role != "admin" else doc_team_filter.lower()
+    doc_list_page = current_list_page(
+        "document_list",
+        (current_role, doc_name_filter.strip(), doc_team, doc_sort_label, doc_sort_descending),
     )
-    doc_team_map = load_doc_team_map()
-    source_docs_with_team = [(p, infer_document_team(p, doc_team_map)) for p in source_docs]
-    visible_source_docs = (
-        source_docs_with_team
-        if current_role == "admin"
-        else [(p, team) for p, team in source_docs_with_team if team == current_role]
+    doc_count, visible_source_docs = metadata_store.documents(
+        current_role, name=doc_name_filter, team=doc_team,
+        sort=doc_sort_options[doc_sort_label], descending=doc_sort_descending,
+        limit=PAGE_SIZE, offset=doc_list_page * PAGE_SIZE,
     )
 
-    st.markdown(f"#### All Documents ({len(visible_source_docs)})")
+    st.markdown(f"#### All Documents ({doc_count})")
+    render_page_controls("document_list", doc_list_page, doc_count)
+    doc_jobs = job_queue.latest_jobs_by_file([doc["file_name"] for doc in visible_source_docs])
+    doc_index.sync(database_dir)
+    similar_flags = {
+        row["file_name"]: row
+        for row in doc_index.similar_documents([doc["file_name"] for doc in visible_source_docs])
+    }
 
     if visible_source_docs:
         h1, h2, h3, h4, h5, h6, h7 = st.columns([1.2, 3.2, 1.0, 1.0, 1.3, 1.7, 2.4])
@@ -1501,16 +1250,21 @@ if page == "📤 Document Processing":
         h6.markdown("**Status**")
         h7.markdown("**Actions**")
 
-        for idx, (file_path, _team) in enumerate(visible_source_docs, start=1):
+        for idx, doc in enumerate(visible_source_docs, start=doc_list_page * PAGE_SIZE + 1):
+            file_path = doc["path"]
             display_file_name = file_path.name
             file_type = file_path.suffix.replace(".", "").upper() or "FILE"
-            file_size_mb = file_path.stat().st_size / (1024 * 1024)
-            upload_date = datetime.fromtimestamp(file_path.stat().st_mtime).strftime("%Y-%m-%d")
-            status = st.session_state["processing_doc_status"].get(file_path.name, "Ready for Review")
+            file_size_mb = (doc["size"] or 0) / (1024 * 1024)
+            upload_date = datetime.fromtimestamp(doc["mtime"]).strftime("%Y-%m-%d")
+            doc_job = doc_jobs.get(file_path.name)
+            status = job_queue.status_label(doc_job) or doc["status"]
 
             c1, c2, c3, c4, c5, c6, c7 = st.columns([1.2, 3.2, 1.0, 1.0, 1.3, 1.7, 2.4])
             c1.markdown(f"**DOC-{idx:04d}**")
             c2.markdown(display_file_name)
+            if display_file_name in similar_flags:
+                flag = similar_flags[display_file_name]
+                c2.caption(f"⚠️ Similar to {flag['similar_file']} ({flag['similarity']:.0%})")
             c3.markdown(file_type)
             c4.markdown(f"{file_size_mb:.1f}")
             c5.markdown(upload_date)
@@ -1524,6 +1278,16 @@ if page == "📤 Document Processing":
                 else:
                     st.session_state["processing_selected_doc"] = str(file_path)
                 st.rerun()
+            if doc_job and doc_job["status"] in job_queue.ACTIVE_STATES:
+                if c7.button("Cancel", key=f"cancel_doc_{file_path.name}", use_container_width=True):
+                    job_queue.cancel(doc_job["id"])
+                    st.rerun()
+            elif doc_job and doc_job["status"] in {job_queue.FAILED, job_queue.CANCELLED}:
+                if c7.button("Retry", key=f"retry_doc_{file_path.name}", use_container_width=True,
+                             help=doc_job.get("error") or None):
+                    job_queue.retry(doc_job["id"])
+                    ensure_pipeline_worker()
+                    st.rerun()
 
             if st.session_state.get("processing_selected_doc") == str(file_path):
                 st.markdown(f"##### Preview: {file_path.name}")
@@ -1531,6 +1295,8 @@ if page == "📤 Document Processing":
 
             st.markdown("---")
 
+    elif doc_name_filter.strip() or doc_team:
+        st.info("No documents match the filters.")
     else:
         st.info(f"No documents found for role: {current_role.title()}.")
 
@@ -1568,39 +1334,69 @@ elif page == "📊 Extraction Viewer":
     st.markdown("Invoice repository and details")
     st.caption(f"Current access role: {current_role.title()}")
 
-    repo_items = load_extraction_repository_items()
-    if not repo_items:
+    template_rows = vendor_template_stats()
+    if template_rows:
+        with st.expander("🧩 Vendor Templates — hit rate & time saved", expanded=False):
+            df_templates = pd.DataFrame(template_rows)
+            df_templates["hit_rate"] = (df_templates["hit_rate"] * 100).round(1).astype(str) + "%"
+            df_templates["time_saved"] = (df_templates["time_saved_seconds"] / 60).round(1).astype(str) + " min"
+            st.dataframe(
+                df_templates[["vendor", "attempts", "hits", "hit_rate", "time_saved"]].rename(columns={
+                    "vendor": "Vendor", "attempts": "Attempts", "hits": "Template Hits",
+                    "hit_rate": "Hit Rate", "time_saved": "Time Saved",
+                }),
+                use_container_width=True,
+                hide_index=True,
+            )
+
+    metadata_store.sync()
+    repo_filters = metadata_store.repository_filters(current_role)
+    if not repo_filters["count"]:
         st.info("No extraction files found.")
     else:
-        search_query = st.text_input("", placeholder="Search invoice ID, vendor, or source file...", label_visibility="collapsed")
-        f1, f2 = st.columns([1, 1])
+        search_query = st.text_input("", placeholder="Search invoice ID, vendor, meter or lot number, amount, line items, OCR text...", label_visibility="collapsed")
+        f1, f2, f3, f4 = st.columns([1, 1, 1, 0.6])
         with f1:
-            all_statuses = sorted({item["status"] for item in repo_items if item["status"]})
-            status_filter = st.selectbox("Status", ["All Statuses"] + all_statuses)
+            status_filter = st.selectbox("Status", ["All Statuses"] + repo_filters["statuses"])
         with f2:
-            all_vendors = sorted({item["vendor"] for item in repo_items if item["vendor"] and item["vendor"] != "-"})
-            vendor_filter = st.selectbox("Vendor", ["All Vendors"] + all_vendors)
-
-        filtered_items = repo_items if current_role == "admin" else [item for item in repo_items if item.get("team") == current_role]
+            vendor_filter = st.selectbox("Vendor", ["All Vendors"] + repo_filters["vendors"])
+        sort_options = {
+            "Last Updated": "last_updated", "Invoice ID": "invoice_id", "Vendor": "vendor",
+            "Date": "date", "Total": "total", "Status": "status",
+        }
+        with f3:
+            # Search results are ranked by relevance instead.
+            sort_label = st.selectbox("Sort by", list(sort_options), key="extraction_sort", disabled=bool(search_query.strip()))
+        with f4:
+            sort_descending = st.toggle("Descending", value=True, key="extraction_sort_descending", disabled=bool(search_query.strip()))
+
+        status = None if status_filter == "All Statuses" else status_filter
+        vendor = None if vendor_filter == "All Vendors" else vendor_filter
+        list_page = current_list_page(
+            "extraction_list",
+            (current_role, search_query.strip(), status, vendor, sort_label, sort_descending),
+        )
+        if search_query.strip():
+            # Ranked full-text search (fields, line items, OCR text).
+            item_count, filtered_items = metadata_store.search(
+                search_query, role=current_role, status=status, vendor=vendor,
+                limit=PAGE_SIZE, offset=list_page * PAGE_SIZE,
+            )
+        else:
+            item_count, filtered_items = metadata_store.repository_items(
+                current_role, status=status, vendor=vendor,
+                sort=sort_options[sort_label], descending=sort_descending,
+                limit=PAGE_SIZE, offset=list_page * PAGE_SIZE,
+            )
 
         selected_file = st.session_state.get("extraction_selected_file")
         if selected_file and all(item["source_file"] != selected_file for item in filtered_items):
             st.session_state["extraction_selected_file"] = None
 
-        if search_query:
-            q = search_query.lower().strip()
-            filtered_items = [
-                item for item in filtered_items
-                if q in item["invoice_id"].lower()
-                or q in item["vendor"].lower()
-                or q in item["source_file"].lower()
-            ]
-        if status_filter != "All Statuses":
-            filtered_items = [item for item in filtered_items if item["status"] == status_filter]
-        if vendor_filter != "All Vendors":
-            filtered_items = [item for item in filtered_items if item["vendor"] == vendor_filter]
-
-        st.markdown(f"#### Invoices ({len(filtered_items)})")
+        st.markdown(f"#### Invoices ({item_count})")
+        if search_query.strip():
+            st.caption("Best matches first")
+        render_page_controls("extraction_list", list_page, item_count)
         h1, h2, h3, h4, h5, h6 = st.columns([2.3, 3.0, 1.5, 1.7, 2.0, 1.5])
         h1.markdown("**Invoice ID**")
         h2.markdown("**Vendor**")
@@ -1620,14 +1416,17 @@ elif page == "📊 Extraction Viewer":
             r4.markdown(item["total"])
             r5.markdown(item["status"])
             r6.markdown(item["last_updated"])
+            if item.get("snippet"):
+                st.caption(item["snippet"])
 
             if st.session_state.get("extraction_selected_file") == item["source_file"]:
                 st.markdown(f"##### Details: {item['invoice_id']} ({item['source_file']})")
+                item_data = metadata_store.extraction_data(item["source_file"]) or {}
                 detail_tab, raw_tab = st.tabs(["📊 Structured View", "📝 Raw JSON"])
                 with detail_tab:
-                    display_extraction_result(item["data"], item["data"].get("document_type", "Unknown"))
+                    display_extraction_result(item_data, item_data.get("document_type", "Unknown"))
                 with raw_tab:
-                    st.json(item["data"])
+                    st.json(item_data)
 
             st.markdown("---")
 
@@ -1643,23 +1442,8 @@ elif page == "📋 Report Format":
         "You can **review, edit, and export** the data."
     )
 
-    df = load_all_extraction_rows()
-
-    if not df.empty and current_role != "admin":
-        if current_role == "rental":
-            df = df[
-                df["Types (Inv/CN)"]
-                .astype(str)
-                .str.lower()
-                .str.contains("rental|lease|utility", regex=True)
-            ].copy()
-        elif current_role == "sales":
-            df = df[
-                ~df["Types (Inv/CN)"]
-                .astype(str)
-                .str.lower()
-                .str.contains("rental|lease|utility", regex=True)
-            ].copy()
+    df = load_all_extraction_rows(current_role)
+    review_status = metadata_store.statuses(metadata_store.REVIEW)
 
     if df.empty:
         st.info(f"No extraction files available for role: {current_role.title()}.")
@@ -1740,7 +1524,7 @@ elif page == "📋 Report Format":
             with tb4:
                 st.markdown("<br>", unsafe_allow_html=True)
                 if st.button("Reset All", use_container_width=True):
-                    st.session_state["doc_status"] = {}
+                    metadata_store.clear_statuses(metadata_store.REVIEW)
                     st.rerun()
 
             # Apply filters
@@ -1751,14 +1535,15 @@ elif page == "📋 Report Format":
             status_map_lower = {"Pending": "pending", "Verified": "verified", "Rejected": "rejected"}
             allowed_statuses = {status_map_lower[s] for s in status_filter}
             filtered = filtered[
-                filtered["No"].apply(
-                    lambda n: st.session_state["doc_status"].get(int(n), "pending") in allowed_statuses
+                filtered["_source_file"].apply(
+                    lambda f: review_status.get(f, "pending") in allowed_statuses
                 )
             ]
 
             # ── Counts bar ───────────────────────────────────────────
-            n_verified = sum(1 for v in st.session_state["doc_status"].values() if v == "verified")
-            n_rejected = sum(1 for v in st.session_state["doc_status"].values() if v == "rejected")
+            df_statuses = df["_source_file"].map(lambda f: review_status.get(f, "pending"))
+            n_verified = int((df_statuses == "verified").sum())
+            n_rejected = int((df_statuses == "rejected").sum())
             n_pending = len(df) - n_verified - n_rejected
             cb1, cb2, cb3, cb4 = st.columns(4)
             cb1.markdown(f"**{len(filtered)}** of **{len(df)}** shown")
@@ -1768,6 +1553,7 @@ elif page == "📋 Report Format":
             st.markdown("---")
 
             # ── Document cards ───────────────────────────────────────
+            catalog = document_catalog.refresh()
             for _, row in filtered.iterrows():
                 row_no = int(row["No"])
                 doc_type = str(row.get("Types (Inv/CN)", "Inv"))
@@ -1777,7 +1563,7 @@ elif page == "📋 Report Format":
                 inv_date = row.get("Invoice Date", "") or "—"
                 total = row.get("Jumlah perlu dibayar\n(Including tax)", "") or "—"
                 matched_to = row.get("Matched To", "")
-                status = st.session_state["doc_status"].get(row_no, "pending")
+                status = review_status.get(row["_source_file"], "pending")
                 status_class = f"doc-status-{status}"
 
                 # ── Card header (HTML) ────────────────────────────────
@@ -1820,17 +1606,17 @@ elif page == "📋 Report Format":
                     with ac1:
                         if st.button("✅ Verify", key=f"verify_{row_no}", use_container_width=True,
                                      type="primary" if status != "verified" else "secondary"):
-                            st.session_state["doc_status"][row_no] = "verified"
+                            metadata_store.set_status(row["_source_file"], metadata_store.REVIEW, "verified")
                             st.rerun()
                     with ac2:
                         if st.button("❌ Reject", key=f"reject_{row_no}", use_container_width=True,
                                      type="primary" if status != "rejected" else "secondary"):
-                            st.session_state["doc_status"][row_no] = "rejected"
+                            metadata_store.set_status(row["_source_file"], metadata_store.REVIEW, "rejected")
                             st.rerun()
                     with ac3:
                         if status != "pending":
                             if st.button("↩️ Reset to Pending", key=f"reset_{row_no}"):
-                                st.session_state["doc_status"][row_no] = "pending"
+                                metadata_store.set_status(row["_source_file"], metadata_store.REVIEW, "pending")
                                 st.rerun()
 
                     st.markdown("**Quick Reference (table order)**")
@@ -1852,7 +1638,7 @@ elif page == "📋 Report Format":
                         st.caption(f"Source: {src}")
 
                     if src:
-                        pdf_match = find_source_pdf_for_extraction(src)
+                        pdf_match = find_source_pdf_for_extraction(src, catalog)
                         btn_label = "📄 View Original PDF"
                         if st.button(btn_label, key=f"view_original_pdf_{row_no}"):
                             current_preview = st.session_state.get("report_preview_source")
@@ -1875,8 +1661,8 @@ elif page == "📋 Report Format":
                     display_cols.append(extra)
             table_df = filtered[display_cols].copy()
             if "No" in table_df.columns:
-                table_df.insert(1, "Status", table_df["No"].apply(
-                    lambda n: st.session_state["doc_status"].get(int(n), "pending").capitalize()
+                table_df.insert(1, "Status", filtered["_source_file"].map(
+                    lambda f: review_status.get(f, "pending").capitalize()
                 ))
             else:
                 table_df.insert(0, "Status", "Pending")
@@ -1932,8 +1718,8 @@ elif page == "📋 Report Format":
                     display_cols.append(extra)
             export_df = filtered[display_cols].copy()
             if "No" in export_df.columns:
-                export_df.insert(1, "Status", export_df["No"].apply(
-                    lambda n: st.session_state["doc_status"].get(int(n), "pending").capitalize()
+                export_df.insert(1, "Status", filtered["_source_file"].map(
+                    lambda f: review_status.get(f, "pending").capitalize()
                 ))
             else:
                 export_df.insert(0, "Status", "Pending")
@@ -2084,6 +1870,193 @@ elif page == "📋 Report Format":
                 )
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# PAGE: TRACES  –  per-document waterfall & stage latency
+# ═══════════════════════════════════════════════════════════════════════════
+elif page == "⏱️ Traces":
+
+    import altair as alt
+
+    st.markdown("### ⏱️ Pipeline Traces")
+    st.markdown("Where the time goes for each document: render, OCR, classify, extract, validate and save.")
+    st.caption(f"Spans from {tracing.TRACE_LOG_PATH}")
+
+    spans = tracing.load_spans()
+    if not spans:
+        st.info("No traces recorded yet. Process a document to see its waterfall here.")
+    else:
+        st.markdown("#### Stage latency")
+        df_stages = pd.DataFrame(tracing.stage_percentiles(spans))
+        st.dataframe(
+            df_stages.rename(columns={
+                "stage": "Stage", "count": "Spans", "p50_seconds": "p50 (s)",
+                "p95_seconds": "p95 (s)", "max_seconds": "Max (s)",
+            }),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        st.markdown("#### Document waterfall")
+        grouped = tracing.traces(spans)
+        roots = {
+            trace_id: next((s for s in items if not s.get("parentSpanId")), items[0])
+            for trace_id, items in grouped.items()
+        }
+        trace_ids = sorted(roots, key=lambda t: roots[t]["startTimeUnixNano"], reverse=True)
+
+        def _trace_label(trace_id: str) -> str:
+            root = roots[trace_id]
+            attrs = root.get("attributes", {})
+            started = datetime.fromtimestamp(root["startTimeUnixNano"] / 1e9).strftime("%d %b %H:%M:%S")
+            seconds = ((root.get("endTimeUnixNano") or root["startTimeUnixNano"]) - root["startTimeUnixNano"]) / 1e9
+            cached = " · from checkpoint" if attrs.get("cached") else ""
+            return f"{attrs.get('file') or root['name']} — {started} · {seconds:.1f}s{cached}"
+
+        selected_trace = st.selectbox("Document", trace_ids, format_func=_trace_label)
+        items = grouped[selected_trace]
+        trace_start = min(s["startTimeUnixNano"] for s in items)
+        parents = {s["spanId"]: s.get("parentSpanId") for s in items}
+
+        def _depth(span_id: str) -> int:
+            depth = 0
+            while parents.get(span_id) and parents[span_id] in parents:
+                span_id = parents[span_id]
+                depth += 1
+            return depth
+
+        rows = []
+        for order, s in enumerate(items):
+            end_ns = s.get("endTimeUnixNano") or s["startTimeUnixNano"]
+            attrs = s.get("attributes", {})
+            rows.append({
+                "order": order,
+                "span": f"{'  ' * _depth(s['spanId'])}{s['name']}",
+                "start_s": (s["startTimeUnixNano"] - trace_start) / 1e9,
+                "end_s": (end_ns - trace_start) / 1e9,
+                "duration_s": round((end_ns - s["startTimeUnixNano"]) / 1e9, 3),
+                "status": "error" if s.get("status", {}).get("code") == "ERROR" else "ok",
+                "details": ", ".join(f"{k}={v}" for k, v in attrs.items()),
+            })
+        df_spans = pd.DataFrame(rows)
+        chart = (
+            alt.Chart(df_spans)
+            .mark_bar(cornerRadius=2)
+            .encode(
+                x=alt.X("start_s:Q", title="Seconds since document start"),
+                x2="end_s:Q",
+                y=alt.Y("span:N", sort=alt.EncodingSortField(field="order", order="ascending"), title=None),
+                color=alt.Color(
+                    "status:N",
+                    scale=alt.Scale(domain=["ok", "error"], range=["#00A0AF", "#d9534f"]),
+                    legend=None,
+                ),
+                tooltip=["span", "duration_s", "details"],
+            )
+            .properties(height=max(120, 24 * len(df_spans)))
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.dataframe(
+            df_spans[["span", "start_s", "duration_s", "status", "details"]].round({"start_s": 3}),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PAGE: USAGE & COST  –  tokens, cost and latency from the local usage logs
+# ═══════════════════════════════════════════════════════════════════════════
+elif page == "💰 Usage & Cost":
+
+    import altair as alt
+
+    st.markdown("### 💰 Usage & Cost")
+    st.markdown("Tokens, cost, calls and latency from the OCR and extraction usage logs.")
+
+    all_days = usage_analytics.summary(["day"])
+    if not all_days:
+        st.info("No model calls logged yet.")
+    else:
+        days = sorted(r["day"] for r in all_days)
+        f1, f2 = st.columns([3, 2])
+        with f1:
+            day_range = st.date_input(
+                "Period",
+                value=(datetime.fromisoformat(days[0]).date(), datetime.fromisoformat(days[-1]).date()),
+            )
+        with f2:
+            stage_filter = st.selectbox(
+                "Stage",
+                ["All"] + sorted({r["stage"] for r in usage_analytics.summary(["stage"])}),
+            )
+        since = until = None
+        if isinstance(day_range, (list, tuple)) and len(day_range) == 2:
+            since, until = day_range[0].isoformat(), day_range[1].isoformat()
+        filters = {"stage": stage_filter} if stage_filter != "All" else None
+
+        def _usage(group_by: list[str]) -> pd.DataFrame:
+            return pd.DataFrame(usage_analytics.summary(group_by, since, until, filters))
+
+        totals = _usage([])
+        if totals.empty:
+            st.info("No model calls in this period.")
+        else:
+            total = totals.iloc[0]
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Calls", f"{int(total['calls']):,}")
+            m2.metric("Tokens", f"{int(total['total_tokens']):,}")
+            m3.metric("Cost", f"${total['cost_usd']:,.2f}")
+            m4.metric(
+                "Avg latency",
+                f"{total['avg_latency_seconds']:.1f}s" if pd.notna(total["avg_latency_seconds"]) else "—",
+            )
+
+            df_daily = _usage(["day", "stage"])
+            st.altair_chart(
+                alt.Chart(df_daily)
+                .mark_bar()
+                .encode(
+                    x=alt.X("day:T", title=None),
+                    y=alt.Y("cost_usd:Q", title="Cost (USD)"),
+                    color=alt.Color("stage:N", title="Stage"),
+                    tooltip=["day", "stage", "calls", "total_tokens", "cost_usd"],
+                )
+                .properties(height=260),
+                use_container_width=True,
+            )
+
+            _usage_columns = {
+                "calls": "Calls", "prompt_tokens": "Prompt Tokens", "completion_tokens": "Completion Tokens",
+                "total_tokens": "Total Tokens", "cost_usd": "Cost (USD)", "avg_latency_seconds": "Avg (s)",
+                "p95_latency_seconds": "p95 (s)", "max_latency_seconds": "Max (s)",
+            }
+            tab_day, tab_stage, tab_mode, tab_type, tab_file = st.tabs(
+                ["By day", "By stage", "By mode", "By document type", "By file"]
+            )
+            for tab, group_by in (
+                (tab_day, ["day"]),
+                (tab_stage, ["stage", "model"]),
+                (tab_mode, ["mode"]),
+                (tab_type, ["doc_type"]),
+                (tab_file, ["file"]),
+            ):
+                with tab:
+                    df_group = _usage(group_by)
+                    if group_by == ["day"]:
+                        df_group = df_group.sort_values("day", ascending=False)
+                    st.dataframe(
+                        df_group.rename(columns={
+                            "day": "Day", "stage": "Stage", "model": "Model", "mode": "Mode",
+                            "doc_type": "Document Type", "file": "File", **_usage_columns,
+                        }),
+                        use_container_width=True,
+                        hide_index=True,
+                    )
+            st.caption(
+                "Latency covers calls logged since endpoint pooling was added; p95 is bucketed. "
+                "Document type and file are recorded for calls made through the pipeline."
+            )
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # PAGE: BANK MATCHING  –  Enterprise AP Line-Item Reconciliation
 # ═══════════════════════════════════════════════════════════════════════════
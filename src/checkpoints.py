@@ -0,0 +1,175 @@
+"""
+Per-stage checkpoints for pipeline runs, keyed by the PDF's content hash.
+
+Each document gets a directory under checkpoints/ named by the SHA-256 of its
+bytes. Every stage stores its output there as soon as it succeeds:
+
+    pages_<dpi>/         rendered page images (+ pages.json once complete)
+    ocr_page-<n>.json    per-page OCR output   (per-page mode)
+    ocr_batch.json       whole-document OCR    (batch mode)
+    classification.json  {"doc_type": ...}
+    extraction-<type>.json
+    result-<key>.json    final summary; present means the run is complete
+
+A re-run resumes from the last completed stage, and re-running an unchanged
+document whose result checkpoint exists does no work at all. Renamed or
+re-uploaded copies of the same file share checkpoints.
+
+Config:
+    CHECKPOINT_DIR   root directory (default src/checkpoints)
+
+Usage:
+    python checkpoints.py --list
+    python checkpoints.py --prune-days 30
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+DEFAULT_CHECKPOINT_DIR = SRC_DIR / "checkpoints"
+PAGES_MANIFEST = "pages.json"
+
+
+def _get_config_value(name: str) -> str | None:
+    value = os.getenv(name)
+    if value:
+        return value
+
+    try:
+        import streamlit as st
+
+        secret_value = st.secrets.get(name)
+        if secret_value:
+            return str(secret_value)
+    except Exception:
+        pass
+
+    return None
+
+
+def write_json_atomic(path: Path, data: object) -> None:
+    """Write JSON to a temp file in the same directory and rename it over path."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def checkpoint_root() -> Path:
+    return Path(_get_config_value("CHECKPOINT_DIR") or DEFAULT_CHECKPOINT_DIR)
+
+
+def content_hash(path: str | Path) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentCheckpoint:
+    """Stage outputs for one document (identified by content hash)."""
+
+    def __init__(self, digest: str, root: Path | None = None):
+        self.digest = digest
+        self.dir = (root or checkpoint_root()) / digest[:2] / digest
+
+    @classmethod
+    def for_file(cls, path: str | Path, root: Path | None = None) -> "DocumentCheckpoint":
+        return cls(content_hash(path), root)
+
+    def _path(self, stage: str, key: str | int | None = None) -> Path:
+        name = stage if key in (None, "") else f"{stage}-{key}"
+        return self.dir / f"{name}.json"
+
+    def load(self, stage: str, key: str | int | None = None) -> object | None:
+        path = self._path(stage, key)
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+
+    def save(self, stage: str, data: object, key: str | int | None = None) -> None:
+        write_json_atomic(self._path(stage, key), data)
+
+    def pages_dir(self, dpi: int) -> Path:
+        return self.dir / f"pages_{dpi}"
+
+    def load_pages(self, dpi: int) -> list[Path] | None:
+        """Rendered page images, if rendering completed for this dpi."""
+        manifest = self.pages_dir(dpi) / PAGES_MANIFEST
+        if not manifest.exists():
+            return None
+        try:
+            pages = [self.pages_dir(dpi) / name for name in json.loads(manifest.read_text(encoding="utf-8"))]
+        except Exception:
+            return None
+        return pages if all(p.exists() for p in pages) else None
+
+    def save_pages(self, dpi: int, pages: list[Path]) -> None:
+        write_json_atomic(self.pages_dir(dpi) / PAGES_MANIFEST, [p.name for p in pages])
+
+    def drop_pages(self) -> None:
+        """Remove rendered images once OCR no longer needs them."""
+        for pages_dir in self.dir.glob("pages_*"):
+            shutil.rmtree(pages_dir, ignore_errors=True)
+
+    def stages(self) -> list[str]:
+        if not self.dir.exists():
+            return []
+        names = [p.stem for p in sorted(self.dir.glob("*.json"))]
+        names += [p.name for p in sorted(self.dir.glob("pages_*")) if (p / PAGES_MANIFEST).exists()]
+        return names
+
+
+def list_checkpoints(root: Path | None = None) -> list[dict]:
+    root = root or checkpoint_root()
+    rows = []
+    for doc_dir in sorted(root.glob("??/*")):
+        if doc_dir.is_dir():
+            checkpoint = DocumentCheckpoint(doc_dir.name, root)
+            rows.append({
+                "digest": doc_dir.name,
+                "stages": checkpoint.stages(),
+                "modified": max((p.stat().st_mtime for p in doc_dir.rglob("*")), default=doc_dir.stat().st_mtime),
+            })
+    return rows
+
+
+def prune(max_age_days: float, root: Path | None = None) -> int:
+    """Delete checkpoints not touched for max_age_days; returns how many."""
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for row in list_checkpoints(root):
+        if row["modified"] < cutoff:
+            shutil.rmtree((root or checkpoint_root()) / row["digest"][:2] / row["digest"], ignore_errors=True)
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or prune pipeline checkpoints")
+    parser.add_argument("--list", action="store_true", help="List documents and their completed stages")
+    parser.add_argument("--prune-days", type=float, default=None, help="Delete checkpoints older than N days")
+    args = parser.parse_args()
+
+    if args.prune_days is not None:
+        print(f"Removed {prune(args.prune_days)} checkpoint(s)")
+    if args.list or args.prune_days is None:
+        for row in list_checkpoints():
+            print(f"{row['digest'][:12]}  {', '.join(row['stages'])}")
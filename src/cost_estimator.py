@@ -0,0 +1,298 @@
+"""
+Pre-flight token, cost and time estimator for the OCR → classify → extract pipeline.
+
+Works offline: no API calls and no Azure credentials are needed. Estimates come from:
+  - page count and rendered image dimensions (vision tokens per page)
+  - OCR JSON size (extraction prompt size)
+  - historical ratios fitted from ocr_output/ and extraction_output/token_usage_log.jsonl
+
+Used by the --dry-run flags of pdf_to_images.py and orchestrator.py.
+
+Config:
+    MODEL_PRICES                JSON {"<deployment>": [input_per_1M, output_per_1M]}
+    TOKEN_PRICE_INPUT_PER_1M    default input price per 1M tokens (USD)
+    TOKEN_PRICE_OUTPUT_PER_1M   default output price per 1M tokens (USD)
+    PIPELINE_CONCURRENCY        parallel requests assumed for wall time (default 4)
+"""
+
+import json
+import math
+import os
+from pathlib import Path
+
+from agents.ocr_text import load_ocr, iter_pages
+from agents.routing import route
+
+SRC_DIR = Path(__file__).resolve().parent
+OCR_USAGE_LOG = SRC_DIR / "ocr_output" / "token_usage_log.jsonl"
+EXTRACTION_USAGE_LOG = SRC_DIR / "extraction_output" / "token_usage_log.jsonl"
+
+# Fallbacks when the usage logs have too little history to fit.
+DEFAULT_OCR_PROMPT_BASE = 1_100        # system + user prompt text per OCR request
+DEFAULT_OCR_PROMPT_PER_PAGE = 1_000    # one A4 page image at 300 dpi
+DEFAULT_OCR_COMPLETION_PER_PAGE = 1_100
+DEFAULT_EXTRACT_PROMPT_BASE = 1_100    # extraction system prompt
+DEFAULT_EXTRACT_PROMPT_PER_CHAR = 0.3
+DEFAULT_EXTRACT_COMPLETION_BASE = 500
+DEFAULT_EXTRACT_COMPLETION_PER_CHAR = 0.05
+# OCR JSON characters produced per OCR completion token (for PDFs not OCR'd yet).
+OCR_CHARS_PER_COMPLETION_TOKEN = 3.5
+
+CLASSIFY_PROMPT_TOKENS = 550 + 600     # classifier prompt + header excerpt budget
+CLASSIFY_COMPLETION_TOKENS = 5
+
+# Rough service speed for wall-time estimates.
+LATENCY_BASE_SECONDS = 1.5
+PROMPT_TOKENS_PER_SECOND = 4_000
+COMPLETION_TOKENS_PER_SECOND = 60
+
+REFERENCE_PAGE_SIZE = (2480, 3508)     # A4 at 300 dpi, what the history was rendered at
+
+
+def _get_config_value(name: str) -> str | None:
+    value = os.getenv(name)
+    if value:
+        return value
+
+    try:
+        import streamlit as st
+
+        secret_value = st.secrets.get(name)
+        if secret_value:
+            return str(secret_value)
+    except Exception:
+        pass
+
+    return None
+
+
+def _prices(deployment: str) -> tuple[float, float]:
+    """(input, output) USD per 1M tokens for a deployment."""
+    try:
+        table = json.loads(_get_config_value("MODEL_PRICES") or "{}")
+    except Exception:
+        table = {}
+    if isinstance(table.get(deployment), list) and len(table[deployment]) == 2:
+        return float(table[deployment][0]), float(table[deployment][1])
+    return (
+        float(_get_config_value("TOKEN_PRICE_INPUT_PER_1M") or 1.75),
+        float(_get_config_value("TOKEN_PRICE_OUTPUT_PER_1M") or 14.0),
+    )
+
+
+def image_tokens(width: int, height: int) -> int:
+    """Vision tokens for one high-detail image: 85 + 170 per 512px tile after resizing."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _read_log(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    records = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except Exception:
+            continue
+        if isinstance(record, dict) and record.get("prompt_tokens") is not None:
+            records.append(record)
+    return records
+
+
+def _fit_line(points: list[tuple[float, float]], default: tuple[float, float]) -> tuple[float, float]:
+    """Least-squares (intercept, slope); the default when x has no spread or the slope is negative."""
+    xs = {x for x, _ in points}
+    if len(xs) < 2:
+        return default
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    if slope < 0:
+        return default
+    return max(0.0, mean_y - slope * mean_x), slope
+
+
+def load_ratios() -> dict:
+    """Fit per-stage token ratios from the usage logs."""
+    ocr = [r for r in _read_log(OCR_USAGE_LOG) if r.get("file_count")]
+    extraction = [
+        r for r in _read_log(EXTRACTION_USAGE_LOG)
+        if r.get("request_mode") == "extraction_from_ocr" and r.get("ocr_payload_chars")
+    ]
+
+    ocr_prompt = _fit_line(
+        [(r["file_count"], r["prompt_tokens"]) for r in ocr],
+        (DEFAULT_OCR_PROMPT_BASE, DEFAULT_OCR_PROMPT_PER_PAGE),
+    )
+    completions_per_page = [r["completion_tokens"] / r["file_count"] for r in ocr if r.get("completion_tokens")]
+    extract_prompt = _fit_line(
+        [(r["ocr_payload_chars"], r["prompt_tokens"]) for r in extraction],
+        (DEFAULT_EXTRACT_PROMPT_BASE, DEFAULT_EXTRACT_PROMPT_PER_CHAR),
+    )
+    extract_completion = _fit_line(
+        [(r["ocr_payload_chars"], r["completion_tokens"]) for r in extraction if r.get("completion_tokens")],
+        (DEFAULT_EXTRACT_COMPLETION_BASE, DEFAULT_EXTRACT_COMPLETION_PER_CHAR),
+    )
+    return {
+        "ocr_prompt_base": ocr_prompt[0],
+        "ocr_prompt_per_page": ocr_prompt[1],
+        "ocr_completion_per_page": (
+            sum(completions_per_page) / len(completions_per_page) if completions_per_page
+            else DEFAULT_OCR_COMPLETION_PER_PAGE
+        ),
+        "extract_prompt": extract_prompt,
+        "extract_completion": extract_completion,
+        "history": {"ocr_requests": len(ocr), "extraction_requests": len(extraction)},
+    }
+
+
+def _call(stage: str, deployment: str, tier: str, prompt: float, completion: float) -> dict:
+    price_in, price_out = _prices(deployment)
+    prompt, completion = int(round(prompt)), int(round(completion))
+    return {
+        "stage": stage,
+        "deployment": deployment,
+        "tier": tier,
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "cost": prompt / 1e6 * price_in + completion / 1e6 * price_out,
+        "seconds": LATENCY_BASE_SECONDS + prompt / PROMPT_TOKENS_PER_SECOND + completion / COMPLETION_TOKENS_PER_SECOND,
+    }
+
+
+def _classify_and_extract_calls(ratios: dict, pages: int, ocr_chars: int, doc_type: str | None) -> list[dict]:
+    calls = []
+    if not doc_type:
+        # Upper bound: the local classifier stages often settle the type without a call.
+        tier, deployment = route("classify")
+        calls.append(_call("classify", deployment, tier, CLASSIFY_PROMPT_TOKENS, CLASSIFY_COMPLETION_TOKENS))
+
+    tier, deployment = route("extract", doc_type, pages=pages, chars=ocr_chars)
+    base, per_char = ratios["extract_prompt"]
+    c_base, c_per_char = ratios["extract_completion"]
+    calls.append(_call("extract", deployment, tier, base + per_char * ocr_chars, c_base + c_per_char * ocr_chars))
+    return calls
+
+
+def estimate_pdf(pdf_path: str | Path, dpi: int = 300, ratios: dict | None = None, batch_ocr: bool = True) -> dict:
+    """Estimate the full pipeline for one PDF without rendering it."""
+    import fitz  # pymupdf
+
+    ratios = ratios or load_ratios()
+    pdf_path = Path(pdf_path)
+    with fitz.open(pdf_path) as doc:
+        sizes = [(int(p.rect.width * dpi / 72), int(p.rect.height * dpi / 72)) for p in doc]
+    return _estimate_pages(pdf_path.name, sizes, ratios, batch_ocr)
+
+
+def estimate_images(name: str, image_paths: list[Path], ratios: dict | None = None, batch_ocr: bool = True) -> dict:
+    """Estimate the full pipeline for one document given as page images."""
+    import fitz  # pymupdf
+
+    ratios = ratios or load_ratios()
+    sizes = []
+    for path in image_paths:
+        pix = fitz.Pixmap(str(path))
+        sizes.append((pix.width, pix.height))
+    return _estimate_pages(name, sizes, ratios, batch_ocr)
+
+
+def _estimate_pages(name: str, sizes: list[tuple[int, int]], ratios: dict, batch_ocr: bool) -> dict:
+    pages = len(sizes)
+    reference = image_tokens(*REFERENCE_PAGE_SIZE)
+    # Scale the fitted per-page prompt cost by how many vision tokens these pages take.
+    page_prompt = [ratios["ocr_prompt_per_page"] * image_tokens(w, h) / reference for w, h in sizes]
+    completion_per_page = ratios["ocr_completion_per_page"]
+
+    calls: list[dict] = []
+    tier, deployment = route("ocr", pages=pages)
+    if batch_ocr:
+        calls.append(_call("ocr", deployment, tier, ratios["ocr_prompt_base"] + sum(page_prompt), completion_per_page * pages))
+    else:
+        tier, deployment = route("ocr", pages=1)
+        calls.extend(_call("ocr", deployment, tier, ratios["ocr_prompt_base"] + p, completion_per_page) for p in page_prompt)
+
+    ocr_chars = int(completion_per_page * pages * OCR_CHARS_PER_COMPLETION_TOKEN)
+    calls.extend(_classify_and_extract_calls(ratios, pages, ocr_chars, None))
+    return _summarize(name, pages, calls)
+
+
+def estimate_ocr_json(name: str, ocr_json_str: str, doc_type: str | None = None, ratios: dict | None = None) -> dict:
+    """Estimate classification + extraction for an existing OCR JSON output."""
+    ratios = ratios or load_ratios()
+    try:
+        pages = len(iter_pages(load_ocr(ocr_json_str)))
+    except Exception:
+        pages = 0
+    calls = _classify_and_extract_calls(ratios, pages, len(ocr_json_str), doc_type)
+    return _summarize(name, pages, calls)
+
+
+def _summarize(name: str, pages: int, calls: list[dict]) -> dict:
+    return {
+        "name": name,
+        "pages": pages,
+        "calls": calls,
+        "call_count": len(calls),
+        "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+        "completion_tokens": sum(c["completion_tokens"] for c in calls),
+        "cost": sum(c["cost"] for c in calls),
+        "seconds": sum(c["seconds"] for c in calls),
+    }
+
+
+def wall_time(estimates: list[dict], concurrency: int) -> float:
+    """Wall time with documents spread over `concurrency` workers (stages of one document run in order)."""
+    if not estimates:
+        return 0.0
+    total = sum(e["seconds"] for e in estimates)
+    longest = max(e["seconds"] for e in estimates)
+    return max(total / max(1, concurrency), longest)
+
+
+def default_concurrency() -> int:
+    return int(_get_config_value("PIPELINE_CONCURRENCY") or 4)
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def print_plan(estimates: list[dict], concurrency: int | None = None) -> None:
+    """Print the per-document and total dry-run plan."""
+    concurrency = concurrency or default_concurrency()
+    print(f"{'Document':40s} {'Pages':>5s} {'Calls':>5s} {'Prompt':>9s} {'Compl.':>8s} {'Cost':>9s} {'Time':>7s}")
+    for e in estimates:
+        print(
+            f"{e['name'][:40]:40s} {e['pages']:5d} {e['call_count']:5d} {e['prompt_tokens']:9,d} "
+            f"{e['completion_tokens']:8,d} {e['cost']:9.4f} {_format_seconds(e['seconds']):>7s}"
+        )
+
+    by_stage: dict[str, dict] = {}
+    for e in estimates:
+        for c in e["calls"]:
+            s = by_stage.setdefault(f"{c['stage']} ({c['tier']}: {c['deployment']})", {"calls": 0, "tokens": 0, "cost": 0.0})
+            s["calls"] += 1
+            s["tokens"] += c["prompt_tokens"] + c["completion_tokens"]
+            s["cost"] += c["cost"]
+
+    print("-" * 88)
+    print(
+        f"{'TOTAL (' + str(len(estimates)) + ' document(s))':40s} {sum(e['pages'] for e in estimates):5d} "
+        f"{sum(e['call_count'] for e in estimates):5d} {sum(e['prompt_tokens'] for e in estimates):9,d} "
+        f"{sum(e['completion_tokens'] for e in estimates):8,d} {sum(e['cost'] for e in estimates):9.4f}"
+    )
+    for stage, s in by_stage.items():
+        print(f"  {stage:50s} {s['calls']:5d} call(s) {s['tokens']:10,d} tokens  ${s['cost']:.4f}")
+    print(f"Estimated wall time at concurrency {concurrency}: {_format_seconds(wall_time(estimates, concurrency))}")
+    print("Costs in USD from MODEL_PRICES / TOKEN_PRICE_*_PER_1M; classification calls are an upper bound.")
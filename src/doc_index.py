@@ -0,0 +1,370 @@
+"""
+Content-hash index of the document store (docs/database).
+
+Every stored PDF is recorded under the SHA-256 of its bytes, so an upload that
+is byte-identical to a stored document is linked to that record (as an alias
+name) instead of being stored and processed again, and its OCR and extraction
+results are reused.
+
+Each record also keeps two 64-bit near-duplicate fingerprints:
+
+    text_simhash   simhash of word 3-shingles from the PDF's text layer
+    image_dhash    difference hash of the first page, for scans without text
+
+A new document within SIMILAR_TEXT_BITS / SIMILAR_IMAGE_BITS (Hamming distance)
+of an earlier one is flagged as similar for review, e.g. a re-scan or an edited
+re-issue of the same invoice. Each fingerprint is also split into
+FINGERPRINT_BANDS bands stored in document_bands: two hashes within fewer
+differing bits than there are bands agree exactly on at least one band, so
+candidates come from an indexed lookup instead of a scan of every document.
+
+The index lives in the job queue database (see job_queue.py).
+
+Usage:
+    python doc_index.py            # index PDFs in docs/database not yet indexed
+    python doc_index.py --similar  # list documents flagged as similar
+"""
+
+import argparse
+import hashlib
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import fitz  # pymupdf
+
+import job_queue
+from checkpoints import content_hash
+
+SRC_DIR = Path(__file__).resolve().parent
+DATABASE_DIR = SRC_DIR / "docs" / "database"
+OCR_OUTPUT_DIR = SRC_DIR / "ocr_output"
+EXTRACTION_OUTPUT_DIR = SRC_DIR / "extraction_output"
+
+# Max differing bits (of 64) for two documents to count as similar.
+SIMILAR_TEXT_BITS = 6
+SIMILAR_IMAGE_BITS = 4
+# Below this many words the text layer is too thin to fingerprint.
+MIN_FINGERPRINT_WORDS = 20
+# Must exceed both thresholds above (pigeonhole: a near match shares a whole band).
+FINGERPRINT_BANDS = 7
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS document_hashes (
+    digest       TEXT PRIMARY KEY,
+    file_name    TEXT NOT NULL,
+    size         INTEGER,
+    pages        INTEGER,
+    text_simhash INTEGER,
+    image_dhash  INTEGER,
+    similar_to   TEXT,
+    similarity   REAL,
+    created_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_document_hashes_file ON document_hashes(file_name);
+
+CREATE TABLE IF NOT EXISTS document_aliases (
+    file_name TEXT PRIMARY KEY,
+    digest    TEXT NOT NULL,
+    linked_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS document_bands (
+    kind   TEXT NOT NULL,
+    band   INTEGER NOT NULL,
+    value  INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (kind, band, value, digest)
+) WITHOUT ROWID;
+"""
+
+_WORD = re.compile(r"[a-z0-9]+")
+_schema_ready: set[str] = set()
+# Database folder mtime at the last sync() in this process, per folder.
+_synced_mtime: dict[str, float] = {}
+
+
+@contextmanager
+def _connect():
+    """The job queue database, with the index tables created (and bands backfilled) on first use."""
+    with job_queue.connect() as conn:
+        if str(job_queue.db_path()) not in _schema_ready:
+            conn.executescript(SCHEMA)
+            rows = conn.execute(
+                "SELECT digest, text_simhash, image_dhash FROM document_hashes "
+                "WHERE digest NOT IN (SELECT digest FROM document_bands)"
+            ).fetchall()
+            for row in rows:
+                _insert_bands(conn, row["digest"], _unsigned(row["text_simhash"]), _unsigned(row["image_dhash"]))
+            _schema_ready.add(str(job_queue.db_path()))
+        yield conn
+
+
+def _signed(value: int) -> int:
+    """Store unsigned 64-bit fingerprints in SQLite's signed INTEGER."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value: int | None) -> int | None:
+    return None if value is None else value & ((1 << 64) - 1)
+
+
+def _bands(value: int) -> list[tuple[int, int]]:
+    """(band number, band bits) for FINGERPRINT_BANDS near-equal slices of a 64-bit hash."""
+    bands, start = [], 0
+    for band in range(FINGERPRINT_BANDS):
+        width = 64 // FINGERPRINT_BANDS + (band < 64 % FINGERPRINT_BANDS)
+        bands.append((band, value >> start & ((1 << width) - 1)))
+        start += width
+    return bands
+
+
+def _band_keys(text_simhash: int | None, image_dhash: int | None) -> list[tuple[str, int, int]]:
+    keys = []
+    for kind, value in (("text", text_simhash), ("image", image_dhash)):
+        if value is not None:
+            keys += [(kind, band, bits) for band, bits in _bands(value)]
+    return keys
+
+
+def _insert_bands(conn, digest: str, text_simhash: int | None, image_dhash: int | None) -> None:
+    conn.executemany(
+        "INSERT OR IGNORE INTO document_bands (kind, band, value, digest) VALUES (?, ?, ?, ?)",
+        [(*key, digest) for key in _band_keys(text_simhash, image_dhash)],
+    )
+
+
+def _simhash(words: list[str]) -> int | None:
+    if len(words) < MIN_FINGERPRINT_WORDS:
+        return None
+    weights = [0] * 64
+    for i in range(len(words) - 2):
+        h = int.from_bytes(hashlib.blake2b(" ".join(words[i:i + 3]).encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _dhash(page: "fitz.Page") -> int:
+    """Difference hash of a page: 9x8 grayscale (box-averaged from 36x32), adjacent-pixel comparisons."""
+    matrix = fitz.Matrix(36 / page.rect.width, 32 / page.rect.height)
+    pix = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+    width, height, samples = pix.width, pix.height, pix.samples
+    cells = []
+    for y in range(8):
+        for x in range(9):
+            y0, y1 = y * height // 8, max(y * height // 8 + 1, (y + 1) * height // 8)
+            x0, x1 = x * width // 9, max(x * width // 9 + 1, (x + 1) * width // 9)
+            block = [samples[row * pix.stride + col] for row in range(y0, y1) for col in range(x0, x1)]
+            cells.append(sum(block) / len(block))
+    value = 0
+    for y in range(8):
+        for x in range(8):
+            value = value << 1 | (cells[y * 9 + x] > cells[y * 9 + x + 1])
+    return value
+
+
+def fingerprint(pdf_path: str | Path) -> dict:
+    """Page count and near-duplicate fingerprints for a PDF (None where unavailable)."""
+    try:
+        doc = fitz.open(pdf_path)
+    except Exception:
+        return {"pages": None, "text_simhash": None, "image_dhash": None}
+    try:
+        words = _WORD.findall(" ".join(page.get_text() for page in doc).lower())
+        return {
+            "pages": doc.page_count,
+            "text_simhash": _simhash(words),
+            "image_dhash": _dhash(doc[0]) if doc.page_count else None,
+        }
+    finally:
+        doc.close()
+
+
+def _distance(a: int | None, b: int | None) -> int | None:
+    return None if a is None or b is None else bin(a ^ b).count("1")
+
+
+def _row_to_record(row) -> dict | None:
+    if row is None:
+        return None
+    record = dict(row)
+    record["text_simhash"] = _unsigned(record["text_simhash"])
+    record["image_dhash"] = _unsigned(record["image_dhash"])
+    record["path"] = str(DATABASE_DIR / record["file_name"])
+    return record
+
+
+def lookup(digest: str) -> dict | None:
+    """The stored document with these bytes, if its file is still in the database."""
+    with _connect() as conn:
+        record = _row_to_record(conn.execute("SELECT * FROM document_hashes WHERE digest = ?", (digest,)).fetchone())
+    if record and not Path(record["path"]).exists():
+        return None
+    return record
+
+
+def lookup_file(file_name: str) -> dict | None:
+    """The record for a stored file name or an alias linked to it."""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT h.* FROM document_hashes h WHERE h.file_name = ? "
+            "UNION ALL SELECT h.* FROM document_aliases a JOIN document_hashes h ON h.digest = a.digest "
+            "WHERE a.file_name = ? LIMIT 1",
+            (file_name, file_name),
+        ).fetchone()
+    return _row_to_record(row)
+
+
+def find_similar(fp: dict, exclude_digest: str | None = None) -> tuple[str, float] | None:
+    """Closest indexed document within the similarity thresholds: (digest, similarity 0–1)."""
+    keys = _band_keys(fp.get("text_simhash"), fp.get("image_dhash"))
+    if not keys:
+        return None
+    with _connect() as conn:
+        # Only documents sharing a band can be within the thresholds.
+        rows = conn.execute(
+            "SELECT digest, file_name, text_simhash, image_dhash FROM document_hashes WHERE digest IN "
+            "(SELECT digest FROM document_bands WHERE "
+            + " OR ".join("(kind = ? AND band = ? AND value = ?)" for _ in keys)
+            + ")",
+            [part for key in keys for part in key],
+        ).fetchall()
+    matches = []
+    for row in rows:
+        if row["digest"] == exclude_digest:
+            continue
+        text = _distance(fp.get("text_simhash"), _unsigned(row["text_simhash"]))
+        image = _distance(fp.get("image_dhash"), _unsigned(row["image_dhash"]))
+        if text is not None:
+            # A text layer decides; page images of different documents from one template look alike.
+            if text > SIMILAR_TEXT_BITS:
+                continue
+            similarity = 1 - text / 64
+        elif image is not None and image <= SIMILAR_IMAGE_BITS:
+            similarity = 1 - image / 64
+        else:
+            continue
+        matches.append((similarity, row["digest"], row["file_name"]))
+    for similarity, digest, file_name in sorted(matches, reverse=True):
+        if (DATABASE_DIR / file_name).exists():
+            return digest, similarity
+    return None
+
+
+def register(path: str | Path, digest: str | None = None) -> dict:
+    """
+    Index a PDF stored in docs/database.
+
+    Returns:
+        Its record; similar_to / similarity are set when an earlier document is a near duplicate.
+    """
+    path = Path(path)
+    digest = digest or content_hash(path)
+    existing = lookup(digest)
+    if existing:
+        if existing["file_name"] != path.name:
+            link_alias(path.name, digest)
+        return existing
+    fp = fingerprint(path)
+    similar = find_similar(fp, exclude_digest=digest)
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO document_hashes "
+            "(digest, file_name, size, pages, text_simhash, image_dhash, similar_to, similarity, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                digest, path.name, path.stat().st_size, fp["pages"],
+                None if fp["text_simhash"] is None else _signed(fp["text_simhash"]),
+                None if fp["image_dhash"] is None else _signed(fp["image_dhash"]),
+                similar[0] if similar else None,
+                round(similar[1], 3) if similar else None,
+                time.time(),
+            ),
+        )
+        _insert_bands(conn, digest, fp["text_simhash"], fp["image_dhash"])
+    return lookup(digest)
+
+
+def link_alias(file_name: str, digest: str) -> None:
+    """Record that a duplicate upload under file_name refers to the stored document."""
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO document_aliases (file_name, digest, linked_at) VALUES (?, ?, ?)",
+            (file_name, digest, time.time()),
+        )
+
+
+def aliases(digest: str) -> list[str]:
+    with _connect() as conn:
+        rows = conn.execute("SELECT file_name FROM document_aliases WHERE digest = ? ORDER BY linked_at", (digest,)).fetchall()
+    return [r["file_name"] for r in rows]
+
+
+def similar_documents(file_names: list[str] | None = None) -> list[dict]:
+    """Documents flagged as similar to an earlier one (only file_names if given), with the earlier file's name."""
+    where, params = "", []
+    if file_names is not None:
+        where, params = f"WHERE h.file_name IN ({', '.join('?' for _ in file_names)}) ", list(file_names)
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT h.*, o.file_name AS similar_file FROM document_hashes h "
+            f"JOIN document_hashes o ON o.digest = h.similar_to {where}ORDER BY h.created_at DESC",
+            params,
+        ).fetchall()
+    return [{**_row_to_record(r), "similar_file": r["similar_file"]} for r in rows]
+
+
+def prior_result(record: dict) -> dict | None:
+    """
+    OCR and extraction outputs already produced for a stored document:
+    its latest succeeded job, else outputs saved under its file stem.
+    """
+    job = job_queue.latest_jobs_by_file([record["file_name"]]).get(record["file_name"])
+    if job and job["status"] == job_queue.SUCCEEDED and job.get("result"):
+        result = job["result"]
+        if Path(result["ocr_output"]).exists() and Path(result["extraction_output"]).exists():
+            return result
+    stem = Path(record["file_name"]).stem
+    ocr_output, extraction_output = OCR_OUTPUT_DIR / f"{stem}.json", EXTRACTION_OUTPUT_DIR / f"{stem}.json"
+    if ocr_output.exists() and extraction_output.exists():
+        return {"ocr_output": str(ocr_output), "extraction_output": str(extraction_output), "doc_type": None}
+    return None
+
+
+def sync(folder: Path = DATABASE_DIR) -> int:
+    """
+    Index PDFs in the folder that are not indexed yet (by name); returns how many were added.
+
+    Uploads and the ingest daemon register files as they store them, so this only
+    catches files copied in by hand; it is skipped while the folder's mtime is
+    unchanged since the last sync in this process.
+    """
+    if not folder.exists():
+        return 0
+    folder_mtime = folder.stat().st_mtime
+    if _synced_mtime.get(str(folder)) == folder_mtime:
+        return 0
+    with _connect() as conn:
+        known = {r["file_name"] for r in conn.execute("SELECT file_name FROM document_hashes")}
+        known |= {r["file_name"] for r in conn.execute("SELECT file_name FROM document_aliases")}
+    added = 0
+    for path in sorted(folder.glob("*.pdf"), key=lambda p: p.stat().st_mtime):
+        if path.name not in known:
+            register(path)
+            added += 1
+    _synced_mtime[str(folder)] = folder_mtime
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-hash index of docs/database")
+    parser.add_argument("--similar", action="store_true", help="List documents flagged as similar")
+    args = parser.parse_args()
+
+    if args.similar:
+        for row in similar_documents():
+            print(f"{row['file_name']}  ~{row['similarity']:.0%}  {row['similar_file']}")
+    else:
+        print(f"Indexed {sync()} new document(s)")
@@ -0,0 +1,88 @@
+"""
+Index of the source PDFs in docs/database, for mapping extractions back to them.
+
+The Report Format page used to scan docs/database for each row's source PDF.
+The index is built in one pass over the folder and shared by all sessions of
+the server process, so those lookups are dict hits (the prefix fallback of
+source_pdf() is a bisect). refresh() lists the folder and rebuilds the index
+only when a file was added, removed or modified.
+"""
+
+import bisect
+import os
+import threading
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+DATABASE_DIR = SRC_DIR / "docs" / "database"
+
+_lock = threading.Lock()
+_signature: tuple | None = None
+_catalog: dict = {"pdf_by_stem": {}, "pdf_by_name": {}, "pdf_stems": []}
+
+
+def _listing(folder: Path) -> list[tuple[str, float]]:
+    """(name, mtime) of the PDFs in a folder."""
+    files = []
+    try:
+        with os.scandir(folder) as it:
+            for item in it:
+                if not item.name.lower().endswith(".pdf"):
+                    continue
+                try:
+                    if item.is_file():
+                        files.append((item.name, item.stat().st_mtime))
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return sorted(files)
+
+
+def _build(database: list) -> dict:
+    pdf_by_stem: dict[str, Path] = {}
+    pdf_by_name: dict[str, Path] = {}
+    for name, _ in database:
+        path = DATABASE_DIR / name
+        if path.suffix == ".pdf":
+            pdf_by_stem.setdefault(path.stem, path)
+        pdf_by_name.setdefault(name.lower(), path)
+    return {
+        "pdf_by_stem": pdf_by_stem,
+        "pdf_by_name": pdf_by_name,
+        "pdf_stems": sorted((path.stem.lower(), path.name) for path in pdf_by_name.values()),
+    }
+
+
+def refresh() -> dict:
+    """Bring the index up to date with docs/database and return it."""
+    global _signature, _catalog
+    database = _listing(DATABASE_DIR)
+    signature = tuple(database)
+    with _lock:
+        if signature != _signature:
+            _catalog = _build(database)
+            _signature = signature
+        return _catalog
+
+
+def source_pdf(extraction_file: str, catalog: dict | None = None) -> Path | None:
+    """The PDF in docs/database an extraction file was produced from."""
+    if not extraction_file:
+        return None
+    catalog = catalog or refresh()
+    base = Path(extraction_file).stem.replace("_extracted", "")
+
+    found = catalog["pdf_by_stem"].get(base)
+    if found:
+        return found
+    exact = catalog["pdf_by_name"].get(f"{base}.pdf".lower())
+    if exact:
+        return exact
+
+    # First stored PDF whose stem starts with base (case-insensitive).
+    stems = catalog["pdf_stems"]
+    i = bisect.bisect_left(stems, (base.lower(), ""))
+    if i < len(stems) and stems[i][0].startswith(base.lower()):
+        return DATABASE_DIR / stems[i][1]
+    return None
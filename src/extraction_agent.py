@@ -4,7 +4,7 @@ import os
 from pathlib import Path
 from datetime import datetime, timezone
 
-from openai import AzureOpenAI
+from agents import client  # shared endpoint pool (agents/client_pool.py)
 
 def _get_config_value(name: str) -> str | None:
     value = os.getenv(name)
@@ -83,12 +83,6 @@ deployment = _get_config_value("AZURE_OPENAI_DEPLOYMENT") or "gpt-5.2-chat"
 subscription_key = _get_required_env("AZURE_OPENAI_API_KEY")
 api_version = _get_config_value("AZURE_OPENAI_API_VERSION") or "2024-12-01-preview"
 
-client = AzureOpenAI(
-    api_version=api_version,
-    azure_endpoint=endpoint,
-    api_key=subscription_key,
-)
-
 SYSTEM_PROMPT = """
 You are a structured data extraction engine for financial documents.
 
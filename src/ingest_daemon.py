@@ -0,0 +1,347 @@
+"""
+Watch-folder ingestion: picks up PDFs dropped into folders and queues them.
+
+Watches docs/database (or the configured folders) with inotify where the
+platform has it, falling back to periodic directory scans. A file is submitted
+only once it has stopped changing for the debounce interval, so half-copied
+exports are not picked up. Files are deduplicated by content hash against the
+document index (a stored document that already has a job is not queued again),
+gathered into batches and enqueued in one transaction (see job_queue.py); while
+the queue is deeper than the backpressure limit, ready files wait.
+
+PDFs from folders other than docs/database are copied there first so they
+appear in the app's Documents list, and are indexed by content hash (see
+doc_index.py); a file identical to one already stored is linked to it as an
+alias instead of being copied and processed again.
+
+Config:
+    INGEST_WATCH_DIRS      folders to watch, separated by os.pathsep (default src/docs/database)
+    INGEST_MAX_QUEUE_DEPTH queued+running jobs above which submission pauses (default 50)
+
+Usage:
+    python ingest_daemon.py                       # watch docs/database
+    python ingest_daemon.py /mnt/ap_exports --batch-size 20
+    python ingest_daemon.py --backfill --poll     # also submit files already present, no inotify
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import shutil
+import struct
+import time
+from datetime import datetime
+from pathlib import Path
+
+import doc_index
+import job_queue
+from checkpoints import content_hash
+
+SRC_DIR = Path(__file__).resolve().parent
+DATABASE_DIR = SRC_DIR / "docs" / "database"
+
+DEBOUNCE_SECONDS = 5.0
+POLL_SECONDS = 2.0
+BATCH_SIZE = 10
+BATCH_WAIT_SECONDS = 10.0
+DEFAULT_MAX_QUEUE_DEPTH = 50
+# Names used by copy tools and browsers for files still being written.
+PARTIAL_SUFFIXES = {".tmp", ".part", ".crdownload", ".partial", ".download"}
+
+# inotify(7) constants
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal inotify watcher over libc (Linux only); raises OSError where unavailable."""
+
+    def __init__(self, folders: list[Path]):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify not available")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: dict[int, Path] = {}
+        for folder in folders:
+            wd = self._libc.inotify_add_watch(
+                self.fd, str(folder).encode(), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            )
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}")
+            self.watches[wd] = folder
+
+    def read(self, timeout: float) -> list[Path]:
+        """Paths that changed within timeout seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="ignore")
+            offset += length
+            if name and wd in self.watches:
+                paths.append(self.watches[wd] / name)
+        return paths
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _is_candidate(path: Path) -> bool:
+    return (
+        path.suffix.lower() == ".pdf"
+        and not path.name.startswith(".")
+        and not any(path.name.lower().endswith(s) for s in PARTIAL_SUFFIXES)
+    )
+
+
+def _scan(folders: list[Path]) -> dict[Path, tuple[int, float]]:
+    found = {}
+    for folder in folders:
+        for path in folder.iterdir():
+            if _is_candidate(path) and path.is_file():
+                stat = path.stat()
+                found[path] = (stat.st_size, stat.st_mtime)
+    return found
+
+
+def _in_database(path: Path) -> bool:
+    return path.parent.resolve() == DATABASE_DIR.resolve()
+
+
+def _into_database(path: Path) -> Path:
+    """Copy a PDF into docs/database (unless it is already there) so the app lists it."""
+    if _in_database(path):
+        return path
+    DATABASE_DIR.mkdir(parents=True, exist_ok=True)
+    target = DATABASE_DIR / path.name
+    if target.exists():
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        target = DATABASE_DIR / f"{path.stem}_{stamp}{path.suffix}"
+    shutil.copy2(path, target)
+    return target
+
+
+class IngestDaemon:
+    def __init__(
+        self,
+        folders: list[Path],
+        debounce: float = DEBOUNCE_SECONDS,
+        batch_size: int = BATCH_SIZE,
+        batch_wait: float = BATCH_WAIT_SECONDS,
+        max_queue_depth: int = DEFAULT_MAX_QUEUE_DEPTH,
+        use_inotify: bool = True,
+        options: dict | None = None,
+        priority: str = job_queue.NORMAL,
+        backfill_priority: str = job_queue.BULK,
+    ):
+        self.folders = folders
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_queue_depth = max_queue_depth
+        self.options = options or {}
+        self.priority = priority
+        self.backfill_priority = backfill_priority
+        # Files found at startup by --backfill, submitted as bulk work.
+        self.backfill: set[Path] = set()
+        # path → (size, mtime, monotonic time of last observed change)
+        self.pending: dict[Path, tuple[int, float, float]] = {}
+        # digest → (path, monotonic time it became ready)
+        self.ready: dict[str, tuple[Path, float]] = {}
+        # path → (size, mtime) of files already hashed, so rescans skip them
+        self.handled: dict[Path, tuple[int, float]] = {}
+        self.watcher: Inotify | None = None
+        if use_inotify:
+            try:
+                self.watcher = Inotify(folders)
+            except OSError as e:
+                print(f"inotify unavailable ({e}); polling every {POLL_SECONDS:.0f}s")
+        self._backpressure_logged = False
+
+    def seed(self, backfill: bool) -> None:
+        """Handle files present at startup: submit them (backfill) or leave them alone until they change."""
+        doc_index.sync(DATABASE_DIR)
+        now = time.monotonic()
+        for path, (size, mtime) in _scan(self.folders).items():
+            if backfill:
+                self.pending[path] = (size, mtime, now - self.debounce)
+                self.backfill.add(path)
+            else:
+                self.handled[path] = (size, mtime)
+
+    def _note(self, path: Path, now: float) -> None:
+        try:
+            stat = path.stat()
+        except OSError:
+            self.pending.pop(path, None)
+            return
+        if self.handled.get(path) == (stat.st_size, stat.st_mtime):
+            return
+        previous = self.pending.get(path)
+        if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+            self.pending[path] = (stat.st_size, stat.st_mtime, now)
+
+    def _observe(self) -> None:
+        now = time.monotonic()
+        if self.watcher is not None:
+            for path in self.watcher.read(POLL_SECONDS):
+                if _is_candidate(path):
+                    self._note(path, now)
+            for path in list(self.pending):
+                self._note(path, now)
+        else:
+            time.sleep(POLL_SECONDS)
+            for path in _scan(self.folders):
+                self._note(path, now)
+
+    def _promote_stable(self) -> None:
+        now = time.monotonic()
+        for path, (size, mtime, changed_at) in list(self.pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            try:
+                digest = content_hash(path)
+            except OSError:
+                # Locked by the copier or a network hiccup: try again after another debounce.
+                if path.exists():
+                    self.pending[path] = (size, mtime, now)
+                else:
+                    del self.pending[path]
+                continue
+            del self.pending[path]
+            self.handled[path] = (size, mtime)
+            if digest in self.ready:
+                continue
+            stored = doc_index.lookup(digest)
+            if stored and Path(stored["path"]).resolve() != path.resolve():
+                if stored["file_name"] != path.name:
+                    doc_index.link_alias(path.name, digest)
+                print(f"Skipped {path.name}: identical to stored {stored['file_name']}")
+                continue
+            if stored and job_queue.latest_jobs_by_file([stored["file_name"]]):
+                continue  # indexed and already queued or processed
+            self.ready[digest] = (path, now)
+
+    def _flush(self, force: bool = False) -> None:
+        if not self.ready:
+            return
+        oldest = min(ready_at for _path, ready_at in self.ready.values())
+        if not force and len(self.ready) < self.batch_size and time.monotonic() - oldest < self.batch_wait:
+            return
+
+        depth = job_queue.queue_depth()
+        room = self.max_queue_depth - depth
+        if room <= 0:
+            if not self._backpressure_logged:
+                print(f"Queue depth {depth} ≥ {self.max_queue_depth}; holding {len(self.ready)} file(s)")
+                self._backpressure_logged = True
+            return
+        self._backpressure_logged = False
+
+        batch = sorted(self.ready.items(), key=lambda kv: kv[1][1])[: min(self.batch_size, room)]
+        # Uploads through the app may already have been queued by hand.
+        existing = job_queue.latest_jobs_by_file([path.name for _digest, (path, _at) in batch])
+        queued_by_hand = [(digest, path) for digest, (path, _at) in batch if path.name in existing and _in_database(path)]
+        if queued_by_hand:
+            for digest, path in queued_by_hand:
+                del self.ready[digest]
+                self.backfill.discard(path)
+            batch = [item for item in batch if item[0] in self.ready]
+            if not batch:
+                return
+        options = {"batch_ocr": True, **self.options}
+        by_priority: dict[str, list[tuple[str, Path]]] = {}
+        for digest, (path, _at) in batch:
+            priority = self.backfill_priority if path in self.backfill else self.priority
+            by_priority.setdefault(priority, []).append((digest, path))
+        job_ids = []
+        for priority, group in by_priority.items():
+            targets = [_into_database(path) for _digest, path in group]
+            for (digest, _path), target in zip(group, targets):
+                doc_index.register(target, digest)
+            ids = job_queue.enqueue_many(targets, options, priority=priority)
+            for digest, path in group:
+                del self.ready[digest]
+                self.backfill.discard(path)
+            job_ids += ids
+        print(f"Queued {len(job_ids)} file(s): jobs {min(job_ids)}–{max(job_ids)} ({len(self.ready)} still waiting)")
+
+    def run(self) -> None:
+        mode = "inotify" if self.watcher is not None else "polling"
+        print(f"Watching {', '.join(str(f) for f in self.folders)} ({mode}, debounce {self.debounce:.0f}s)")
+        try:
+            while True:
+                self._observe()
+                self._promote_stable()
+                self._flush()
+        except KeyboardInterrupt:
+            print("Stopping; submitting files that are already stable...")
+            self._promote_stable()
+            self._flush(force=True)
+        finally:
+            if self.watcher is not None:
+                self.watcher.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Watch folders and queue new PDFs for the pipeline")
+    parser.add_argument("folders", nargs="*", help="Folders to watch (default: INGEST_WATCH_DIRS or docs/database)")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS, help="Seconds a file must stay unchanged")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Files per submission")
+    parser.add_argument("--batch-wait", type=float, default=BATCH_WAIT_SECONDS,
+                        help="Max seconds a ready file waits for its batch to fill")
+    parser.add_argument("--max-queue-depth", type=int, default=None,
+                        help="Pause submission while this many jobs are queued or running")
+    parser.add_argument("--poll", action="store_true", help="Scan directories instead of using inotify")
+    parser.add_argument("--backfill", action="store_true", help="Also submit PDFs already in the folders at startup")
+    parser.add_argument("--per-page", action="store_true", help="Queue jobs with one OCR request per page")
+    parser.add_argument("--priority", choices=job_queue.PRIORITIES, default=job_queue.NORMAL,
+                        help="Priority class for newly arriving files")
+    parser.add_argument("--backfill-priority", choices=job_queue.PRIORITIES, default=job_queue.BULK,
+                        help="Priority class for files submitted by --backfill")
+    args = parser.parse_args()
+
+    configured = job_queue._get_config_value("INGEST_WATCH_DIRS")
+    folders = [Path(f) for f in (args.folders or (configured.split(os.pathsep) if configured else [DATABASE_DIR]))]
+    for folder in folders:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    daemon = IngestDaemon(
+        folders,
+        debounce=args.debounce,
+        batch_size=args.batch_size,
+        batch_wait=args.batch_wait,
+        max_queue_depth=args.max_queue_depth or int(
+            job_queue._get_config_value("INGEST_MAX_QUEUE_DEPTH") or DEFAULT_MAX_QUEUE_DEPTH
+        ),
+        use_inotify=not args.poll,
+        options={"batch_ocr": not args.per_page},
+        priority=args.priority,
+        backfill_priority=args.backfill_priority,
+    )
+    daemon.seed(backfill=args.backfill)
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()
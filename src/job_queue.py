@@ -0,0 +1,597 @@
+"""
+SQLite-backed job queue for pipeline runs.
+
+The app enqueues a job per uploaded PDF and polls its row; worker.py claims
+queued jobs and runs them, reporting the current stage and progress. Jobs move
+through:
+
+    queued → running → succeeded
+                     → queued (retry after a failure, with backoff)
+                     → failed (after max_attempts)
+    queued/running → cancelled
+
+A running job is cancelled cooperatively: cancel() sets cancel_requested and the
+worker stops at its next stage boundary. Jobs whose worker stops heart-beating
+are put back in the queue by requeue_stale(), or failed once they have used up
+max_attempts, so a PDF that crashes its worker is not retried forever.
+
+Every job has a priority class: interactive (app uploads), normal, or bulk
+(backfills). claim() picks between classes by weighted fair queuing, so bulk
+work still progresses under a steady interactive load, and each class can be
+capped to a share of the live worker slots. A higher-class job that has waited
+PREEMPT_AFTER_SECONDS without a free slot preempts a lower-class job at its
+next request boundary (update_progress): the lower job goes back to the queue
+(it resumes from its checkpoints) and its worker takes the waiting job.
+
+Config:
+    JOB_DB_PATH            SQLite file (default src/jobs/jobs.db)
+    JOB_PRIORITY_WEIGHTS   JSON {"interactive": 8, "normal": 3, "bulk": 1}
+    JOB_PRIORITY_CAPS      JSON max running jobs per class: an int, or a fraction
+                           of live worker slots (default {"bulk": 0.75})
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+DEFAULT_DB_PATH = SRC_DIR / "jobs" / "jobs.db"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = {QUEUED, RUNNING}
+
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, NORMAL, BULK)  # highest first
+DEFAULT_PRIORITY_WEIGHTS = {INTERACTIVE: 8, NORMAL: 3, BULK: 1}
+DEFAULT_PRIORITY_CAPS = {BULK: 0.75}
+# A higher-class job waiting this long means no slot is free: preempt a lower-class job.
+PREEMPT_AFTER_SECONDS = 5
+# Workers that heart-beat within this window count towards slot capacity.
+LIVE_WORKER_SECONDS = 30
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30
+# A running job whose worker has not heart-beaten for this long is requeued.
+STALE_AFTER_SECONDS = 180
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_name        TEXT NOT NULL,
+    pdf_path         TEXT NOT NULL,
+    options          TEXT NOT NULL DEFAULT '{}',
+    status           TEXT NOT NULL DEFAULT 'queued',
+    stage            TEXT,
+    progress         INTEGER NOT NULL DEFAULT 0,
+    detail           TEXT,
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    max_attempts     INTEGER NOT NULL DEFAULT 3,
+    error            TEXT,
+    result           TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_id        TEXT,
+    created_at       REAL NOT NULL,
+    updated_at       REAL NOT NULL,
+    available_at     REAL NOT NULL,
+    started_at       REAL,
+    finished_at      REAL,
+    heartbeat_at     REAL,
+    priority         TEXT NOT NULL DEFAULT 'normal',
+    preemptions      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_file ON jobs(file_name, id);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id           TEXT PRIMARY KEY,
+    pid          INTEGER,
+    started_at   REAL NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    slots        INTEGER NOT NULL DEFAULT 1
+);
+
+-- Weighted fair queuing: virtual time consumed by each priority class, and the
+-- system virtual time (start tag of the last job started) under SYSTEM_VTIME.
+CREATE TABLE IF NOT EXISTS scheduler (
+    priority TEXT PRIMARY KEY,
+    vtime    REAL NOT NULL
+);
+"""
+
+# Columns added after the first release; queues created earlier get them on open.
+MIGRATIONS = (
+    ("jobs", "priority", "TEXT NOT NULL DEFAULT 'normal'"),
+    ("jobs", "preemptions", "INTEGER NOT NULL DEFAULT 0"),
+    ("workers", "slots", "INTEGER NOT NULL DEFAULT 1"),
+)
+POST_MIGRATION_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_jobs_priority ON jobs(status, priority, available_at);
+"""
+
+
+_initialised: set[str] = set()
+SYSTEM_VTIME = "*"
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the job it is running has been cancelled."""
+
+
+class JobPreempted(Exception):
+    """Raised inside a worker when its job yielded to a higher-priority one, which it should run next."""
+
+    def __init__(self, job_id: int, next_job: dict):
+        super().__init__(f"Job {job_id} preempted by job {next_job['id']}")
+        self.next_job = next_job
+
+
+def _get_config_value(name: str) -> str | None:
+    value = os.getenv(name)
+    if value:
+        return value
+
+    try:
+        import streamlit as st
+
+        secret_value = st.secrets.get(name)
+        if secret_value:
+            return str(secret_value)
+    except Exception:
+        pass
+
+    return None
+
+
+def db_path() -> Path:
+    return Path(_get_config_value("JOB_DB_PATH") or DEFAULT_DB_PATH)
+
+
+def _json_config(name: str, default: dict) -> dict:
+    try:
+        return {**default, **json.loads(_get_config_value(name) or "{}")}
+    except Exception:
+        return dict(default)
+
+
+PRIORITY_WEIGHTS = _json_config("JOB_PRIORITY_WEIGHTS", DEFAULT_PRIORITY_WEIGHTS)
+PRIORITY_CAPS = _json_config("JOB_PRIORITY_CAPS", DEFAULT_PRIORITY_CAPS)
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    for table, column, ddl in MIGRATIONS:
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    conn.executescript(POST_MIGRATION_SCHEMA)
+
+
+@contextmanager
+def connect(path: Path | None = None):
+    """Open the queue database (creating it if needed) and commit on success."""
+    path = path or db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if str(path) not in _initialised:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            _migrate(conn)
+            _initialised.add(str(path))
+        yield conn
+    finally:
+        conn.close()
+
+
+def _row_to_job(row: sqlite3.Row | None) -> dict | None:
+    if row is None:
+        return None
+    job = dict(row)
+    job["options"] = json.loads(job["options"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def _check_priority(priority: str) -> None:
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}'; expected one of {', '.join(PRIORITIES)}")
+
+
+def enqueue(
+    pdf_path: str | Path,
+    options: dict | None = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    priority: str = NORMAL,
+) -> int:
+    """Add a pipeline job for one PDF and return its id."""
+    _check_priority(priority)
+    now = time.time()
+    pdf_path = Path(pdf_path)
+    with connect() as conn:
+        cur = conn.execute(
+            "INSERT INTO jobs (file_name, pdf_path, options, max_attempts, priority, created_at, updated_at, available_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (pdf_path.name, str(pdf_path), json.dumps(options or {}), max_attempts, priority, now, now, now),
+        )
+        return int(cur.lastrowid)
+
+
+def enqueue_many(
+    pdf_paths: list[Path],
+    options: dict | None = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    priority: str = NORMAL,
+) -> list[int]:
+    """Add one job per PDF in a single transaction and return their ids."""
+    _check_priority(priority)
+    now = time.time()
+    ids = []
+    with connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for pdf_path in pdf_paths:
+            cur = conn.execute(
+                "INSERT INTO jobs (file_name, pdf_path, options, max_attempts, priority, created_at, updated_at, available_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (Path(pdf_path).name, str(pdf_path), json.dumps(options or {}), max_attempts, priority, now, now, now),
+            )
+            ids.append(int(cur.lastrowid))
+        conn.execute("COMMIT")
+    return ids
+
+
+def queue_depth() -> int:
+    """Jobs waiting or running."""
+    with connect() as conn:
+        row = conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchone()
+    return int(row["n"])
+
+
+def _class_cap(priority: str, capacity: int) -> int | None:
+    """Max running jobs for a class; None when uncapped."""
+    cap = PRIORITY_CAPS.get(priority)
+    if cap is None:
+        return None
+    if isinstance(cap, float) and cap < 1:
+        return max(1, int(cap * capacity)) if capacity else None
+    return int(cap)
+
+
+def _schedulable(conn: sqlite3.Connection, now: float) -> tuple[dict[str, int], dict[str, int], int]:
+    """(oldest runnable job id per class, running jobs per class, live worker slots)."""
+    heads = {
+        row["priority"]: row["id"]
+        for row in conn.execute(
+            "SELECT priority, MIN(id) AS id FROM jobs WHERE status = ? AND available_at <= ? GROUP BY priority",
+            (QUEUED, now),
+        )
+    }
+    running = {
+        row["priority"]: row["n"]
+        for row in conn.execute("SELECT priority, COUNT(*) AS n FROM jobs WHERE status = ? GROUP BY priority", (RUNNING,))
+    }
+    row = conn.execute(
+        "SELECT COALESCE(SUM(slots), 0) AS n FROM workers WHERE heartbeat_at >= ?", (now - LIVE_WORKER_SECONDS,)
+    ).fetchone()
+    return heads, running, int(row["n"])
+
+
+def _under_cap(priority: str, running: dict[str, int], capacity: int) -> bool:
+    cap = _class_cap(priority, capacity)
+    return cap is None or running.get(priority, 0) < cap
+
+
+def _vtimes(conn: sqlite3.Connection) -> dict[str, float]:
+    return {row["priority"]: row["vtime"] for row in conn.execute("SELECT priority, vtime FROM scheduler")}
+
+
+def _start_tag(vtimes: dict[str, float], priority: str) -> float:
+    """
+    Virtual start time of a class's next job. A class returning from idle starts
+    at the system virtual time, so it cannot claim a burst for the time it was away.
+    """
+    return max(vtimes.get(priority, 0.0), vtimes.get(SYSTEM_VTIME, 0.0))
+
+
+def _charge(conn: sqlite3.Connection, priority: str) -> None:
+    """Advance a class's virtual time by one job and the system virtual time to that job's start."""
+    vtimes = _vtimes(conn)
+    start = _start_tag(vtimes, priority)
+    conn.executemany(
+        "INSERT INTO scheduler (priority, vtime) VALUES (?, ?) ON CONFLICT(priority) DO UPDATE SET vtime = excluded.vtime",
+        [(priority, start + 1.0 / float(PRIORITY_WEIGHTS.get(priority) or 1)), (SYSTEM_VTIME, start)],
+    )
+
+
+def _start(conn: sqlite3.Connection, job_id: int, worker_id: str, now: float) -> dict:
+    conn.execute(
+        "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, stage = NULL, progress = 0, "
+        "detail = NULL, started_at = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+        (RUNNING, worker_id, now, now, now, job_id),
+    )
+    return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def claim(worker_id: str) -> dict | None:
+    """
+    Atomically take the next runnable job, or return None.
+
+    Among classes with runnable jobs and under their cap, the one with the least
+    virtual time (jobs started / weight) goes first; within a class, oldest first.
+    """
+    now = time.time()
+    with connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        heads, running, capacity = _schedulable(conn, now)
+        eligible = [p for p in heads if _under_cap(p, running, capacity)]
+        if not eligible:
+            conn.execute("COMMIT")
+            return None
+        vtimes = _vtimes(conn)
+        priority = min(
+            eligible,
+            key=lambda p: (_start_tag(vtimes, p), PRIORITIES.index(p) if p in PRIORITIES else len(PRIORITIES)),
+        )
+        _charge(conn, priority)
+        job = _start(conn, heads[priority], worker_id, now)
+        conn.execute("COMMIT")
+        return job
+
+
+def _preempt(conn: sqlite3.Connection, job_id: int, now: float) -> dict | None:
+    """
+    If a higher-class job has been waiting for a slot, hand this job's slot to it.
+
+    Returns:
+        The waiting job, now running on this job's worker; None to carry on.
+    """
+    row = conn.execute("SELECT priority, worker_id FROM jobs WHERE id = ? AND status = ?", (job_id, RUNNING)).fetchone()
+    if row is None or row["priority"] not in PRIORITIES or row["priority"] == PRIORITIES[0]:
+        return None
+    higher = PRIORITIES[: PRIORITIES.index(row["priority"])]
+    conn.execute("BEGIN IMMEDIATE")
+    _heads, running, capacity = _schedulable(conn, now)
+    waiting = conn.execute(
+        f"SELECT id, priority FROM jobs WHERE status = ? AND available_at <= ? "
+        f"AND priority IN ({', '.join('?' * len(higher))}) ORDER BY id",
+        (QUEUED, now - PREEMPT_AFTER_SECONDS, *higher),
+    ).fetchall()
+    waiting = sorted(
+        (w for w in waiting if _under_cap(w["priority"], running, capacity)),
+        key=lambda w: (PRIORITIES.index(w["priority"]), w["id"]),
+    )
+    if not waiting:
+        conn.execute("COMMIT")
+        return None
+    target = waiting[0]
+    conn.execute(
+        "UPDATE jobs SET status = ?, worker_id = NULL, attempts = attempts - 1, preemptions = preemptions + 1, "
+        "detail = ?, available_at = ?, updated_at = ? WHERE id = ?",
+        (QUEUED, f"preempted by job {target['id']}", now, now, job_id),
+    )
+    _charge(conn, target["priority"])
+    next_job = _start(conn, target["id"], row["worker_id"], now)
+    conn.execute("COMMIT")
+    return next_job
+
+
+def update_progress(job_id: int, stage: str, progress: int, detail: str | None = None) -> None:
+    """
+    Record the running stage and overall percentage. Called at each request
+    boundary; raises JobCancelled if cancellation was requested, or
+    JobPreempted if the job yielded its slot to a higher-priority one.
+    """
+    now = time.time()
+    with connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET stage = ?, progress = ?, detail = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+            (stage, int(progress), detail, now, now, job_id),
+        )
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is not None and row["cancel_requested"]:
+            raise JobCancelled(f"Job {job_id} was cancelled")
+        next_job = _preempt(conn, job_id, now)
+    if next_job is not None:
+        raise JobPreempted(job_id, next_job)
+
+
+def complete(job_id: int, result: dict) -> None:
+    now = time.time()
+    with connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, progress = 100, detail = NULL, error = NULL, result = ?, "
+            "finished_at = ?, updated_at = ? WHERE id = ?",
+            (SUCCEEDED, json.dumps(result, ensure_ascii=False), now, now, job_id),
+        )
+
+
+def fail(job_id: int, error: str) -> str:
+    """
+    Record a failed attempt. The job is requeued with backoff while attempts
+    remain, otherwise marked failed.
+
+    Returns:
+        The job's new status.
+    """
+    now = time.time()
+    with connect() as conn:
+        row = conn.execute("SELECT attempts, max_attempts, cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return FAILED
+        if row["cancel_requested"]:
+            status, available_at = CANCELLED, now
+        elif row["attempts"] < row["max_attempts"]:
+            status, available_at = QUEUED, now + RETRY_BACKOFF_SECONDS * 2 ** (row["attempts"] - 1)
+        else:
+            status, available_at = FAILED, now
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, available_at = ?, worker_id = NULL, updated_at = ?, "
+            "finished_at = CASE WHEN ? IN (?, ?) THEN ? ELSE NULL END WHERE id = ?",
+            (status, error, available_at, now, status, FAILED, CANCELLED, now, job_id),
+        )
+        return status
+
+
+def mark_cancelled(job_id: int) -> None:
+    now = time.time()
+    with connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, detail = NULL, finished_at = ?, updated_at = ? WHERE id = ?",
+            (CANCELLED, now, now, job_id),
+        )
+
+
+def cancel(job_id: int) -> None:
+    """Cancel a queued job immediately, or ask the worker to stop a running one."""
+    now = time.time()
+    with connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, now, now, job_id, QUEUED),
+        )
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = ?",
+            (now, job_id, RUNNING),
+        )
+
+
+def retry(job_id: int) -> None:
+    """Put a failed or cancelled job back in the queue with a fresh attempt budget."""
+    now = time.time()
+    with connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = 0, error = NULL, cancel_requested = 0, stage = NULL, "
+            "progress = 0, available_at = ?, finished_at = NULL, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (QUEUED, now, now, job_id, FAILED, CANCELLED),
+        )
+
+
+def get_job(job_id: int) -> dict | None:
+    with connect() as conn:
+        return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def list_jobs(limit: int = 100) -> list[dict]:
+    with connect() as conn:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [_row_to_job(r) for r in rows]
+
+
+def latest_jobs_by_file(file_names: list[str] | None = None) -> dict[str, dict]:
+    """Most recent job per uploaded file name (only for file_names if given), for the Documents list."""
+    where, params = "", []
+    if file_names is not None:
+        where, params = f"WHERE file_name IN ({', '.join('?' for _ in file_names)}) ", list(file_names)
+    with connect() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM jobs WHERE id IN (SELECT MAX(id) FROM jobs {where}GROUP BY file_name)", params
+        ).fetchall()
+    return {r["file_name"]: _row_to_job(r) for r in rows}
+
+
+def requeue_stale(stale_after: float = STALE_AFTER_SECONDS) -> tuple[int, int]:
+    """
+    Recover running jobs whose worker stopped heart-beating: requeue those with
+    attempts left, fail the rest.
+
+    Returns:
+        (requeued, failed) counts.
+    """
+    now = time.time()
+    with connect() as conn:
+        failed = conn.execute(
+            "UPDATE jobs SET status = ?, worker_id = NULL, error = 'worker lost', detail = 'worker lost', "
+            "updated_at = ?, finished_at = ? WHERE status = ? AND heartbeat_at < ? AND attempts >= max_attempts",
+            (FAILED, now, now, RUNNING, now - stale_after),
+        ).rowcount
+        requeued = conn.execute(
+            "UPDATE jobs SET status = ?, worker_id = NULL, detail = 'worker lost, requeued', updated_at = ? "
+            "WHERE status = ? AND heartbeat_at < ?",
+            (QUEUED, now, RUNNING, now - stale_after),
+        ).rowcount
+        return requeued, failed
+
+
+def worker_heartbeat(worker_id: str, pid: int, slots: int = 1) -> None:
+    """Mark the worker, and every job it is running, as alive."""
+    now = time.time()
+    with connect() as conn:
+        conn.execute(
+            "INSERT INTO workers (id, pid, started_at, heartbeat_at, slots) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at, slots = excluded.slots",
+            (worker_id, pid, now, now, slots),
+        )
+        conn.execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status = ?",
+            (now, worker_id, RUNNING),
+        )
+
+
+def remove_worker(worker_id: str) -> None:
+    with connect() as conn:
+        conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+
+def live_workers(within_seconds: float = 30) -> list[dict]:
+    with connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM workers WHERE heartbeat_at >= ? ORDER BY started_at", (time.time() - within_seconds,)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def priority_stats(window_seconds: float = 86400) -> list[dict]:
+    """Per class: jobs queued and running now, and p50/p95 queue wait of jobs started in the window."""
+    now = time.time()
+    with connect() as conn:
+        counts = conn.execute(
+            "SELECT priority, SUM(status = ?) AS queued, SUM(status = ?) AS running FROM jobs "
+            "WHERE status IN (?, ?) GROUP BY priority",
+            (QUEUED, RUNNING, QUEUED, RUNNING),
+        ).fetchall()
+        waits = conn.execute(
+            "SELECT priority, started_at - created_at AS wait FROM jobs WHERE started_at >= ? ORDER BY wait",
+            (now - window_seconds,),
+        ).fetchall()
+    by_class = {p: {"priority": p, "queued": 0, "running": 0, "waits": []} for p in PRIORITIES}
+    for row in counts:
+        entry = by_class.setdefault(row["priority"], {"priority": row["priority"], "queued": 0, "running": 0, "waits": []})
+        entry["queued"], entry["running"] = int(row["queued"] or 0), int(row["running"] or 0)
+    for row in waits:
+        by_class.setdefault(row["priority"], {"priority": row["priority"], "queued": 0, "running": 0, "waits": []})
+        by_class[row["priority"]]["waits"].append(row["wait"])
+    rows = []
+    for entry in by_class.values():
+        waits_sorted = entry.pop("waits")
+        entry["p50_wait_seconds"] = round(waits_sorted[int(0.5 * (len(waits_sorted) - 1))], 1) if waits_sorted else None
+        entry["p95_wait_seconds"] = round(waits_sorted[int(0.95 * (len(waits_sorted) - 1))], 1) if waits_sorted else None
+        rows.append(entry)
+    return rows
+
+
+def status_label(job: dict | None) -> str | None:
+    """Short human-readable status for lists, e.g. "🔄 OCR 45%"."""
+    if not job:
+        return None
+    status = job["status"]
+    if status == QUEUED and (job.get("detail") or "").startswith("preempted"):
+        return "⏸️ Paused"
+    if status == QUEUED:
+        return "⏳ Retrying" if job["attempts"] else "⏳ Queued"
+    if status == RUNNING:
+        stage = (job.get("stage") or "starting").replace("_", " ").title()
+        return f"🔄 {stage} {job['progress']}%"
+    if status == SUCCEEDED:
+        return "✅ Processed"
+    if status == FAILED:
+        return "❌ Failed"
+    return "🚫 Cancelled"
@@ -0,0 +1,712 @@
+"""
+SQLite store of document metadata: stored documents, extractions and their line
+items, review / processing statuses and team assignments.
+
+extraction_output/*.json stay the pipeline's output and the store indexes them:
+pipeline.process_pdf records each extraction as it saves it, and sync() picks up
+files written, edited or removed by anything else (batch CLIs, manual fixes),
+re-reading only files whose mtime or size changed. The app pages query the store
+(role filters run in SQL over indexed vendor, invoice number, date, status, team
+and doc type columns) instead of parsing every file on each rerun, and review
+statuses and team assignments survive restarts. Team assignments are imported
+once from docs/database/doc_teams.json.
+
+search() runs over an FTS5 index of each extraction's key fields, line items
+and OCR section text (ocr_output/<stem>.json), maintained alongside the
+extraction rows, with bm25 ranking, snippets and paging. Amounts are also
+indexed without thousands separators, so "3474.41" finds "3,474.41".
+
+The tables live in the job queue database (see job_queue.py).
+
+Usage:
+    python metadata_store.py                   # sync the store with the output folders
+    python metadata_store.py --search "1234"   # sync, then full-text search
+    python metadata_store.py --learn-templates # learn vendor templates from verified extractions
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import job_queue
+from report_format import doc_type_label, format_money_with_currency, map_extraction_to_report_row
+
+SRC_DIR = Path(__file__).resolve().parent
+EXTRACTION_OUTPUT_DIR = SRC_DIR / "extraction_output"
+OCR_OUTPUT_DIR = SRC_DIR / "ocr_output"
+DATABASE_DIR = SRC_DIR / "docs" / "database"
+DOC_TEAMS_PATH = DATABASE_DIR / "doc_teams.json"
+# JSON files in extraction_output that are not extractions (batch_* from runs before
+# the orchestrator kept its manifest in jobs/).
+EXCLUDED_FILES = {"bank_matching_results.json", "batch_manifest.json", "batch_failures.json"}
+
+REVIEW = "review"          # Report Format: pending / verified / rejected
+PROCESSING = "processing"  # Extraction Viewer and Documents list
+DEFAULT_STATUS = {REVIEW: "pending", PROCESSING: "Ready for Review"}
+TEAMS = ("sales", "rental")
+RENTAL_LABELS = ("Utility", "Rental")
+
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y", "%d.%m.%Y",
+    "%d-%b-%Y", "%d-%b-%y", "%d %b %Y", "%d %B %Y", "%d-%B-%Y", "%b %d, %Y", "%B %d, %Y",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_name TEXT PRIMARY KEY,
+    stem      TEXT NOT NULL,
+    size      INTEGER,
+    mtime     REAL,
+    name_team TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_stem ON documents(stem);
+CREATE INDEX IF NOT EXISTS idx_documents_mtime ON documents(mtime);
+
+CREATE TABLE IF NOT EXISTS extractions (
+    file_name    TEXT PRIMARY KEY,
+    stem         TEXT NOT NULL,
+    mtime        REAL NOT NULL,
+    size         INTEGER NOT NULL,
+    doc_type     TEXT,
+    doc_label    TEXT,
+    team         TEXT,
+    vendor       TEXT,
+    invoice_no   TEXT,
+    invoice_date TEXT,
+    date_iso     TEXT,
+    total        TEXT,
+    total_amount REAL,
+    data         TEXT NOT NULL,
+    report_row   TEXT NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_extractions_stem ON extractions(stem, mtime);
+CREATE INDEX IF NOT EXISTS idx_extractions_vendor ON extractions(vendor);
+CREATE INDEX IF NOT EXISTS idx_extractions_invoice_no ON extractions(invoice_no);
+CREATE INDEX IF NOT EXISTS idx_extractions_date ON extractions(date_iso);
+CREATE INDEX IF NOT EXISTS idx_extractions_doc_type ON extractions(doc_type);
+CREATE INDEX IF NOT EXISTS idx_extractions_doc_label ON extractions(doc_label);
+CREATE INDEX IF NOT EXISTS idx_extractions_team ON extractions(team);
+CREATE INDEX IF NOT EXISTS idx_extractions_mtime ON extractions(mtime);
+CREATE INDEX IF NOT EXISTS idx_extractions_total ON extractions(total_amount);
+
+CREATE TABLE IF NOT EXISTS line_items (
+    extraction_file TEXT NOT NULL,
+    position        INTEGER NOT NULL,
+    description     TEXT,
+    quantity        TEXT,
+    unit_price      TEXT,
+    amount          TEXT,
+    tax             TEXT,
+    data            TEXT NOT NULL,
+    PRIMARY KEY (extraction_file, position)
+);
+
+CREATE TABLE IF NOT EXISTS document_status (
+    file_name  TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (file_name, kind)
+);
+CREATE INDEX IF NOT EXISTS idx_document_status ON document_status(kind, status);
+
+CREATE TABLE IF NOT EXISTS team_assignments (
+    file_name   TEXT PRIMARY KEY,
+    team        TEXT NOT NULL,
+    assigned_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_team_assignments_team ON team_assignments(team);
+
+-- rowid = extractions.rowid
+CREATE VIRTUAL TABLE IF NOT EXISTS extraction_search USING fts5(fields, line_items, ocr_text);
+"""
+
+# bm25 column weights for fields, line_items, ocr_text.
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0)
+SNIPPET_TOKENS = 12
+_THOUSANDS = re.compile(r"\b\d{1,3}(?:,\d{3})+(?:\.\d+)?\b")
+
+# Newest extraction per document stem.
+_LATEST_EXTRACTION = """
+SELECT e.stem, e.team, e.doc_type FROM extractions e
+WHERE e.mtime = (SELECT MAX(mtime) FROM extractions WHERE stem = e.stem)
+"""
+
+_schema_ready: set[str] = set()
+
+
+@contextmanager
+def _connect():
+    """The job queue database, with the store's tables created on first use."""
+    with job_queue.connect() as conn:
+        if str(job_queue.db_path()) not in _schema_ready:
+            conn.executescript(SCHEMA)
+            _import_doc_teams(conn)
+            _backfill_search(conn)
+            _schema_ready.add(str(job_queue.db_path()))
+        yield conn
+
+
+def team_from_doc_type(doc_type: str) -> str:
+    text = (doc_type or "").strip().lower()
+    if "rental" in text or "lease" in text or "utility" in text:
+        return "rental"
+    return "sales"
+
+
+def guess_team(file_name: str) -> str:
+    """Team from the file name alone, for documents without an assignment or extraction."""
+    name_l = file_name.lower()
+    if any(token in name_l for token in ["rental", "lease", "ll_"]):
+        return "rental"
+    return "sales"
+
+
+def extraction_stem(name: str) -> str:
+    """The document stem an extraction file belongs to ('X_extracted_v2.json' -> 'X')."""
+    stem = Path(name).stem
+    return stem.split("_extracted", 1)[0] if "_extracted" in stem else stem
+
+
+def _iso_date(text: str | None) -> str | None:
+    text = (text or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def _amount(value) -> float | None:
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = re.sub(r"[^\d.\-]", "", str(value or ""))
+    try:
+        return float(text) if text else None
+    except ValueError:
+        return None
+
+
+def _text(value) -> str | None:
+    return None if value in (None, "") else str(value)
+
+
+def _import_doc_teams(conn) -> None:
+    """Carry team assignments over from doc_teams.json the first time the store is used."""
+    if conn.execute("SELECT 1 FROM team_assignments LIMIT 1").fetchone() or not DOC_TEAMS_PATH.exists():
+        return
+    try:
+        mapping = json.loads(DOC_TEAMS_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return
+    if isinstance(mapping, dict):
+        now = time.time()
+        conn.executemany(
+            "INSERT OR IGNORE INTO team_assignments (file_name, team, assigned_at) VALUES (?, ?, ?)",
+            [(str(k), str(v).lower(), now) for k, v in mapping.items() if str(v).lower() in TEAMS],
+        )
+
+
+def _flatten(value) -> list[str]:
+    if isinstance(value, dict):
+        return [text for v in value.values() for text in _flatten(v)]
+    if isinstance(value, list):
+        return [text for v in value for text in _flatten(v)]
+    text = _text(value)
+    return [text] if text and not isinstance(value, bool) else []
+
+
+def _searchable(texts: list[str]) -> str:
+    """Join texts, appending amounts without thousands separators."""
+    joined = "\n".join(texts)
+    plain = [m.group(0).replace(",", "") for m in _THOUSANDS.finditer(joined)]
+    return joined + ("\n" + " ".join(plain) if plain else "")
+
+
+def _ocr_sections(value) -> list[str]:
+    """Section content from OCR output in any of its shapes (pages, model_output, results)."""
+    if isinstance(value, list):
+        return [text for v in value for text in _ocr_sections(v)]
+    if not isinstance(value, dict):
+        return []
+    if isinstance(value.get("sections"), list):
+        return [str(s.get("content")) for s in value["sections"] if isinstance(s, dict) and s.get("content")]
+    return [text for v in value.values() if isinstance(v, (dict, list)) for text in _ocr_sections(v)]
+
+
+def _index_search(conn, rowid: int, file_name: str, data: dict) -> None:
+    items = [item for item in data.get("line_items") or [] if isinstance(item, dict)]
+    ocr_path = OCR_OUTPUT_DIR / f"{extraction_stem(file_name)}.json"
+    try:
+        ocr_text = _ocr_sections(json.loads(ocr_path.read_text(encoding="utf-8")))
+    except Exception:
+        ocr_text = []
+    conn.execute(
+        "INSERT INTO extraction_search (rowid, fields, line_items, ocr_text) VALUES (?, ?, ?, ?)",
+        (
+            rowid,
+            _searchable([file_name] + _flatten({k: v for k, v in data.items() if k != "line_items"})),
+            _searchable(_flatten(items)),
+            _searchable(ocr_text),
+        ),
+    )
+
+
+def _unindex_search(conn, file_name: str) -> None:
+    row = conn.execute("SELECT rowid FROM extractions WHERE file_name = ?", (file_name,)).fetchone()
+    if row:
+        conn.execute("DELETE FROM extraction_search WHERE rowid = ?", (row["rowid"],))
+
+
+def _backfill_search(conn) -> None:
+    """Index extractions stored before the search index existed."""
+    if conn.execute("SELECT 1 FROM extraction_search LIMIT 1").fetchone():
+        return
+    rows = conn.execute("SELECT rowid, file_name, data FROM extractions").fetchall()
+    if not rows:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    for row in rows:
+        _index_search(conn, row["rowid"], row["file_name"], json.loads(row["data"]))
+    conn.execute("COMMIT")
+
+
+def _write_extraction(conn, path: Path, data: dict, stat: os.stat_result) -> None:
+    doc_type = str(data.get("document_type") or "")
+    report_row = map_extraction_to_report_row(data, 0)
+    date_text = data.get("invoice_date") or data.get("document_date") or data.get("statement_date")
+    total_raw = data.get("grand_total") or data.get("total_amount") or data.get("subtotal") or ""
+    currency_code = str(data.get("currency") or "").strip().upper()
+    _unindex_search(conn, path.name)
+    cursor = conn.execute(
+        "INSERT OR REPLACE INTO extractions (file_name, stem, mtime, size, doc_type, doc_label, team, vendor, "
+        "invoice_no, invoice_date, date_iso, total, total_amount, data, report_row, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            path.name, extraction_stem(path.name), stat.st_mtime, stat.st_size,
+            doc_type or None, doc_type_label(data), team_from_doc_type(doc_type),
+            _text(data.get("vendor_name") or data.get("customer_name") or data.get("account_holder")),
+            _text(data.get("invoice_number") or data.get("document_number") or data.get("statement_number")),
+            _text(date_text), _iso_date(_text(date_text)),
+            format_money_with_currency(total_raw, currency_code) if total_raw else None, _amount(total_raw),
+            json.dumps(data, ensure_ascii=False), json.dumps(report_row, ensure_ascii=False, default=str),
+            time.time(),
+        ),
+    )
+    _index_search(conn, cursor.lastrowid, path.name, data)
+    conn.execute("DELETE FROM line_items WHERE extraction_file = ?", (path.name,))
+    items = [item for item in data.get("line_items") or [] if isinstance(item, dict)]
+    conn.executemany(
+        "INSERT INTO line_items (extraction_file, position, description, quantity, unit_price, amount, tax, data) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                path.name, i,
+                _text(item.get("description") or item.get("product_description")),
+                _text(item.get("quantity")), _text(item.get("unit_price") or item.get("unit_rate")),
+                _text(item.get("amount")), _text(item.get("tax")),
+                json.dumps(item, ensure_ascii=False),
+            )
+            for i, item in enumerate(items)
+        ],
+    )
+
+
+def _delete_extraction(conn, file_name: str) -> None:
+    _unindex_search(conn, file_name)
+    conn.execute("DELETE FROM extractions WHERE file_name = ?", (file_name,))
+    conn.execute("DELETE FROM line_items WHERE extraction_file = ?", (file_name,))
+
+
+def record_extraction(path: str | Path, data: dict | None = None) -> None:
+    """Store (or refresh) one extraction file; called by the pipeline right after saving it."""
+    path = Path(path)
+    if data is None:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        return
+    stat = path.stat()
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _write_extraction(conn, path, data, stat)
+        conn.execute("COMMIT")
+
+
+def _listing(folder: Path, suffix: str | None = None) -> dict[str, os.stat_result]:
+    files = {}
+    try:
+        with os.scandir(folder) as it:
+            for item in it:
+                if suffix and not item.name.endswith(suffix):
+                    continue
+                try:
+                    if item.is_file():
+                        files[item.name] = item.stat()
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def sync(extraction_dir: Path = EXTRACTION_OUTPUT_DIR, database_dir: Path = DATABASE_DIR) -> int:
+    """
+    Bring the store up to date with the output folders.
+
+    Returns:
+        How many extraction files were added, re-read or removed.
+    """
+    extraction_files = {
+        name: stat for name, stat in _listing(extraction_dir, ".json").items() if name not in EXCLUDED_FILES
+    }
+    database_files = _listing(database_dir)
+    database_files.pop(DOC_TEAMS_PATH.name, None)
+
+    with _connect() as conn:
+        known = {r["file_name"]: (r["mtime"], r["size"]) for r in conn.execute("SELECT file_name, mtime, size FROM extractions")}
+        documents = {r["file_name"]: (r["mtime"], r["size"]) for r in conn.execute("SELECT file_name, mtime, size FROM documents")}
+
+    changed = [
+        name for name, stat in extraction_files.items()
+        if known.get(name) != (stat.st_mtime, stat.st_size)
+    ]
+    removed = [name for name in known if name not in extraction_files]
+    parsed = []
+    for name in changed:
+        try:
+            data = json.loads((extraction_dir / name).read_text(encoding="utf-8"))
+        except Exception:
+            continue  # mid-write or hand-edited into invalid JSON; its last good version stays
+        if isinstance(data, dict):
+            parsed.append((name, data))
+
+    new_documents = [
+        (name, Path(name).stem, stat.st_size, stat.st_mtime, guess_team(name))
+        for name, stat in database_files.items()
+        if documents.get(name) != (stat.st_mtime, stat.st_size)
+    ]
+    gone_documents = [(name,) for name in documents if name not in database_files]
+
+    if not (parsed or removed or new_documents or gone_documents):
+        return 0
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for name, data in parsed:
+            try:
+                _write_extraction(conn, extraction_dir / name, data, extraction_files[name])
+            except Exception:
+                continue
+        for name in removed:
+            _delete_extraction(conn, name)
+        conn.executemany(
+            "INSERT OR REPLACE INTO documents (file_name, stem, size, mtime, name_team) VALUES (?, ?, ?, ?, ?)",
+            new_documents,
+        )
+        conn.executemany("DELETE FROM documents WHERE file_name = ?", gone_documents)
+        conn.execute("COMMIT")
+    return len(parsed) + len(removed)
+
+
+def _role_clause(role: str, column: str) -> tuple[str, list]:
+    if role not in TEAMS:
+        return "", []
+    return f" AND {column} = ?", [role]
+
+
+def report_rows(role: str = "admin") -> list[dict]:
+    """Report rows (with _source_file) for the role, by file name; bank statements are left out."""
+    sql = "SELECT file_name, report_row FROM extractions WHERE LOWER(COALESCE(doc_type, '')) NOT LIKE '%bank statement%'"
+    placeholders = ", ".join("?" for _ in RENTAL_LABELS)
+    if role == "rental":
+        sql += f" AND doc_label IN ({placeholders})"
+    elif role == "sales":
+        sql += f" AND doc_label NOT IN ({placeholders})"
+    params = list(RENTAL_LABELS) if role in TEAMS else []
+    with _connect() as conn:
+        rows = conn.execute(sql + " ORDER BY file_name", params).fetchall()
+    return [{**json.loads(r["report_row"]), "_source_file": r["file_name"]} for r in rows]
+
+
+_ITEM_COLUMNS = (
+    "e.file_name, e.stem, e.mtime, e.vendor, e.invoice_no, e.invoice_date, e.total, e.team, e.doc_type, s.status"
+)
+_STATUS_JOIN = "LEFT JOIN document_status s ON s.file_name = e.file_name AND s.kind = ?"
+
+
+def _item(row) -> dict:
+    return {
+        "invoice_id": row["invoice_no"] or Path(row["file_name"]).stem.replace("_extracted", ""),
+        "vendor": row["vendor"] or "-",
+        "date": row["invoice_date"] or "-",
+        "total": row["total"] or "-",
+        "status": row["status"] or DEFAULT_STATUS[PROCESSING],
+        "team": row["team"],
+        "doc_type": row["doc_type"],
+        "last_updated": datetime.fromtimestamp(row["mtime"]).strftime("%Y-%m-%d"),
+        "source_file": row["file_name"],
+    }
+
+
+# Extraction Viewer / Documents list sort keys -> SQL expressions.
+ITEM_SORTS = {
+    "last_updated": "e.mtime",
+    "invoice_id": "COALESCE(e.invoice_no, e.stem)",
+    "vendor": "e.vendor",
+    "date": "e.date_iso",
+    "total": "e.total_amount",
+    "status": f"COALESCE(s.status, '{DEFAULT_STATUS[PROCESSING]}')",
+}
+DOCUMENT_SORTS = {
+    "uploaded": "mtime",
+    "file_name": "file_name",
+    "size": "size",
+    "team": "team",
+}
+
+
+def _order_by(sorts: dict[str, str], sort: str, descending: bool, tiebreak: str) -> str:
+    """ORDER BY for a sort key, missing values last either way and ties in a stable order for paging."""
+    column = sorts.get(sort) or next(iter(sorts.values()))
+    direction = "DESC" if descending else "ASC"
+    return f" ORDER BY {column} IS NULL, {column} COLLATE NOCASE {direction}, {tiebreak} {direction}"
+
+
+def _item_filters(role: str, status: str | None, vendor: str | None) -> tuple[str, list]:
+    clause, params = _role_clause(role, "e.team")
+    if status:
+        clause += " AND COALESCE(s.status, ?) = ?"
+        params += [DEFAULT_STATUS[PROCESSING], status]
+    if vendor:
+        clause += " AND e.vendor = ?"
+        params.append(vendor)
+    return clause, params
+
+
+def repository_items(
+    role: str = "admin",
+    status: str | None = None,
+    vendor: str | None = None,
+    sort: str = "last_updated",
+    descending: bool = True,
+    limit: int = -1,
+    offset: int = 0,
+) -> tuple[int, list[dict]]:
+    """
+    Extraction Viewer rows for the role (without the extraction data).
+
+    Returns:
+        (total rows matching the filters, the rows from offset, at most limit of them,
+        sorted by an ITEM_SORTS key).
+    """
+    clause, params = _item_filters(role, status, vendor)
+    where = f"FROM extractions e {_STATUS_JOIN} WHERE 1 = 1{clause}"
+    with _connect() as conn:
+        total = conn.execute(f"SELECT COUNT(*) {where}", [PROCESSING, *params]).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {_ITEM_COLUMNS} {where}{_order_by(ITEM_SORTS, sort, descending, 'e.file_name')} LIMIT ? OFFSET ?",
+            [PROCESSING, *params, limit, offset],
+        ).fetchall()
+    return total, [_item(r) for r in rows]
+
+
+def repository_filters(role: str = "admin") -> dict:
+    """How many extractions the role sees, and the statuses and vendors to filter them by."""
+    clause, params = _role_clause(role, "e.team")
+    with _connect() as conn:
+        count = conn.execute(f"SELECT COUNT(*) FROM extractions e WHERE 1 = 1{clause}", params).fetchone()[0]
+        statuses = conn.execute(
+            f"SELECT DISTINCT COALESCE(s.status, ?) AS status FROM extractions e {_STATUS_JOIN} "
+            f"WHERE 1 = 1{clause} ORDER BY status",
+            [DEFAULT_STATUS[PROCESSING], PROCESSING, *params],
+        ).fetchall()
+        vendors = conn.execute(
+            f"SELECT DISTINCT e.vendor FROM extractions e WHERE e.vendor NOT IN ('', '-'){clause} ORDER BY e.vendor",
+            params,
+        ).fetchall()
+    return {
+        "count": count,
+        "statuses": [r["status"] for r in statuses],
+        "vendors": [r["vendor"] for r in vendors],
+    }
+
+
+def _match_expression(query: str) -> str:
+    """
+    Every term of the query, as a prefix, in any indexed column:
+    'tnb 3,474.4' -> "tnb"* AND "3 474 4"* (a phrase, so the parts of an amount stay in order).
+    """
+    phrases = [" ".join(re.findall(r"\w+", term)) for term in query.lower().split()]
+    return " AND ".join(f'"{p}"*' for p in phrases if p)
+
+
+def search(
+    query: str,
+    role: str = "admin",
+    status: str | None = None,
+    vendor: str | None = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> tuple[int, list[dict]]:
+    """
+    Full-text search over extracted fields, line items and OCR text.
+
+    Returns:
+        (total matches, one page of Extraction Viewer rows best match first),
+        each row with a snippet of the best matching text (matches in **bold**).
+    """
+    expression = _match_expression(query)
+    if not expression:
+        return 0, []
+    clause, params = _item_filters(role, status, vendor)
+    where = f"FROM extraction_search JOIN extractions e ON e.rowid = extraction_search.rowid {_STATUS_JOIN} " \
+            f"WHERE extraction_search MATCH ?{clause}"
+    with _connect() as conn:
+        total = conn.execute(f"SELECT COUNT(*) {where}", [PROCESSING, expression, *params]).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {_ITEM_COLUMNS}, "
+            f"snippet(extraction_search, -1, '**', '**', '…', {SNIPPET_TOKENS}) AS snippet, "
+            f"bm25(extraction_search, {', '.join(map(str, SEARCH_WEIGHTS))}) AS rank "
+            f"{where} ORDER BY rank LIMIT ? OFFSET ?",
+            [PROCESSING, expression, *params, limit, offset],
+        ).fetchall()
+    return total, [{**_item(r), "snippet": " ".join(r["snippet"].split())} for r in rows]
+
+
+def extraction_data(file_name: str) -> dict | None:
+    with _connect() as conn:
+        row = conn.execute("SELECT data FROM extractions WHERE file_name = ?", (file_name,)).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+def line_items(file_name: str) -> list[dict]:
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT data FROM line_items WHERE extraction_file = ? ORDER BY position", (file_name,)
+        ).fetchall()
+    return [json.loads(r["data"]) for r in rows]
+
+
+def documents(
+    role: str = "admin",
+    name: str | None = None,
+    team: str | None = None,
+    sort: str = "uploaded",
+    descending: bool = True,
+    limit: int = -1,
+    offset: int = 0,
+) -> tuple[int, list[dict]]:
+    """
+    Files stored in docs/database with their team: the assigned team, else the
+    team of the document's newest extraction, else a guess from the file name.
+
+    Returns:
+        (total files matching the filters, the files from offset, at most limit of them,
+        sorted by a DOCUMENT_SORTS key). name matches part of the file name.
+    """
+    clause, params = _role_clause(role, "team")
+    if team:
+        clause += " AND team = ?"
+        params.append(team)
+    if name:
+        clause += " AND file_name LIKE ? ESCAPE '\\'"
+        params.append("%" + re.sub(r"([%_\\])", r"\\\1", name.strip()) + "%")
+    where = (
+        "FROM ("
+        "SELECT d.file_name, d.size, d.mtime, COALESCE(t.team, x.team, d.name_team) AS team, "
+        "s.status FROM documents d "
+        "LEFT JOIN team_assignments t ON t.file_name = d.file_name "
+        f"LEFT JOIN ({_LATEST_EXTRACTION}) x ON x.stem = d.stem "
+        "LEFT JOIN document_status s ON s.file_name = d.file_name AND s.kind = ?"
+        f") WHERE 1 = 1{clause}"
+    )
+    with _connect() as conn:
+        total = conn.execute(f"SELECT COUNT(*) {where}", [PROCESSING, *params]).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * {where}{_order_by(DOCUMENT_SORTS, sort, descending, 'file_name')} LIMIT ? OFFSET ?",
+            [PROCESSING, *params, limit, offset],
+        ).fetchall()
+    return total, [
+        {**dict(r), "path": DATABASE_DIR / r["file_name"], "status": r["status"] or DEFAULT_STATUS[PROCESSING]}
+        for r in rows
+    ]
+
+
+def team_for(file_name: str) -> str:
+    """Team of one stored file (see documents())."""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT COALESCE("
+            "(SELECT team FROM team_assignments WHERE file_name = ?), "
+            "(SELECT team FROM extractions WHERE stem = ? ORDER BY mtime DESC LIMIT 1)) AS team",
+            (file_name, Path(file_name).stem),
+        ).fetchone()
+    return row["team"] or guess_team(file_name)
+
+
+def team_assignments() -> dict[str, str]:
+    with _connect() as conn:
+        rows = conn.execute("SELECT file_name, team FROM team_assignments").fetchall()
+    return {r["file_name"]: r["team"] for r in rows}
+
+
+def assign_team(file_name: str, team: str) -> None:
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO team_assignments (file_name, team, assigned_at) VALUES (?, ?, ?)",
+            (file_name, team, time.time()),
+        )
+
+
+def statuses(kind: str) -> dict[str, str]:
+    """{file_name: status} for every file with a status of this kind."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT file_name, status FROM document_status WHERE kind = ?", (kind,)).fetchall()
+    return {r["file_name"]: r["status"] for r in rows}
+
+
+def set_status(file_name: str, kind: str, status: str) -> None:
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO document_status (file_name, kind, status, updated_at) VALUES (?, ?, ?, ?)",
+            (file_name, kind, status, time.time()),
+        )
+
+
+def clear_statuses(kind: str) -> None:
+    with _connect() as conn:
+        conn.execute("DELETE FROM document_status WHERE kind = ?", (kind,))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite store of document metadata")
+    parser.add_argument("--search", metavar="QUERY", help="Full-text search the extractions")
+    parser.add_argument("--learn-templates", action="store_true",
+                        help="Learn vendor templates from the extractions marked verified")
+    args = parser.parse_args()
+
+    changed = sync()
+    if args.learn_templates:
+        from agents import vendor_templates
+
+        verified = {name for name, status in statuses(REVIEW).items() if status == "verified"}
+        templates = vendor_templates.learn_from_directory(OCR_OUTPUT_DIR, [EXTRACTION_OUTPUT_DIR], verified)
+        vendor_templates.print_learned(templates, vendor_templates.save_templates(templates))
+    elif args.search:
+        total, results = search(args.search)
+        print(f"{total} match(es)")
+        for item in results:
+            print(f"{item['source_file']}  {item['vendor']}  {item['total']}\n    {item['snippet']}")
+    else:
+        with _connect() as conn:
+            counts = {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("documents", "extractions", "line_items", "document_status", "team_assignments")
+            }
+        print(f"Synced {changed} extraction file(s); " + ", ".join(f"{k}: {v}" for k, v in counts.items()))
@@ -6,7 +6,11 @@ import os
 from pathlib import Path
 from datetime import datetime, timezone
 
-from openai import AzureOpenAI, OpenAI
+from openai import OpenAI
+
+from agents import client, usage_fields  # shared endpoint pool (agents/client_pool.py)
+from agents.routing import route
+import tracing
 
 def _get_config_value(name: str) -> str | None:
   value = os.getenv(name)
@@ -65,7 +69,13 @@ def _append_token_usage_log(entry: dict) -> None:
     f.write(json.dumps(entry, ensure_ascii=False) + "\n")
 
 
-def _log_token_usage(completion: object, request_mode: str, file_names: list[str]) -> None:
+def _log_token_usage(
+  completion: object,
+  request_mode: str,
+  file_names: list[str],
+  model: str | None = None,
+  tier: str | None = None,
+) -> None:
   usage = _extract_usage_dict(completion)
   if not usage:
     return
@@ -73,9 +83,12 @@ def _log_token_usage(completion: object, request_mode: str, file_names: list[str
   entry = {
     "timestamp_utc": datetime.now(timezone.utc).isoformat(),
     "request_mode": request_mode,
-    "model": deployment,
+    "model": model or deployment,
+    "tier": tier,
     "file_count": len(file_names),
     "file_names": file_names,
+    **client.last_call(),
+    **usage_fields(),
     **usage,
   }
   _append_token_usage_log(entry)
@@ -88,12 +101,6 @@ deployment = _get_config_value("AZURE_OPENAI_DEPLOYMENT") or "gpt-5.2-chat"
 subscription_key = _get_required_env("AZURE_OPENAI_API_KEY")
 api_version = _get_config_value("AZURE_OPENAI_API_VERSION") or "2024-12-01-preview"
 
-client = AzureOpenAI(
-    api_version=api_version,
-    azure_endpoint=endpoint,
-    api_key=subscription_key,
-)
-
 
 def _image_file_to_data_url(image_path: Path) -> str:
   mime_type, _ = mimetypes.guess_type(str(image_path))
@@ -195,28 +202,39 @@ CRITICAL — MULTI-LINE PRODUCT DESCRIPTIONS:
 """
 
 
+def _trace_request(request_span: tracing.Span, completion: object) -> None:
+  request_span.set(**(_extract_usage_dict(completion) or {}), **client.last_call())
+
+
 def ocr_image_with_chat_model(image_path: Path, user_prompt: str) -> str:
-  data_url = _image_file_to_data_url(image_path)
+  with tracing.span("ocr.encode", pages=1):
+    data_url = _image_file_to_data_url(image_path)
+  tier, routed_deployment = route("ocr", pages=1)
 
   try:
-    completion = client.chat.completions.create(
-      model=deployment,
-      messages=[
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {
-          "role": "user",
-          "content": [
-            {"type": "text", "text": user_prompt},
-            {"type": "image_url", "image_url": {"url": data_url}},
-          ],
-        },
-      ],
-      temperature=1.0,
-    )
+    with tracing.span("ocr.request", model=routed_deployment, tier=tier, pages=1) as request_span:
+      completion = client.chat.completions.create(
+        stage="ocr",
+        model=routed_deployment,
+        messages=[
+          {"role": "system", "content": SYSTEM_PROMPT},
+          {
+            "role": "user",
+            "content": [
+              {"type": "text", "text": user_prompt},
+              {"type": "image_url", "image_url": {"url": data_url}},
+            ],
+          },
+        ],
+        temperature=1.0,
+      )
+      _trace_request(request_span, completion)
     _log_token_usage(
       completion=completion,
       request_mode="single_image",
       file_names=[image_path.name],
+      model=routed_deployment,
+      tier=tier,
     )
     return completion.choices[0].message.content or ""
   except Exception as e:
@@ -244,23 +262,30 @@ def ocr_images_with_chat_model(image_paths: list[Path], user_prompt: str) -> str
     }
   ]
 
-  for idx, image_path in enumerate(image_paths, start=1):
-    content.append({"type": "text", "text": f"Image {idx} filename: {image_path.name}"})
-    content.append({"type": "image_url", "image_url": {"url": _image_file_to_data_url(image_path)}})
+  with tracing.span("ocr.encode", pages=len(image_paths)):
+    for idx, image_path in enumerate(image_paths, start=1):
+      content.append({"type": "text", "text": f"Image {idx} filename: {image_path.name}"})
+      content.append({"type": "image_url", "image_url": {"url": _image_file_to_data_url(image_path)}})
 
+  tier, routed_deployment = route("ocr", pages=len(image_paths))
   try:
-    completion = client.chat.completions.create(
-      model=deployment,
-      messages=[
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": content},
-      ],
-      temperature=1.0,
-    )
+    with tracing.span("ocr.request", model=routed_deployment, tier=tier, pages=len(image_paths)) as request_span:
+      completion = client.chat.completions.create(
+        stage="ocr_batch",
+        model=routed_deployment,
+        messages=[
+          {"role": "system", "content": SYSTEM_PROMPT},
+          {"role": "user", "content": content},
+        ],
+        temperature=1.0,
+      )
+      _trace_request(request_span, completion)
     _log_token_usage(
       completion=completion,
       request_mode="batch",
       file_names=[p.name for p in image_paths],
+      model=routed_deployment,
+      tier=tier,
     )
     return completion.choices[0].message.content or ""
   except Exception as e:
@@ -281,20 +306,35 @@ def _maybe_parse_json(text: str) -> object:
 
 
 def main() -> None:
-  parser = argparse.ArgumentParser(description="OCR images in memo folder")
+  parser = argparse.ArgumentParser(description="OCR a folder of page images (or individual images)")
+  parser.add_argument(
+    "images",
+    nargs="+",
+    help="Image folder (e.g. docs/Inv_1_images) or image files, in page order",
+  )
   parser.add_argument(
     "--batch",
     action="store_true",
     help="Send all images in ONE request (may hit context limits for many/large images).",
   )
+  parser.add_argument(
+    "--output",
+    "-o",
+    default=None,
+    help="Output JSON path (default: ocr_output/<folder or first image stem>.json)",
+  )
   args = parser.parse_args()
 
-  memo_dir = Path(__file__).resolve().parents[1] / "src/docs/Utility_5_images"
-  image_paths = sorted(
-    [p for p in memo_dir.iterdir() if p.is_file() and p.suffix.lower() in {".jpg", ".jpeg", ".png"}]
-  )
+  image_suffixes = {".jpg", ".jpeg", ".png"}
+  image_paths: list[Path] = []
+  for raw in args.images:
+    path = Path(raw)
+    if path.is_dir():
+      image_paths.extend(sorted(p for p in path.iterdir() if p.is_file() and p.suffix.lower() in image_suffixes))
+    elif path.is_file() and path.suffix.lower() in image_suffixes:
+      image_paths.append(path)
   if not image_paths:
-    raise RuntimeError(f"No images found in: {memo_dir}")
+    raise RuntimeError(f"No images found in: {', '.join(args.images)}")
 
   user_prompt = (
     "Transcribe ALL visible text from this document image exactly as it appears. "
@@ -324,10 +364,18 @@ def main() -> None:
       )
     output_obj = {"mode": "per_image", "results": outputs}
 
-  with open("./ocr_output/Utility5.json", "w", encoding="utf-8") as f:
+  if args.output:
+    output_path = Path(args.output)
+  else:
+    first = Path(args.images[0])
+    stem = first.name.removesuffix("_images") if first.is_dir() else first.stem
+    output_path = Path(__file__).resolve().parent / "ocr_output" / f"{stem}.json"
+  output_path.parent.mkdir(parents=True, exist_ok=True)
+  with open(output_path, "w", encoding="utf-8") as f:
     json.dump(output_obj, f, ensure_ascii=False, indent=2)
 
-  print(json.dumps({"results": outputs}, ensure_ascii=False, indent=2))
+  print(json.dumps(output_obj, ensure_ascii=False, indent=2))
+  print(f"Saved to: {output_path}")
 
 
 if __name__ == "__main__":
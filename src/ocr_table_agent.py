@@ -5,7 +5,9 @@ import mimetypes
 import os
 from pathlib import Path
 
-from openai import AzureOpenAI, OpenAI
+from openai import OpenAI
+
+from agents import client  # shared endpoint pool (agents/client_pool.py)
 
 def _get_config_value(name: str) -> str | None:
   value = os.getenv(name)
@@ -40,12 +42,6 @@ deployment = _get_config_value("AZURE_OPENAI_DEPLOYMENT") or "gpt-5.2-chat"
 subscription_key = _get_required_env("AZURE_OPENAI_API_KEY")
 api_version = _get_config_value("AZURE_OPENAI_API_VERSION") or "2024-12-01-preview"
 
-client = AzureOpenAI(
-    api_version=api_version,
-    azure_endpoint=endpoint,
-    api_key=subscription_key,
-)
-
 
 def _image_file_to_data_url(image_path: Path) -> str:
   mime_type, _ = mimetypes.guess_type(str(image_path))
@@ -5,15 +5,29 @@ Usage:
     python orchestrator.py <ocr_json_file>
     python orchestrator.py <ocr_json_file> --output result.json
     python orchestrator.py <ocr_json_file> --type commercial_invoice   # skip classification
+    python orchestrator.py --input ocr_output --dry-run                # estimate calls/tokens/cost only
+    python orchestrator.py --input ocr_output --workers 8              # batch: directory or glob, resumable
+    python orchestrator.py --input "ocr_output/*ELEC*.json" --processes
 """
 
 import argparse
+import glob
 import json
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
 
-from agents import call_extraction_agent, maybe_parse_json
-from agents.classifier import classify_document
+import tracing
+from checkpoints import write_json_atomic
+from agents import call_extraction_agent, maybe_parse_json, usage_context, _get_config_value
+from agents import line_items
+from agents import vendor_templates
+from agents.validation import validate_and_repair
+from agents.ocr_text import load_ocr, iter_pages
+from agents.routing import route, escalate
+from agents.classifier import classify_document, classify_documents
 from agents import extraction_invoice
 from agents import extraction_travel
 from agents import extraction_rental
@@ -38,25 +52,133 @@ AGENT_REGISTRY: dict[str, tuple[str, str]] = {
 FALLBACK_SYSTEM_PROMPT = extraction_invoice.SYSTEM_PROMPT
 FALLBACK_USER_PROMPT = extraction_invoice.USER_PROMPT
 
+# Model tiers per (stage, doc_type, size class) live in agents/routing.py (ROUTING_TABLE).
 
-def run(ocr_json_str: str, forced_type: str | None = None) -> tuple[str, object]:
+# Types whose line items are assembled locally from table rows (agents/line_items.py).
+# Utility bills are excluded: their charge tables mix line items with surcharges.
+LOCAL_LINE_ITEM_TYPES = {
+    "commercial_invoice", "credit_note", "rental", "hotel", "travel", "soa", "bank_statement",
+}
+LOCAL_LINE_ITEMS_ENABLED = (_get_config_value("LOCAL_LINE_ITEMS") or "1") != "0"
+VENDOR_TEMPLATES_ENABLED = (_get_config_value("VENDOR_TEMPLATES") or "1") != "0"
+
+
+def _extract_with_local_items(
+    doc_type: str,
+    system_prompt: str,
+    user_prompt: str,
+    ocr_json_str: str,
+    deployment: str | None = None,
+    tier: str | None = None,
+) -> object | None:
+    """
+    Extract header fields with the LLM and assemble line items locally.
+
+    Returns None when the document has no clean line-item table, so the caller
+    falls back to a full LLM extraction.
+    """
+    ocr_obj = load_ocr(ocr_json_str)
+    table = line_items.find_item_table(ocr_obj, doc_type)
+    local = line_items.extract_line_items(table, doc_type)
+    if local is None or not local[0]:
+        return None
+
+    key = line_items.items_key(doc_type)
+    note = line_items.LINE_ITEMS_NOTE.format(
+        key=key,
+        header=" | ".join(table["header"]),
+        fields=", ".join(line_items.ITEM_FIELDS[doc_type]),
+    )
+    payload = json.dumps(line_items.strip_item_rows(ocr_obj, table), ensure_ascii=False)
+    parsed = maybe_parse_json(call_extraction_agent(system_prompt, note + user_prompt, payload, deployment, tier))
+    if not isinstance(parsed, dict) or "error" in parsed:
+        return parsed
+
+    column_mapping = parsed.pop("column_mapping", None)
+    if isinstance(column_mapping, dict):
+        local = line_items.extract_line_items(table, doc_type, column_mapping) or local
+    local_items, low_confidence = local
+    parsed[key] = local_items
+    print(f"  Line items assembled locally: {len(local_items)}"
+          + (f" ({len(low_confidence)} from low-confidence OCR rows)" if low_confidence else ""))
+    # Kept out of the saved extraction: its items hold only schema fields.
+    tracing.annotate(low_confidence_items=len(low_confidence))
+    return parsed
+
+
+def _extract(
+    doc_type: str,
+    system_prompt: str,
+    user_prompt: str,
+    ocr_json_str: str,
+    deployment: str,
+    tier: str,
+) -> object:
+    """Extract with the given deployment: line items locally where the table is clean, else all via the LLM."""
+    parsed = None
+    if LOCAL_LINE_ITEMS_ENABLED and doc_type in LOCAL_LINE_ITEM_TYPES:
+        parsed = _extract_with_local_items(doc_type, system_prompt, user_prompt, ocr_json_str, deployment, tier)
+    if parsed is None:
+        raw_result = call_extraction_agent(system_prompt, user_prompt, ocr_json_str, deployment, tier)
+        parsed = maybe_parse_json(raw_result)
+
+    # Inject classification into result if it's a dict
+    if isinstance(parsed, dict) and "document_type" not in parsed:
+        parsed["document_type"] = doc_type
+
+    # Validate against the schema; re-ask only for missing/malformed fields
+    with tracing.span("validate", doc_type=doc_type) as validate_span:
+        validated = validate_and_repair(parsed, doc_type, ocr_json_str)
+        if isinstance(validated, dict):
+            validate_span.set(issues=len(validated.get("validation_issues") or []))
+    return validated
+
+
+@tracing.traced("orchestrator.run")
+def run(
+    ocr_json_str: str,
+    forced_type: str | None = None,
+    classified_type: str | None = None,
+    on_classified=None,
+) -> tuple[str, object]:
     """
     Classify and extract.
 
     Args:
         ocr_json_str: Raw OCR JSON string.
         forced_type: If set, skip classification and use this type directly.
+        classified_type: Label already produced by batch classification (see run_batch
+            and pipeline.py) or restored from a checkpoint.
+        on_classified: Called with the label right after a classifier call, so callers
+            can checkpoint it before extraction starts.
 
     Returns:
         (document_type, extracted_data)
     """
+    # 0. Recurring billers: a learned vendor template skips classification and the LLM
+    vendor = "-"
+    if VENDOR_TEMPLATES_ENABLED:
+        with tracing.span("template") as template_span:
+            vendor, template_result = vendor_templates.extract_with_template(ocr_json_str, forced_type)
+            template_span.set(vendor=vendor, hit=template_result is not None)
+        if template_result is not None:
+            tracing.annotate(doc_type=template_result[0], source="template")
+            return template_result
+
     # 1. Classify
     if forced_type:
         doc_type = forced_type
         print(f"  Document type (forced): {doc_type}")
+    elif classified_type:
+        doc_type = classified_type
+        print(f"  Document type (batch classified): {doc_type}")
     else:
-        doc_type = classify_document(ocr_json_str)
+        with tracing.span("classify") as classify_span:
+            doc_type = classify_document(ocr_json_str)
+            classify_span.set(label=doc_type)
         print(f"  Document type (classified): {doc_type}")
+        if on_classified:
+            on_classified(doc_type)
 
     # 2. Route to agent
     if doc_type in AGENT_REGISTRY:
@@ -65,31 +187,255 @@ def run(ocr_json_str: str, forced_type: str | None = None) -> tuple[str, object]
         print(f"  WARNING: Unknown type '{doc_type}', using fallback (commercial_invoice) agent.")
         system_prompt, user_prompt = FALLBACK_SYSTEM_PROMPT, FALLBACK_USER_PROMPT
 
-    # 3. Extract
-    raw_result = call_extraction_agent(system_prompt, user_prompt, ocr_json_str)
-    parsed = maybe_parse_json(raw_result)
+    # 3. Extract and validate on the routed tier
+    started = time.perf_counter()
+    page_count = len(iter_pages(load_ocr(ocr_json_str)))
+    tier, deployment = route("extract", doc_type, pages=page_count, chars=len(ocr_json_str))
+    print(f"  Model tier: {tier} ({deployment})")
+    tracing.annotate(doc_type=doc_type, pages=page_count)
+    with tracing.span("extract", doc_type=doc_type, tier=tier, model=deployment), usage_context(doc_type=doc_type):
+        parsed = _extract(doc_type, system_prompt, user_prompt, ocr_json_str, deployment, tier)
 
-    # Inject classification into result if it's a dict
-    if isinstance(parsed, dict) and "document_type" not in parsed:
-        parsed["document_type"] = doc_type
+    # 4. Still invalid after repair: retry once on the next tier up and keep the better result
+    escalation = escalate(tier) if isinstance(parsed, dict) and parsed.get("validation_issues") else None
+    if escalation:
+        tier, deployment = escalation
+        print(f"  Validation failed; escalating to tier: {tier} ({deployment})")
+        with tracing.span("escalate", doc_type=doc_type, tier=tier, model=deployment), usage_context(doc_type=doc_type):
+            retried = _extract(doc_type, system_prompt, user_prompt, ocr_json_str, deployment, tier)
+        if isinstance(retried, dict) and "error" not in retried and (
+            len(retried.get("validation_issues") or []) <= len(parsed["validation_issues"])
+        ):
+            parsed = retried
+    if VENDOR_TEMPLATES_ENABLED:
+        vendor_templates.log_usage(vendor, "llm", time.perf_counter() - started)
 
     return doc_type, parsed
 
 
+SRC_DIR = Path(__file__).resolve().parent
+DEFAULT_BATCH_OUTPUT_DIR = SRC_DIR / "extraction_output"
+DEFAULT_OCR_INPUT_DIR = SRC_DIR / "ocr_output"
+# Batch progress lives outside the output folder, which the app reads as extractions.
+BATCH_STATE_DIR = SRC_DIR / "jobs"
+MANIFEST_NAME = "batch_manifest.json"
+FAILURES_NAME = "batch_failures.json"
+# Files in ocr_output that are not OCR results (the batch files from older runs included).
+NON_DOCUMENT_FILES = {"token_usage_log.jsonl", MANIFEST_NAME, FAILURES_NAME}
+# Pending inputs read and classified together before extraction starts.
+CLASSIFY_CHUNK_FILES = 200
+
+
+def resolve_inputs(pattern: str) -> list[Path]:
+    """Expand a file, directory or glob pattern into the OCR JSON files to process."""
+    path = Path(pattern)
+    if path.is_dir():
+        candidates = path.glob("*.json")
+    elif path.is_file():
+        candidates = [path]
+    else:
+        candidates = (Path(p) for p in glob.glob(pattern, recursive=True))
+    return sorted(p for p in candidates if p.is_file() and p.suffix == ".json" and p.name not in NON_DOCUMENT_FILES)
+
+
+def _input_signature(path: Path) -> dict:
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _classify_pending(paths: list[Path]) -> dict[str, str]:
+    """
+    Labels for the batch's inputs from classify_documents(), which packs the
+    documents the local stages can't settle into few LLM requests. Inputs
+    missing from the result are classified one by one during extraction.
+    """
+    labels: dict[str, str] = {}
+    for start in range(0, len(paths), CLASSIFY_CHUNK_FILES):
+        chunk = paths[start:start + CLASSIFY_CHUNK_FILES]
+        try:
+            chunk_labels = classify_documents([p.read_text(encoding="utf-8") for p in chunk])
+        except Exception as e:
+            print(f"  Batch classification failed ({type(e).__name__}: {e}); classifying per document")
+            continue
+        labels.update((str(p), label) for p, label in zip(chunk, chunk_labels) if label != "unknown")
+    return labels
+
+
+def _process_file(input_path: str, output_dir: str, forced_type: str | None, classified_type: str | None = None) -> dict:
+    """Batch worker: extract one OCR file and write extraction_output/<stem>.json."""
+    started = time.monotonic()
+    path = Path(input_path)
+    record = {"input": str(path), "output": str(Path(output_dir) / f"{path.stem}.json")}
+    try:
+        doc_type, extracted = run(
+            path.read_text(encoding="utf-8"), forced_type=forced_type, classified_type=classified_type
+        )
+        error = None
+        if isinstance(extracted, dict) and "error" in extracted:
+            error = extracted.get("message") or extracted.get("error")
+        else:
+            write_json_atomic(Path(record["output"]), extracted)
+        record.update(document_type=doc_type, status="failed" if error else "done", error=error)
+    except Exception as e:
+        record.update(status="failed", error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.monotonic() - started, 2)
+    return record
+
+
+def _format_eta(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{secs:02d}s"
+
+
+def run_batch(
+    inputs: list[Path],
+    output_dir: Path = DEFAULT_BATCH_OUTPUT_DIR,
+    forced_type: str | None = None,
+    workers: int = 4,
+    use_processes: bool = False,
+    resume: bool = True,
+    state_dir: Path = BATCH_STATE_DIR,
+) -> dict:
+    """
+    Extract many OCR files in parallel. The pending files are classified up
+    front in batched requests, then each worker extracts one file.
+
+    Progress is kept in <state_dir>/batch_manifest.json (one entry per input,
+    keyed by path and checked against size/mtime and output path), so an
+    interrupted run picks up where it stopped. Failures are written to
+    <state_dir>/batch_failures.json.
+
+    Returns:
+        The manifest entries of this run, keyed by input path.
+    """
+    manifest_path = state_dir / MANIFEST_NAME
+    manifest: dict[str, dict] = {}
+    if resume and manifest_path.exists():
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except Exception:
+            manifest = {}
+
+    pending = []
+    for path in inputs:
+        entry = manifest.get(str(path))
+        if (
+            entry
+            and entry.get("status") == "done"
+            and entry.get("source") == _input_signature(path)
+            and entry.get("output") == str(output_dir / f"{path.stem}.json")
+            and Path(entry["output"]).exists()
+        ):
+            continue
+        pending.append(path)
+
+    skipped = len(inputs) - len(pending)
+    print(f"Batch: {len(inputs)} file(s), {skipped} already done, {len(pending)} to process with {workers} worker(s)")
+
+    started = time.monotonic()
+    labels = {} if forced_type else _classify_pending(pending)
+    if labels:
+        print(f"Classified {len(labels)} file(s) in batch ({_format_eta(time.monotonic() - started)})")
+
+    pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    finished = 0
+    results: dict[str, dict] = {}
+    with pool_cls(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(_process_file, str(path), str(output_dir), forced_type, labels.get(str(path))): path
+            for path in pending
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            record = future.result()
+            record["source"] = _input_signature(path)
+            record["finished_utc"] = datetime.now(timezone.utc).isoformat()
+            manifest[str(path)] = results[str(path)] = record
+            write_json_atomic(manifest_path, manifest)
+
+            finished += 1
+            elapsed = time.monotonic() - started
+            rate = finished / elapsed if elapsed else 0.0
+            eta = (len(pending) - finished) / rate if rate else 0.0
+            mark = "✓" if record["status"] == "done" else "✗"
+            print(
+                f"  [{finished}/{len(pending)}] {mark} {path.name} ({record['seconds']:.1f}s) "
+                f"— {rate * 60:.1f} docs/min, ETA {_format_eta(eta)}"
+            )
+
+    batch_inputs = {str(p) for p in inputs}
+    failures = [r for r in manifest.values() if r.get("status") == "failed" and r["input"] in batch_inputs]
+    write_json_atomic(state_dir / FAILURES_NAME, failures)
+    done = sum(1 for r in results.values() if r["status"] == "done")
+    print(f"\nDone: {done} succeeded, {len(results) - done} failed, {skipped} skipped "
+          f"in {_format_eta(time.monotonic() - started)}")
+    if failures:
+        print(f"Failures ({len(failures)}), see {state_dir / FAILURES_NAME}:")
+        for r in failures:
+            print(f"  - {Path(r['input']).name}: {r.get('error')}")
+    return results
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Orchestrator: classify + extract from OCR JSON")
-    parser.add_argument("--input", help="Path to OCR output JSON file")
-    parser.add_argument("--output", "-o", default=None, help="Output file path")
+    parser.add_argument("--input", help="OCR output JSON file, or a directory/glob for batch mode "
+                                        "(required unless --dry-run, which defaults to ocr_output/)")
+    parser.add_argument("--output", "-o", default=None, help="Output file path (batch mode: output directory)")
     parser.add_argument("--type", "-t", default=None,
                         choices=list(AGENT_REGISTRY.keys()) + ["unknown"],
                         help="Force document type (skip classification)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Don't call the model; print estimated calls, tokens, cost and time (file or directory)")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="With --dry-run: parallel requests for the wall-time estimate")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Batch mode: parallel documents (default PIPELINE_CONCURRENCY or 4)")
+    parser.add_argument("--processes", action="store_true",
+                        help="Batch mode: use worker processes instead of threads")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Batch mode: reprocess files the manifest already marks as done")
     args = parser.parse_args()
+    if args.input is None and not args.dry_run:
+        parser.error("--input is required unless --dry-run is given")
 
-    input_path = Path(args.input)
-    if not input_path.exists():
+    pattern = args.input or str(DEFAULT_OCR_INPUT_DIR)
+    input_path = Path(pattern)
+    if not input_path.exists() and not any(ch in pattern for ch in "*?["):
         print(f"ERROR: File not found: {input_path}", file=sys.stderr)
         sys.exit(1)
 
+    if args.dry_run:
+        import cost_estimator
+
+        files = resolve_inputs(pattern)
+        if not files:
+            print(f"ERROR: No OCR JSON files match: {pattern}", file=sys.stderr)
+            sys.exit(1)
+        ratios = cost_estimator.load_ratios()
+        estimates = [
+            cost_estimator.estimate_ocr_json(p.name, p.read_text(encoding="utf-8"), args.type, ratios)
+            for p in files
+        ]
+        cost_estimator.print_plan(estimates, args.concurrency)
+        return
+
+    if not input_path.is_file():
+        # Directory or glob: batch mode.
+        inputs = resolve_inputs(pattern)
+        if not inputs:
+            print(f"ERROR: No OCR JSON files match: {pattern}", file=sys.stderr)
+            sys.exit(1)
+        run_batch(
+            inputs,
+            output_dir=Path(args.output) if args.output else DEFAULT_BATCH_OUTPUT_DIR,
+            forced_type=args.type,
+            workers=args.workers or int(_get_config_value("PIPELINE_CONCURRENCY") or 4),
+            use_processes=args.processes,
+            resume=not args.no_resume,
+        )
+        return
+
     ocr_json_str = input_path.read_text(encoding="utf-8")
     print(f"Processing: {input_path.name}")
 
@@ -2,6 +2,8 @@ import fitz  # pymupdf
 import os
 from pathlib import Path
 
+import tracing
+
 
 def pdf_to_images(pdf_path: str | Path, output_dir: str | Path = None, dpi: int = 300) -> list[Path]:
     """Convert each page of a PDF into a PNG image.
@@ -21,16 +23,19 @@ def pdf_to_images(pdf_path: str | Path, output_dir: str | Path = None, dpi: int
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    doc = fitz.open(pdf_path)
-    image_paths: list[Path] = []
+    with tracing.span("render", pdf=pdf_path.name, dpi=dpi) as render_span:
+        doc = fitz.open(pdf_path)
+        image_paths: list[Path] = []
 
-    for i, page in enumerate(doc):
-        pix = page.get_pixmap(dpi=dpi)
-        out_path = output_dir / f"{pdf_path.stem}_page_{i + 1}.png"
-        pix.save(str(out_path))
-        image_paths.append(out_path)
+        for i, page in enumerate(doc):
+            with tracing.span("render.page", page=i + 1):
+                pix = page.get_pixmap(dpi=dpi)
+                out_path = output_dir / f"{pdf_path.stem}_page_{i + 1}.png"
+                pix.save(str(out_path))
+            image_paths.append(out_path)
 
-    doc.close()
+        doc.close()
+        render_span.set(pages=len(image_paths))
     return image_paths
 
 
@@ -65,11 +70,27 @@ if __name__ == "__main__":
     parser.add_argument("--input", help="Path to a single PDF or a directory of PDFs")
     parser.add_argument("--output", "-o", default=None, help="Output directory")
     parser.add_argument("--dpi", type=int, default=300, help="Render DPI (default: 300)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Don't render; print estimated pipeline calls, tokens, cost and time")
+    parser.add_argument("--per-page", action="store_true",
+                        help="With --dry-run: estimate one OCR request per page instead of one per document")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="With --dry-run: parallel requests for the wall-time estimate")
     args = parser.parse_args()
 
     input_path = Path(args.input)
 
-    if input_path.is_file() and input_path.suffix.lower() == ".pdf":
+    if args.dry_run:
+        import cost_estimator
+
+        pdfs = [input_path] if input_path.is_file() else sorted(input_path.glob("*.pdf"))
+        if not pdfs:
+            print(f"Error: no PDFs found at '{input_path}'.")
+        else:
+            ratios = cost_estimator.load_ratios()
+            estimates = [cost_estimator.estimate_pdf(p, args.dpi, ratios, batch_ocr=not args.per_page) for p in pdfs]
+            cost_estimator.print_plan(estimates, args.concurrency)
+    elif input_path.is_file() and input_path.suffix.lower() == ".pdf":
         paths = pdf_to_images(input_path, args.output, args.dpi)
         print(f"Converted {input_path.name} -> {len(paths)} image(s)")
         for p in paths:
@@ -0,0 +1,540 @@
+"""
+End-to-end pipeline: PDF → images → OCR → classify + extract.
+
+Each stage runs its own worker threads and hands documents to the next stage
+through a bounded queue, so many PDFs are in flight at once: rendering (CPU,
+done in worker processes) overlaps with the network-bound OCR and extraction
+calls, and a slow stage applies backpressure instead of piling up images.
+Between OCR and extraction, a classify stage gathers the OCR'd documents that
+are waiting into one classify_documents() call (as many header excerpts as fit
+the classifier's token budget) instead of one classifier request per document.
+
+Results are written to ocr_output/<stem>.json and extraction_output/<stem>.json,
+the same files the Streamlit app produces. Every stage checkpoints its output
+by content hash (see checkpoints.py), so a failed run resumes from the last
+completed stage and re-running an unchanged PDF makes no model calls.
+
+Usage:
+    python pipeline.py docs/*.pdf
+    python pipeline.py docs --ocr-workers 6 --extract-workers 4 --render-workers 2
+    python pipeline.py invoice.pdf --per-page --type commercial_invoice
+"""
+
+import argparse
+import json
+import queue
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import metadata_store
+import tracing
+from agents import usage_context
+from agents.classifier import BATCH_MAX_DOCUMENTS, BATCH_TOKEN_BUDGET, EXCERPT_TOKEN_BUDGET, classify_documents
+from checkpoints import DocumentCheckpoint, write_json_atomic
+from pdf_to_images import pdf_to_images
+from ocr_agent import ocr_images_with_chat_model, ocr_image_with_chat_model, _maybe_parse_json
+from orchestrator import run as orchestrator_run, AGENT_REGISTRY
+
+SRC_DIR = Path(__file__).resolve().parent
+OCR_OUTPUT_DIR = SRC_DIR / "ocr_output"
+EXTRACTION_OUTPUT_DIR = SRC_DIR / "extraction_output"
+
+OCR_USER_PROMPT = (
+    "Transcribe ALL visible text from this document image exactly as it appears. "
+    "Output the result as a single valid JSON object following the schema in your instructions. "
+    "Do NOT interpret, summarize, or calculate anything. "
+    "Preserve all numbers, punctuation, and formatting exactly."
+)
+
+# Documents per classify_documents() call in the pipeline: as many excerpts as fit the budget.
+CLASSIFY_BATCH_DOCUMENTS = max(1, min(BATCH_MAX_DOCUMENTS, BATCH_TOKEN_BUDGET // EXCERPT_TOKEN_BUDGET))
+# How long the classify stage waits for more OCR'd documents before classifying a partial batch.
+CLASSIFY_LINGER_SECONDS = 1.0
+
+_DONE = object()
+
+
+@tracing.traced("ocr")
+def ocr_document(
+    image_paths: list[Path],
+    batch: bool = True,
+    on_page=None,
+    checkpoint: DocumentCheckpoint | None = None,
+) -> tuple[object, str]:
+    """
+    OCR one document's page images, in one batch request or one request per page.
+    With a checkpoint, pages (or the batch) already transcribed are reused and
+    new successful results are saved immediately.
+
+    Returns:
+        (parsed OCR output, OCR JSON string for the orchestrator)
+    """
+    tracing.annotate(mode=_ocr_key(batch), pages=len(image_paths))
+    if batch:
+        raw_ocr = checkpoint.load("ocr_batch") if checkpoint else None
+        tracing.annotate(cached=isinstance(raw_ocr, str))
+        if not isinstance(raw_ocr, str):
+            raw_ocr = ocr_images_with_chat_model(image_paths, OCR_USER_PROMPT)
+            if checkpoint and not ocr_error(_maybe_parse_json(raw_ocr)):
+                checkpoint.save("ocr_batch", raw_ocr)
+        with tracing.span("ocr.parse", chars=len(raw_ocr) if isinstance(raw_ocr, str) else None):
+            ocr_parsed = _maybe_parse_json(raw_ocr)
+        return ocr_parsed, raw_ocr if isinstance(raw_ocr, str) else json.dumps(ocr_parsed, ensure_ascii=False)
+
+    pages_list = []
+    for idx, image_path in enumerate(image_paths):
+        if on_page:
+            on_page(idx + 1, len(image_paths))
+        page_output = checkpoint.load("ocr_page", idx + 1) if checkpoint else None
+        if page_output is None:
+            with tracing.span("ocr.page", page=idx + 1):
+                raw_page = ocr_image_with_chat_model(image_path, OCR_USER_PROMPT)
+                with tracing.span("ocr.parse", chars=len(raw_page)):
+                    page_output = _maybe_parse_json(raw_page)
+            if checkpoint and not (isinstance(page_output, dict) and page_output.get("error")):
+                checkpoint.save("ocr_page", page_output, idx + 1)
+        pages_list.append({"page_number": idx + 1, "file": image_path.name, "model_output": page_output})
+    ocr_parsed = {"mode": "per_image", "results": pages_list}
+    return ocr_parsed, json.dumps(ocr_parsed, ensure_ascii=False)
+
+
+def ocr_error(ocr_parsed: object) -> str | None:
+    """The error message when every OCR request failed, else None."""
+    if isinstance(ocr_parsed, dict) and ocr_parsed.get("error"):
+        return ocr_parsed.get("message") or ocr_parsed["error"]
+    if isinstance(ocr_parsed, dict) and ocr_parsed.get("mode") == "per_image":
+        outputs = [r.get("model_output") for r in ocr_parsed.get("results", [])]
+        if outputs and all(isinstance(o, dict) and o.get("error") for o in outputs):
+            return outputs[0].get("message") or outputs[0]["error"]
+    return None
+
+
+def _ocr_key(batch_ocr: bool) -> str:
+    return "batch" if batch_ocr else "page"
+
+
+def _extraction_key(batch_ocr: bool, forced_type: str | None) -> str:
+    return f"{_ocr_key(batch_ocr)}-{forced_type or 'auto'}"
+
+
+def render_pages(pdf_path: Path, checkpoint: DocumentCheckpoint, dpi: int = 300) -> list[Path]:
+    """Render a PDF into the checkpoint directory, or reuse a completed render."""
+    pages = checkpoint.load_pages(dpi)
+    if pages is None:
+        pages = pdf_to_images(pdf_path, checkpoint.pages_dir(dpi), dpi)
+        checkpoint.save_pages(dpi, pages)
+    return pages
+
+
+def extract_document(
+    ocr_json_str: str,
+    checkpoint: DocumentCheckpoint,
+    batch_ocr: bool = True,
+    forced_type: str | None = None,
+) -> tuple[str, object]:
+    """Classify and extract, reusing checkpointed classification/extraction for this OCR."""
+    key = _extraction_key(batch_ocr, forced_type)
+    cached = checkpoint.load("extraction", key)
+    if isinstance(cached, dict) and cached.get("doc_type"):
+        tracing.annotate(extraction_cached=True)
+        return cached["doc_type"], cached["data"]
+
+    classification = checkpoint.load("classification", _ocr_key(batch_ocr)) or {}
+    doc_type, extracted = orchestrator_run(
+        ocr_json_str,
+        forced_type=forced_type,
+        classified_type=classification.get("doc_type"),
+        on_classified=lambda label: checkpoint.save("classification", {"doc_type": label}, _ocr_key(batch_ocr)),
+    )
+    if not (isinstance(extracted, dict) and "error" in extracted):
+        checkpoint.save("extraction", {"doc_type": doc_type, "data": extracted}, key)
+    return doc_type, extracted
+
+
+def _restorable(checkpoint: DocumentCheckpoint, save_stem: str, batch_ocr: bool, forced_type: str | None) -> bool:
+    """
+    Whether a completed document's outputs exist, or can be rewritten from its
+    OCR and extraction checkpoints. When not, the document is processed again.
+    """
+    if checkpoint.load("result", _extraction_key(batch_ocr, forced_type)) is None:
+        return False
+    if (OCR_OUTPUT_DIR / f"{save_stem}.json").exists() and (EXTRACTION_OUTPUT_DIR / f"{save_stem}.json").exists():
+        return True
+    extraction = checkpoint.load("extraction", _extraction_key(batch_ocr, forced_type))
+    return (
+        checkpoint.load("ocr_output", _ocr_key(batch_ocr)) is not None
+        and isinstance(extraction, dict)
+        and extraction.get("data") is not None
+    )
+
+
+def save_extraction(path: Path, data: object) -> None:
+    """Write an extraction output and record it in the metadata store (its sync() catches up on failure)."""
+    write_json_atomic(path, data)
+    try:
+        metadata_store.record_extraction(path, data)
+    except Exception:
+        pass
+
+
+@tracing.traced("document")
+def process_pdf(
+    pdf_path: str | Path,
+    forced_type: str | None = None,
+    batch_ocr: bool = True,
+    dpi: int = 300,
+    save_stem: str | None = None,
+    progress=None,
+) -> dict:
+    """
+    Run one PDF through every stage, resuming from its checkpoints.
+
+    progress(stage, detail=None, fraction=0.0) is called at each stage (and OCR
+    page) boundary, fraction being how far into the stage it is; it may raise to
+    abort the run there.
+
+    Returns:
+        {"doc_type", "pages", "ocr_output", "extraction_output", "cached"}
+    """
+    pdf_path = Path(pdf_path)
+    save_stem = save_stem or pdf_path.stem
+    report = progress or (lambda _stage, _detail=None, _fraction=0.0: None)
+    checkpoint = DocumentCheckpoint.for_file(pdf_path)
+    tracing.annotate(file=pdf_path.name, stem=save_stem, digest=checkpoint.digest)
+    ocr_output_path = OCR_OUTPUT_DIR / f"{save_stem}.json"
+    extraction_output_path = EXTRACTION_OUTPUT_DIR / f"{save_stem}.json"
+
+    result = checkpoint.load("result", _extraction_key(batch_ocr, forced_type))
+    if isinstance(result, dict) and _restorable(checkpoint, save_stem, batch_ocr, forced_type):
+        # Unchanged document: no model calls, just make sure this name has its outputs.
+        tracing.annotate(cached=True, doc_type=result.get("doc_type"))
+        if not ocr_output_path.exists() or not extraction_output_path.exists():
+            with tracing.span("save", restored=True):
+                ocr_raw = checkpoint.load("ocr_output", _ocr_key(batch_ocr))
+                extraction = checkpoint.load("extraction", _extraction_key(batch_ocr, forced_type)) or {}
+                write_json_atomic(ocr_output_path, ocr_raw)
+                save_extraction(extraction_output_path, extraction.get("data"))
+        return {**result, "ocr_output": str(ocr_output_path), "extraction_output": str(extraction_output_path), "cached": True}
+
+    report("render")
+    image_paths = render_pages(pdf_path, checkpoint, dpi)
+
+    report("ocr", f"{len(image_paths)} page(s)")
+    with usage_context(file=pdf_path.name):
+        ocr_parsed, ocr_json_str = ocr_document(
+            image_paths,
+            batch=batch_ocr,
+            on_page=lambda page, total: report("ocr", f"page {page}/{total}", (page - 1) / total),
+            checkpoint=checkpoint,
+        )
+    error = ocr_error(ocr_parsed)
+    if error:
+        raise RuntimeError(f"OCR failed: {error}")
+    # Saved now so the OCR is visible (and paid for once) even if extraction fails.
+    with tracing.span("save", output="ocr"):
+        checkpoint.save("ocr_output", ocr_parsed, _ocr_key(batch_ocr))
+        write_json_atomic(ocr_output_path, ocr_parsed)
+
+    report("extract")
+    with usage_context(file=pdf_path.name):
+        doc_type, extracted = extract_document(ocr_json_str, checkpoint, batch_ocr, forced_type)
+    if isinstance(extracted, dict) and "error" in extracted:
+        raise RuntimeError(f"Extraction failed: {extracted.get('message') or extracted['error']}")
+
+    report("save")
+    with tracing.span("save", output="extraction"):
+        save_extraction(extraction_output_path, extracted)
+        result = {"doc_type": doc_type, "pages": len(image_paths)}
+        checkpoint.save("result", result, _extraction_key(batch_ocr, forced_type))
+        checkpoint.drop_pages()
+    tracing.annotate(cached=False, doc_type=doc_type, pages=len(image_paths))
+    return {**result, "ocr_output": str(ocr_output_path), "extraction_output": str(extraction_output_path), "cached": False}
+
+
+class Stage:
+    """A pool of worker threads reading from one bounded queue and writing to the next."""
+
+    def __init__(self, name: str, fn, workers: int, inbox: queue.Queue, outbox: queue.Queue):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self._lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        self._remaining = len(self.threads)
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                # Put the marker back for sibling workers; the last one out closes the next queue.
+                self.inbox.put(_DONE)
+                with self._lock:
+                    self._remaining -= 1
+                    last = self._remaining == 0
+                if last:
+                    self.outbox.put(_DONE)
+                return
+            if not item.get("error") and not item.get("skipped"):
+                started = time.monotonic()
+                try:
+                    with tracing.attach(item.get("span")), usage_context(file=Path(item["pdf"]).name):
+                        self.fn(item)
+                except Exception as e:
+                    item["error"] = f"{self.name}: {type(e).__name__}: {e}"
+                elapsed = time.monotonic() - started
+                item.setdefault("timings", {})[self.name] = round(elapsed, 2)
+                with self._lock:
+                    self.busy_seconds += elapsed
+                    self.processed += 1
+            self.outbox.put(item)
+
+
+class BatchStage(Stage):
+    """
+    One worker that takes up to batch_size items at a time (waiting up to linger
+    seconds for more to arrive) and calls fn with the list.
+    """
+
+    def __init__(self, name: str, fn, batch_size: int, linger: float, inbox: queue.Queue, outbox: queue.Queue):
+        super().__init__(name, fn, 1, inbox, outbox)
+        self.batch_size = max(1, batch_size)
+        self.linger = linger
+
+    def _work(self) -> None:
+        finished = False
+        while not finished:
+            item = self.inbox.get()
+            if item is _DONE:
+                break
+            batch = [item]
+            linger_until = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.inbox.get(timeout=max(0.0, linger_until - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    finished = True
+                    break
+                batch.append(item)
+
+            work = [i for i in batch if not i.get("error") and not i.get("skipped")]
+            if work:
+                started = time.monotonic()
+                try:
+                    self.fn(work)
+                except Exception as e:
+                    for i in work:
+                        i["error"] = f"{self.name}: {type(e).__name__}: {e}"
+                elapsed = time.monotonic() - started
+                for i in work:
+                    i.setdefault("timings", {})[self.name] = round(elapsed, 2)
+                self.busy_seconds += elapsed
+                self.processed += len(work)
+            for i in batch:
+                self.outbox.put(i)
+        self.outbox.put(_DONE)
+
+
+def _render_traced(pdf_path: str, output_dir: Path, dpi: int, parent: tracing.Span | None) -> list[Path]:
+    """pdf_to_images in a render process, with its spans parented to the document's trace."""
+    with tracing.attach(parent):
+        return pdf_to_images(pdf_path, output_dir, dpi)
+
+
+def run_pipeline(
+    pdf_paths: list[Path],
+    forced_type: str | None = None,
+    batch_ocr: bool = True,
+    render_workers: int = 2,
+    ocr_workers: int = 4,
+    extract_workers: int = 4,
+    queue_size: int = 8,
+    dpi: int = 300,
+    force: bool = False,
+) -> list[dict]:
+    """
+    Run PDFs through render → OCR → classify (batched) → extract concurrently.
+
+    Returns:
+        One result dict per PDF (stem, doc_type, outputs, per-stage timings, error).
+    """
+    render_pool = ProcessPoolExecutor(max_workers=max(1, render_workers))
+
+    def render(item: dict) -> None:
+        checkpoint = item["checkpoint"] = DocumentCheckpoint.for_file(item["pdf"])
+        if force:
+            shutil.rmtree(checkpoint.dir, ignore_errors=True)
+        elif _restorable(checkpoint, item["stem"], batch_ocr, forced_type):
+            # Unchanged and already processed: restores outputs without model calls
+            # (process_pdf records its own trace, so this one is dropped).
+            item.pop("span", None)
+            with tracing.attach(None):
+                item.update(process_pdf(item["pdf"], forced_type, batch_ocr, dpi), skipped=True)
+            return
+        item["span"].set(digest=checkpoint.digest)
+        pages = checkpoint.load_pages(dpi)
+        if pages is None:
+            pages = render_pool.submit(
+                _render_traced, item["pdf"], checkpoint.pages_dir(dpi), dpi, tracing.context()
+            ).result()
+            checkpoint.save_pages(dpi, pages)
+        item["images"] = pages
+
+    def ocr(item: dict) -> None:
+        checkpoint = item["checkpoint"]
+        ocr_parsed, item["ocr_json_str"] = ocr_document(item["images"], batch=batch_ocr, checkpoint=checkpoint)
+        error = ocr_error(ocr_parsed)
+        if error:
+            raise RuntimeError(error)
+        item["ocr_output"] = str(OCR_OUTPUT_DIR / f"{item['stem']}.json")
+        with tracing.span("save", output="ocr"):
+            checkpoint.save("ocr_output", ocr_parsed, _ocr_key(batch_ocr))
+            write_json_atomic(Path(item["ocr_output"]), ocr_parsed)
+
+    def classify(items: list[dict]) -> None:
+        """Batch-classify documents without a label yet; extract_document reads the labels from their checkpoints."""
+        if forced_type:
+            return
+        todo = [
+            i for i in items
+            if i["checkpoint"].load("classification", _ocr_key(batch_ocr)) is None
+            and i["checkpoint"].load("extraction", _extraction_key(batch_ocr, forced_type)) is None
+        ]
+        if not todo:
+            return
+        try:
+            labels = classify_documents([i["ocr_json_str"] for i in todo])
+        except Exception as e:
+            # Not fatal: extraction classifies each document on its own.
+            print(f"  Batch classification failed ({type(e).__name__}: {e}); classifying per document")
+            return
+        for item, label in zip(todo, labels):
+            item["span"].set(batch_classified=len(todo))
+            if label != "unknown":
+                item["checkpoint"].save("classification", {"doc_type": label}, _ocr_key(batch_ocr))
+
+    def extract(item: dict) -> None:
+        checkpoint = item["checkpoint"]
+        item["doc_type"], extracted = extract_document(item.pop("ocr_json_str"), checkpoint, batch_ocr, forced_type)
+        if isinstance(extracted, dict) and "error" in extracted:
+            raise RuntimeError(extracted.get("message") or extracted["error"])
+        item["extraction_output"] = str(EXTRACTION_OUTPUT_DIR / f"{item['stem']}.json")
+        with tracing.span("save", output="extraction"):
+            save_extraction(Path(item["extraction_output"]), extracted)
+            checkpoint.save("result", {"doc_type": item["doc_type"], "pages": len(item["images"])}, _extraction_key(batch_ocr, forced_type))
+            checkpoint.drop_pages()
+
+    # Bounded queues between stages give backpressure: rendering pauses while OCR is saturated.
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(4)] + [queue.Queue()]
+    stages = [
+        Stage("render", render, render_workers, queues[0], queues[1]),
+        Stage("ocr", ocr, ocr_workers, queues[1], queues[2]),
+        BatchStage("classify", classify, CLASSIFY_BATCH_DOCUMENTS, CLASSIFY_LINGER_SECONDS, queues[2], queues[3]),
+        Stage("extract", extract, extract_workers, queues[3], queues[4]),
+    ]
+    for stage in stages:
+        stage.start()
+
+    def feed() -> None:
+        for pdf_path in pdf_paths:
+            span = tracing.start("document", file=pdf_path.name, stem=pdf_path.stem)
+            queues[0].put({"pdf": str(pdf_path), "stem": pdf_path.stem, "span": span})
+        queues[0].put(_DONE)
+
+    started = time.monotonic()
+    threading.Thread(target=feed, name="feed", daemon=True).start()
+
+    results: list[dict] = []
+    completed = 0
+    while True:
+        item = queues[4].get()
+        if item is _DONE:
+            break
+        if item.get("span"):
+            item["span"].set(doc_type=item.get("doc_type"), cached=False)
+            tracing.finish(item.pop("span"), item.get("error"))
+        results.append(item)
+        if item.get("skipped"):
+            print(f"  ↷ {item['stem']}: unchanged, restored from checkpoint")
+            continue
+        completed += 1
+        elapsed = time.monotonic() - started
+        timings = " ".join(f"{k}={v:.1f}s" for k, v in item.get("timings", {}).items())
+        if item.get("error"):
+            print(f"  ✗ {item['stem']}: {item['error']}")
+        else:
+            print(f"  ✓ {item['stem']} → {item['doc_type']} ({timings}) — {completed / elapsed * 60:.1f} docs/min")
+
+    render_pool.shutdown()
+
+    elapsed = time.monotonic() - started
+    failed = [r for r in results if r.get("error")]
+    skipped = sum(1 for r in results if r.get("skipped"))
+    print(f"\nProcessed {len(results) - skipped} PDF(s) in {elapsed:.1f}s "
+          f"({len(failed)} failed, {skipped} skipped)")
+    for stage in stages:
+        if stage.processed:
+            utilisation = stage.busy_seconds / (elapsed * len(stage.threads)) if elapsed else 0.0
+            print(f"  {stage.name:<8} {stage.processed} doc(s), avg {stage.busy_seconds / stage.processed:.1f}s, "
+                  f"{len(stage.threads)} worker(s), {utilisation:.0%} busy")
+    for r in failed:
+        print(f"  - {r['stem']}: {r['error']}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run PDFs through render → OCR → classify/extract concurrently")
+    parser.add_argument("inputs", nargs="+", help="PDF files and/or directories of PDFs")
+    parser.add_argument("--type", "-t", default=None, choices=list(AGENT_REGISTRY.keys()) + ["unknown"],
+                        help="Force document type (skip classification)")
+    parser.add_argument("--per-page", action="store_true", help="One OCR request per page instead of one per document")
+    parser.add_argument("--render-workers", type=int, default=2, help="Parallel PDF rendering processes")
+    parser.add_argument("--ocr-workers", type=int, default=4, help="Documents in OCR at once")
+    parser.add_argument("--extract-workers", type=int, default=4, help="Documents in extraction at once")
+    parser.add_argument("--queue-size", type=int, default=8, help="Capacity of each queue between stages")
+    parser.add_argument("--dpi", type=int, default=300, help="Render resolution")
+    parser.add_argument("--force", action="store_true", help="Discard checkpoints and reprocess every PDF")
+    args = parser.parse_args()
+
+    pdf_paths: list[Path] = []
+    for raw in args.inputs:
+        path = Path(raw)
+        if path.is_dir():
+            pdf_paths.extend(sorted(path.glob("*.pdf")))
+        elif path.is_file() and path.suffix.lower() == ".pdf":
+            pdf_paths.append(path)
+    if not pdf_paths:
+        print("ERROR: No PDF files found", file=sys.stderr)
+        sys.exit(1)
+
+    results = run_pipeline(
+        pdf_paths,
+        forced_type=args.type,
+        batch_ocr=not args.per_page,
+        render_workers=args.render_workers,
+        ocr_workers=args.ocr_workers,
+        extract_workers=args.extract_workers,
+        queue_size=args.queue_size,
+        dpi=args.dpi,
+        force=args.force,
+    )
+    sys.exit(1 if any(r.get("error") for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
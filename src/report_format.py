@@ -0,0 +1,205 @@
+"""
+Mapping of extraction JSON to the standard report format (REPORT_COLUMNS).
+
+Used by the Report Format page and by metadata_store, which keeps each
+extraction's report row so the page can query rows instead of re-mapping files.
+"""
+
+REPORT_COLUMNS = [
+    "No", "Company Name", "TIN No", "Types (Inv/CN)", "Invoice No",
+    "No. Invois Cukai", "Invoice Date", "Tarikh Invois", "No. Akaun",
+    "Lot No", "Location", "Account No", "Lease ID", "Unit No", "Project",
+    "Premise Address", "Contract No / Batch No", "Contract Account No",
+    "Description", "Jumlah perlu dibayar\n(Including tax)", "Amaun Elektrik",
+    "LHDN UUID", "Validate On", "Kwh Reading Before", "Kwh Reading After",
+    "Current Reading / Total Units",
+]
+
+
+def _safe(d: dict, *keys, default=""):
+    """Dig through nested dicts safely."""
+    cur = d
+    for k in keys:
+        if isinstance(cur, dict):
+            cur = cur.get(k, default)
+        else:
+            return default
+    return cur if cur not in (None, "") else default
+
+
+def format_money_with_currency(value: object, currency: str) -> str:
+    """Prefix an amount with its currency code unless it already carries it."""
+    if value in (None, ""):
+        return ""
+
+    text = str(value).strip()
+    if not text:
+        return ""
+
+    currency_code = (currency or "").strip().upper()
+    if not currency_code:
+        return text
+
+    if text.upper().startswith(f"{currency_code} ") or text.upper() == currency_code:
+        return text
+
+    return f"{currency_code} {text}"
+
+
+def _parse_lot_no(data: dict) -> str:
+    """Extract Lot No from bill_to or additional_fields."""
+    bill_to = _safe(data, "bill_to")
+    if isinstance(bill_to, str):
+        import re
+        m = re.search(r"Lot\s*No\.?\s*[:：]?\s*(\S+)", bill_to, re.IGNORECASE)
+        if m:
+            return m.group(1)
+    return _safe(data, "additional_fields", "Lot No")
+
+
+def _parse_unit_no(data: dict) -> str:
+    """Extract Unit No from line items or additional_fields."""
+    af = _safe(data, "additional_fields", "Unit No")
+    if af:
+        return af
+    for item in data.get("line_items", []):
+        desc = item.get("description", "") or item.get("product_description", "") or ""
+        import re
+        m = re.search(r"Unit\s*No\.?\s*[:：]?\s*(\S+)", desc, re.IGNORECASE)
+        if m:
+            return m.group(1)
+    return ""
+
+
+def _parse_location(data: dict) -> str:
+    """Extract location from line items description or bill_to."""
+    for item in data.get("line_items", []):
+        desc = item.get("description", "") or ""
+        if "Mall" in desc or "Hotel" in desc or "Plaza" in desc:
+            import re
+            m = re.search(r"(?:The\s+\w+\s+Mall|[\w\s]+Mall|[\w\s]+Hotel|[\w\s]+Plaza)", desc)
+            if m:
+                return m.group(0).strip()
+    return ""
+
+
+def _parse_kwh_readings(data: dict) -> tuple:
+    """Parse kWh meter readings from utility bill line items."""
+    readings_before, readings_after, total_units = [], [], []
+    for item in data.get("line_items", []):
+        desc = item.get("description", "") or ""
+        import re
+        m = re.search(r"Meter Readings?\s*([\d,]+(?:\.\d+)?)\s*[-–]\s*([\d,]+(?:\.\d+)?)", desc)
+        if m:
+            before = m.group(1).replace(",", "")
+            after = m.group(2).replace(",", "")
+            if before not in readings_before:
+                readings_before.append(before)
+            if after not in readings_after:
+                readings_after.append(after)
+        qty = item.get("quantity")
+        if qty and desc and "Meter" in desc:
+            total_units.append(str(qty))
+    return (
+        " / ".join(readings_before) if readings_before else "",
+        " / ".join(readings_after) if readings_after else "",
+        " / ".join(total_units) if total_units else "",
+    )
+
+
+def _electricity_amount(data: dict) -> str:
+    """Sum electricity charge amounts for utility bills."""
+    for item in data.get("line_items", []):
+        desc = (item.get("description", "") or "").lower()
+        if "electricity" in desc and item.get("amount"):
+            return str(item["amount"])
+    return ""
+
+
+def _build_description(data: dict) -> str:
+    """Build a short description from line items."""
+    descs = []
+    for item in data.get("line_items", []):
+        d = item.get("description") or item.get("product_description") or ""
+        first_line = d.split("\n")[0].strip()
+        if first_line and first_line not in descs:
+            descs.append(first_line)
+    return "; ".join(descs[:4]) + ("..." if len(descs) > 4 else "")
+
+
+def doc_type_label(data: dict) -> str:
+    """Return the document type label (Inv / CN / Utility / etc.)."""
+    dt = (_safe(data, "document_type") or "").lower()
+    if "credit" in dt:
+        return "CN"
+    if "utility" in dt:
+        return "Utility"
+    if "rental" in dt or "lease" in dt:
+        return "Rental"
+    if "statement" in dt:
+        return "SOA"
+    if "hotel" in dt:
+        return "Hotel"
+    if "travel" in dt:
+        return "Travel"
+    return "Inv"
+
+
+def map_extraction_to_report_row(data: dict, index: int) -> dict:
+    """Map a single extraction JSON to a report format row."""
+    af = data.get("additional_fields", {}) or {}
+    currency_code = str(_safe(data, "currency") or "").strip().upper()
+    kwh_before, kwh_after, total_units = _parse_kwh_readings(data)
+
+    invoice_no = (
+        _safe(data, "invoice_number")
+        or _safe(data, "document_number")
+        or _safe(data, "statement_number")
+        or ""
+    )
+    invoice_date = (
+        _safe(data, "invoice_date")
+        or _safe(data, "document_date")
+        or _safe(data, "statement_date")
+        or _safe(af, "Invoice Date")
+        or ""
+    )
+    account_no = (
+        _safe(data, "account_number")
+        or _safe(data, "customer_account")
+        or _safe(af, "Account No")
+        or _safe(data, "payment_info", "account_number")
+        or ""
+    )
+
+    return {
+        "No": index,
+        "Company Name": _safe(data, "vendor_name"),
+        "TIN No": _safe(af, "TIN No.") or _safe(af, "TIN No"),
+        "Types (Inv/CN)": doc_type_label(data),
+        "Invoice No": invoice_no,
+        "No. Invois Cukai": _safe(af, "No. Invois Cukai") or _safe(af, "Tax Invoice No"),
+        "Invoice Date": invoice_date,
+        "Tarikh Invois": invoice_date,
+        "No. Akaun": account_no,
+        "Lot No": _parse_lot_no(data),
+        "Location": _parse_location(data),
+        "Account No": account_no,
+        "Lease ID": _safe(af, "Lease ID"),
+        "Unit No": _parse_unit_no(data),
+        "Project": _safe(af, "Project") or _safe(af, "Project Name"),
+        "Premise Address": _safe(data, "service_address") or _safe(data, "bill_to"),
+        "Contract No / Batch No": _safe(af, "Contract No") or _safe(af, "Batch No") or _safe(af, "Contract No / Batch No"),
+        "Contract Account No": _safe(af, "Contract Account No"),
+        "Description": _build_description(data),
+        "Jumlah perlu dibayar\n(Including tax)": format_money_with_currency(
+            _safe(data, "grand_total") or _safe(data, "total_amount"),
+            currency_code,
+        ),
+        "Amaun Elektrik": format_money_with_currency(_electricity_amount(data), currency_code),
+        "LHDN UUID": _safe(af, "LHDN UUID") or _safe(af, "e-Invoice UUID"),
+        "Validate On": _safe(af, "Validate On") or _safe(af, "Validated On"),
+        "Kwh Reading Before": kwh_before,
+        "Kwh Reading After": kwh_after,
+        "Current Reading / Total Units": total_units,
+    }
@@ -0,0 +1,24 @@
+"""
+Shared fixtures. The modules under test live at the top of src/ and keep their
+state in the job queue SQLite database, so each test gets its own database file.
+
+Run from src/:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    """Point JOB_DB_PATH at a fresh database for the test."""
+    path = tmp_path / "jobs.db"
+    monkeypatch.setenv("JOB_DB_PATH", str(path))
+    return path
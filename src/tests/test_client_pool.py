@@ -0,0 +1,125 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from agents import client_pool
+from agents.client_pool import ClientPool, PoolMember
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class FakeClient:
+    """Answers each create() with the next scripted reply: an exception to raise, a callable to run, or a value."""
+
+    def __init__(self, *replies, default="ok"):
+        self.replies = list(replies)
+        self.default = default
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.replies.pop(0) if self.replies else self.default
+        if isinstance(reply, Exception):
+            raise reply
+        return reply() if callable(reply) else reply
+
+
+def _member(name, client, deployment="gpt-5.2-chat", **kwargs):
+    return PoolMember(name, client, deployment, **kwargs)
+
+
+@pytest.fixture
+def release():
+    """An event blocked calls wait on; set at teardown so background threads finish."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_calls_go_to_members_serving_the_model_under_their_deployment():
+    a, b = FakeClient(default="a"), FakeClient(default="b")
+    pool = ClientPool([_member("a", a, "gpt-4.1"), _member("b", b, "gpt52-eastus", model="gpt-5.2-chat")])
+
+    assert pool.chat.completions.create(model="gpt-5.2-chat", messages=[]) == "b"
+    assert b.calls == [{"model": "gpt52-eastus", "messages": []}]
+    assert pool.chat.completions.create(model="gpt-4.1", messages=[]) == "a"
+    with pytest.raises(RuntimeError, match="serves model 'gpt-4o'"):
+        pool.chat.completions.create(model="gpt-4o", messages=[])
+
+
+def test_retryable_error_fails_over_and_cools_the_member_down():
+    a, b = FakeClient(APIError(429, {"retry-after": "30"}), default="a"), FakeClient(default="b")
+    pool = ClientPool([_member("a", a, weight=2), _member("b", b)])
+
+    assert pool.create(model="gpt-5.2-chat") == "b"
+    assert pool.create(model="gpt-5.2-chat") == "b"
+    metrics = {m["member"]: m for m in pool.metrics()}
+    assert (metrics["a"]["throttled"], metrics["a"]["healthy"]) == (1, False)
+    assert 29 <= metrics["a"]["cooldown_seconds"] <= 30
+    assert (len(a.calls), metrics["b"]["successes"]) == (1, 2)
+
+
+def test_client_errors_are_not_retried():
+    a, b = FakeClient(APIError(400)), FakeClient()
+    pool = ClientPool([_member("a", a), _member("b", b)])
+
+    with pytest.raises(APIError):
+        pool.create(model="gpt-5.2-chat")
+    assert b.calls == []
+    assert pool.metrics()[0]["healthy"]
+
+
+def test_single_member_rides_out_transient_errors(monkeypatch):
+    monkeypatch.setattr(client_pool, "RETRY_WAIT_MAX_SECONDS", 0.01)
+    flaky = FakeClient(APIError(503), ConnectionError("reset"), default="ok")
+    assert ClientPool([_member("a", flaky)], retries=2).create(model="gpt-5.2-chat") == "ok"
+    assert len(flaky.calls) == 3
+
+    down = FakeClient(*[APIError(503) for _ in range(5)])
+    with pytest.raises(APIError):
+        ClientPool([_member("a", down)], retries=1).create(model="gpt-5.2-chat")
+    assert len(down.calls) == 2
+
+
+def _slow_pool(release, **kwargs):
+    slow = FakeClient(default=lambda: release.wait(5) and "slow")
+    fast = FakeClient(default="fast")
+    pool = ClientPool([_member("slow", slow), _member("fast", fast)], **kwargs)
+    for _ in range(client_pool.HEDGE_MIN_SAMPLES):
+        pool.record_latency("ocr", 0.05)
+    return pool, slow, fast
+
+
+def test_slow_call_is_hedged_on_another_member(release):
+    pool, slow, fast = _slow_pool(release, hedging=True, hedge_budget=1.0)
+
+    assert pool.create(stage="ocr", model="gpt-5.2-chat") == "fast"
+    assert pool.last_call()["endpoint"] == "fast" and pool.last_call()["hedged"]
+    stats = {row["stage"]: row for row in pool.stage_metrics()}["ocr"]
+    assert (stats["requests"], stats["hedges"], stats["hedge_wins"]) == (1, 1, 1)
+    assert (len(slow.calls), len(fast.calls)) == (1, 1)
+
+
+def test_hedges_stay_within_budget(release):
+    pool, _slow, fast = _slow_pool(release, hedging=True, hedge_budget=0.0)
+    threading.Timer(0.3, release.set).start()
+
+    assert pool.create(stage="ocr", model="gpt-5.2-chat") == "slow"
+    assert fast.calls == [] and not pool.last_call()["hedged"]
+
+
+def test_deadline_abandons_a_stuck_call(release):
+    stuck = FakeClient(default=lambda: release.wait(5) and "late")
+    pool = ClientPool([_member("a", stuck)], deadlines={"classify": 0.2})
+
+    with pytest.raises(TimeoutError, match="classify call exceeded its 0.2s deadline"):
+        pool.create(stage="classify", model="gpt-5.2-chat")
+    assert 0 < stuck.calls[0]["timeout"] <= 0.2
+    assert {row["stage"]: row for row in pool.stage_metrics()}["classify"]["deadline_exceeded"] == 1
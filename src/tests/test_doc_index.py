@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+import doc_index
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch, job_db):
+    """An empty docs/database folder; fingerprint() returns whatever the test puts in FINGERPRINTS by file name."""
+    folder = tmp_path / "database"
+    folder.mkdir()
+    monkeypatch.setattr(doc_index, "DATABASE_DIR", folder)
+    fingerprints = {}
+    monkeypatch.setattr(doc_index, "fingerprint", lambda path: fingerprints[path.name])
+    return folder, fingerprints
+
+
+def _store(database, name, text_simhash=None, image_dhash=None, content=None):
+    folder, fingerprints = database
+    path = folder / name
+    path.write_bytes(content or name.encode())
+    fingerprints[name] = {"pages": 1, "text_simhash": text_simhash, "image_dhash": image_dhash}
+    return doc_index.register(path)
+
+
+def _flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_bands_cover_every_bit_once():
+    value = random.Random(1).getrandbits(64)
+    bands = doc_index._bands(value)
+    assert len(bands) == doc_index.FINGERPRINT_BANDS
+    rebuilt, start = 0, 0
+    for band, bits in bands:
+        width = 64 // doc_index.FINGERPRINT_BANDS + (band < 64 % doc_index.FINGERPRINT_BANDS)
+        rebuilt |= bits << start
+        start += width
+    assert (start, rebuilt) == (64, value)
+
+
+def test_hashes_closer_than_the_band_count_share_a_band():
+    rng = random.Random(2)
+    for _ in range(200):
+        value = rng.getrandbits(64)
+        other = _flip(value, rng.sample(range(64), doc_index.FINGERPRINT_BANDS - 1))
+        assert set(doc_index._bands(value)) & set(doc_index._bands(other))
+
+
+def test_register_flags_near_duplicates_by_text(database):
+    base = random.Random(3).getrandbits(64)
+    first = _store(database, "first.pdf", text_simhash=base)
+    close = _store(database, "close.pdf", text_simhash=_flip(base, [0, 20, 40, 63]))
+    far = _store(database, "far.pdf", text_simhash=_flip(base, range(0, 64, 4)))
+
+    assert first["similar_to"] is None
+    assert (close["similar_to"], close["similarity"]) == (first["digest"], round(1 - 4 / 64, 3))
+    assert far["similar_to"] is None
+    assert [d["file_name"] for d in doc_index.similar_documents()] == ["close.pdf"]
+
+
+def test_text_layer_decides_over_page_image(database):
+    base = random.Random(4).getrandbits(64)
+    _store(database, "template_a.pdf", text_simhash=base, image_dhash=123)
+    other = _store(database, "template_b.pdf", text_simhash=_flip(base, range(0, 64, 3)), image_dhash=123)
+    scan = _store(database, "scan.pdf", image_dhash=_flip(123, [5, 60]))
+
+    assert other["similar_to"] is None
+    assert scan["similar_to"] is not None
+
+
+def test_register_links_byte_identical_uploads(database):
+    original = _store(database, "invoice.pdf", content=b"%PDF same bytes")
+    duplicate = _store(database, "invoice (1).pdf", content=b"%PDF same bytes")
+
+    assert duplicate["digest"] == original["digest"]
+    assert duplicate["file_name"] == "invoice.pdf"
+    assert doc_index.aliases(original["digest"]) == ["invoice (1).pdf"]
+    assert doc_index.lookup_file("invoice (1).pdf")["file_name"] == "invoice.pdf"
+
+
+def test_similar_documents_skip_deleted_files(database):
+    folder, _fingerprints = database
+    base = random.Random(5).getrandbits(64)
+    _store(database, "gone.pdf", text_simhash=base)
+    (folder / "gone.pdf").unlink()
+
+    assert _store(database, "new.pdf", text_simhash=_flip(base, [1]))["similar_to"] is None
@@ -0,0 +1,174 @@
+import time
+
+import pytest
+
+import job_queue
+
+
+def _age(job_id: int, **columns) -> None:
+    assignments = ", ".join(f"{name} = ?" for name in columns)
+    with job_queue.connect() as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id))
+
+
+def test_claim_runs_jobs_oldest_first_and_completes(job_db):
+    first = job_queue.enqueue("/tmp/a.pdf", {"batch_ocr": True})
+    second = job_queue.enqueue("/tmp/b.pdf")
+
+    job = job_queue.claim("w1")
+    assert job["id"] == first
+    assert job["status"] == job_queue.RUNNING
+    assert job["attempts"] == 1
+    assert job["options"] == {"batch_ocr": True}
+
+    job_queue.complete(first, {"ocr_output": "a.json"})
+    done = job_queue.get_job(first)
+    assert done["status"] == job_queue.SUCCEEDED
+    assert done["result"] == {"ocr_output": "a.json"}
+
+    assert job_queue.claim("w1")["id"] == second
+    assert job_queue.claim("w1") is None
+
+
+def test_fail_retries_with_backoff_until_attempts_run_out(job_db):
+    job_id = job_queue.enqueue("/tmp/a.pdf", max_attempts=2)
+
+    job_queue.claim("w1")
+    assert job_queue.fail(job_id, "boom") == job_queue.QUEUED
+    assert job_queue.get_job(job_id)["available_at"] > time.time()
+    assert job_queue.claim("w1") is None  # still backing off
+
+    _age(job_id, available_at=0)
+    job_queue.claim("w1")
+    assert job_queue.fail(job_id, "boom again") == job_queue.FAILED
+    failed = job_queue.get_job(job_id)
+    assert failed["error"] == "boom again"
+    assert failed["finished_at"] is not None
+
+
+def test_cancel_queued_and_running(job_db):
+    queued = job_queue.enqueue("/tmp/a.pdf")
+    running = job_queue.enqueue("/tmp/b.pdf")
+    job_queue.cancel(queued)
+    job_queue.claim("w1")
+    job_queue.cancel(running)
+
+    assert job_queue.get_job(queued)["status"] == job_queue.CANCELLED
+    with pytest.raises(job_queue.JobCancelled):
+        job_queue.update_progress(running, "ocr", 10)
+    assert job_queue.fail(running, "stopped") == job_queue.CANCELLED
+
+
+def test_requeue_stale_requeues_jobs_with_attempts_left(job_db):
+    job_id = job_queue.enqueue("/tmp/a.pdf", max_attempts=3)
+    job_queue.claim("w1")
+    _age(job_id, heartbeat_at=0)
+
+    assert job_queue.requeue_stale() == (1, 0)
+    job = job_queue.get_job(job_id)
+    assert job["status"] == job_queue.QUEUED
+    assert job["worker_id"] is None
+    assert job_queue.claim("w2")["attempts"] == 2
+
+
+def test_requeue_stale_fails_jobs_out_of_attempts(job_db):
+    job_id = job_queue.enqueue("/tmp/crashes-worker.pdf", max_attempts=1)
+    job_queue.claim("w1")
+    _age(job_id, heartbeat_at=0)
+
+    assert job_queue.requeue_stale() == (0, 1)
+    job = job_queue.get_job(job_id)
+    assert job["status"] == job_queue.FAILED
+    assert job["error"] == "worker lost"
+    assert job_queue.claim("w2") is None
+
+
+def test_requeue_stale_leaves_live_jobs_alone(job_db):
+    job_queue.enqueue("/tmp/a.pdf")
+    job_queue.claim("w1")
+    assert job_queue.requeue_stale() == (0, 0)
+
+
+def test_latest_jobs_by_file_filters_names(job_db):
+    job_queue.enqueue("/tmp/a.pdf")
+    newer = job_queue.enqueue("/tmp/a.pdf")
+    job_queue.enqueue("/tmp/b.pdf")
+
+    latest = job_queue.latest_jobs_by_file(["a.pdf"])
+    assert list(latest) == ["a.pdf"]
+    assert latest["a.pdf"]["id"] == newer
+    assert set(job_queue.latest_jobs_by_file()) == {"a.pdf", "b.pdf"}
+
+
+def test_weighted_fair_queuing_shares_claims_by_weight(job_db, monkeypatch):
+    monkeypatch.setattr(job_queue, "PRIORITY_WEIGHTS", {"interactive": 8, "normal": 3, "bulk": 1})
+    monkeypatch.setattr(job_queue, "PRIORITY_CAPS", {})
+    job_queue.enqueue_many([f"/tmp/bulk{i}.pdf" for i in range(20)], priority=job_queue.BULK)
+    job_queue.enqueue_many([f"/tmp/ui{i}.pdf" for i in range(20)], priority=job_queue.INTERACTIVE)
+
+    claimed = [job_queue.claim("w1")["priority"] for _ in range(18)]
+    assert claimed[0] == job_queue.INTERACTIVE  # ties go to the higher class
+    assert claimed.count(job_queue.BULK) == 2  # bulk still progresses, at 1/8 the rate
+    assert claimed.count(job_queue.INTERACTIVE) == 16
+
+
+def test_idle_class_does_not_bank_virtual_time(job_db, monkeypatch):
+    monkeypatch.setattr(job_queue, "PRIORITY_CAPS", {})
+    job_queue.enqueue_many([f"/tmp/bulk{i}.pdf" for i in range(10)], priority=job_queue.BULK)
+    for _ in range(10):
+        job_queue.claim("w1")
+    # Interactive was idle meanwhile; on return it interleaves instead of monopolising by bulk's debt.
+    job_queue.enqueue_many([f"/tmp/bulk{i}.pdf" for i in range(10, 20)], priority=job_queue.BULK)
+    job_queue.enqueue_many([f"/tmp/ui{i}.pdf" for i in range(20)], priority=job_queue.INTERACTIVE)
+    claimed = [job_queue.claim("w1")["priority"] for _ in range(18)]
+    assert job_queue.BULK in claimed
+
+
+def test_class_cap_limits_running_jobs(job_db, monkeypatch):
+    monkeypatch.setattr(job_queue, "PRIORITY_CAPS", {"bulk": 1})
+    job_queue.enqueue_many(["/tmp/a.pdf", "/tmp/b.pdf"], priority=job_queue.BULK)
+    first = job_queue.claim("w1")
+    assert job_queue.claim("w2") is None
+
+    job_queue.complete(first["id"], {})
+    assert job_queue.claim("w2") is not None
+
+
+def test_fractional_cap_is_a_share_of_live_worker_slots(job_db, monkeypatch):
+    monkeypatch.setattr(job_queue, "PRIORITY_CAPS", {"bulk": 0.5})
+    job_queue.worker_heartbeat("w1", pid=1, slots=4)
+    job_queue.enqueue_many([f"/tmp/bulk{i}.pdf" for i in range(4)], priority=job_queue.BULK)
+
+    assert job_queue.claim("w1") is not None
+    assert job_queue.claim("w1") is not None
+    assert job_queue.claim("w1") is None
+
+
+def test_waiting_higher_class_job_preempts_at_request_boundary(job_db, monkeypatch):
+    monkeypatch.setattr(job_queue, "PRIORITY_CAPS", {})
+    bulk = job_queue.enqueue("/tmp/backfill.pdf", priority=job_queue.BULK)
+    job_queue.claim("w1")
+    urgent = job_queue.enqueue("/tmp/upload.pdf", priority=job_queue.INTERACTIVE)
+
+    job_queue.update_progress(bulk, "ocr", 10)  # the upload has not waited long enough yet
+
+    _age(urgent, available_at=time.time() - job_queue.PREEMPT_AFTER_SECONDS - 1)
+    with pytest.raises(job_queue.JobPreempted) as preempted:
+        job_queue.update_progress(bulk, "ocr", 20)
+    assert preempted.value.next_job["id"] == urgent
+    assert preempted.value.next_job["worker_id"] == "w1"
+
+    requeued = job_queue.get_job(bulk)
+    assert requeued["status"] == job_queue.QUEUED
+    assert requeued["attempts"] == 0  # a preemption does not use up an attempt
+    assert requeued["preemptions"] == 1
+
+
+def test_top_class_is_never_preempted(job_db, monkeypatch):
+    monkeypatch.setattr(job_queue, "PRIORITY_CAPS", {})
+    running = job_queue.enqueue("/tmp/a.pdf", priority=job_queue.INTERACTIVE)
+    job_queue.claim("w1")
+    waiting = job_queue.enqueue("/tmp/b.pdf", priority=job_queue.INTERACTIVE)
+    _age(waiting, available_at=0)
+    job_queue.update_progress(running, "ocr", 10)
+    assert job_queue.get_job(running)["status"] == job_queue.RUNNING
@@ -0,0 +1,206 @@
+import json
+import os
+
+import pytest
+
+import metadata_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, job_db):
+    """Empty output folders wired into metadata_store; returns (extraction_dir, ocr_dir, database_dir)."""
+    extraction_dir, ocr_dir, database_dir = (tmp_path / name for name in ("extraction_output", "ocr_output", "database"))
+    for folder in (extraction_dir, ocr_dir, database_dir):
+        folder.mkdir()
+    monkeypatch.setattr(metadata_store, "OCR_OUTPUT_DIR", ocr_dir)
+    monkeypatch.setattr(metadata_store, "DATABASE_DIR", database_dir)
+    monkeypatch.setattr(metadata_store, "DOC_TEAMS_PATH", database_dir / "doc_teams.json")
+    return extraction_dir, ocr_dir, database_dir
+
+
+def _write(path, data, mtime=None):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _invoice(number, vendor="ACME SDN BHD", total="1,250.00", **extra):
+    return {
+        "document_type": "Invoice",
+        "vendor_name": vendor,
+        "invoice_number": number,
+        "invoice_date": "04/02/2026",
+        "currency": "MYR",
+        "grand_total": total,
+        "line_items": [{"description": "Widgets", "quantity": "5", "unit_price": "250.00", "amount": total}],
+        **extra,
+    }
+
+
+def _sync(store):
+    extraction_dir, _ocr_dir, database_dir = store
+    return metadata_store.sync(extraction_dir, database_dir)
+
+
+def test_sync_stores_extractions_and_line_items(store):
+    extraction_dir = store[0]
+    _write(extraction_dir / "INV-1.json", _invoice("INV-1"))
+
+    assert _sync(store) == 1
+    total, rows = metadata_store.repository_items()
+    assert total == 1
+    row = rows[0]
+    assert (row["invoice_id"], row["vendor"], row["total"], row["team"]) == ("INV-1", "ACME SDN BHD", "MYR 1,250.00", "sales")
+    assert metadata_store.extraction_data("INV-1.json")["invoice_number"] == "INV-1"
+    assert metadata_store.line_items("INV-1.json")[0]["description"] == "Widgets"
+
+
+def test_sync_rereads_only_changed_files_and_drops_removed_ones(store):
+    extraction_dir = store[0]
+    _write(extraction_dir / "a.json", _invoice("A"), mtime=1_000)
+    _write(extraction_dir / "b.json", _invoice("B"), mtime=1_000)
+    assert _sync(store) == 2
+    assert _sync(store) == 0
+
+    _write(extraction_dir / "a.json", _invoice("A", vendor="NEW VENDOR"), mtime=2_000)
+    (extraction_dir / "b.json").unlink()
+    assert _sync(store) == 2
+    _total, rows = metadata_store.repository_items()
+    assert [(r["source_file"], r["vendor"]) for r in rows] == [("a.json", "NEW VENDOR")]
+    assert metadata_store.line_items("b.json") == []
+
+
+def test_sync_keeps_last_good_version_of_invalid_json(store):
+    extraction_dir = store[0]
+    _write(extraction_dir / "a.json", _invoice("A"), mtime=1_000)
+    _sync(store)
+
+    (extraction_dir / "a.json").write_text("{ half written", encoding="utf-8")
+    _sync(store)
+    assert metadata_store.extraction_data("a.json")["invoice_number"] == "A"
+
+
+def test_sync_skips_files_that_are_not_extractions(store):
+    extraction_dir = store[0]
+    _write(extraction_dir / "batch_manifest.json", {"files": {}})
+    _write(extraction_dir / "bank_matching_results.json", [])
+    _write(extraction_dir / "a.json", _invoice("A"))
+
+    assert _sync(store) == 1
+    assert metadata_store.repository_filters()["count"] == 1
+
+
+def test_sync_lists_documents_with_their_team(store):
+    extraction_dir, _ocr_dir, database_dir = store
+    for name in ("inv.pdf", "TNB.pdf", "assigned.pdf"):
+        (database_dir / name).write_bytes(b"%PDF-1.4")
+    _write(extraction_dir / "TNB.json", _invoice("T", document_type="Utility Bill"))
+    metadata_store.assign_team("assigned.pdf", "rental")
+    _sync(store)
+
+    total, docs = metadata_store.documents(sort="file_name", descending=False)
+    assert total == 3
+    assert {d["file_name"]: d["team"] for d in docs} == {"assigned.pdf": "rental", "inv.pdf": "sales", "TNB.pdf": "rental"}
+    assert metadata_store.team_for("TNB.pdf") == "rental"
+    assert [d["file_name"] for d in metadata_store.documents(role="sales")[1]] == ["inv.pdf"]
+
+    (database_dir / "inv.pdf").unlink()
+    _sync(store)
+    assert metadata_store.documents()[0] == 2
+
+
+def test_statuses_survive_and_filter_rows(store):
+    extraction_dir = store[0]
+    _write(extraction_dir / "a.json", _invoice("A"))
+    _write(extraction_dir / "b.json", _invoice("B"))
+    _sync(store)
+    metadata_store.set_status("a.json", metadata_store.PROCESSING, "Approved")
+    metadata_store.set_status("a.json", metadata_store.REVIEW, "verified")
+
+    assert metadata_store.statuses(metadata_store.REVIEW) == {"a.json": "verified"}
+    total, rows = metadata_store.repository_items(status="Approved")
+    assert (total, rows[0]["source_file"]) == (1, "a.json")
+    assert metadata_store.repository_items(status=metadata_store.DEFAULT_STATUS[metadata_store.PROCESSING])[0] == 1
+
+
+def _searchable_store(store):
+    extraction_dir, ocr_dir, _database_dir = store
+    _write(extraction_dir / "TNB_extracted.json", _invoice("TNB-77", vendor="TENAGA NASIONAL BERHAD", total="3,474.41",
+                                                           document_type="Utility Bill"))
+    _write(extraction_dir / "acme.json", _invoice("AC-1"))
+    _write(ocr_dir / "acme.json", {"pages": [{"sections": [{"type": "paragraph", "content": "Delivered to Kota Kinabalu warehouse"}]}]})
+    _sync(store)
+
+
+def test_search_matches_field_prefixes_and_plain_amounts(store):
+    _searchable_store(store)
+
+    total, rows = metadata_store.search("tenaga")
+    assert (total, rows[0]["source_file"]) == (1, "TNB_extracted.json")
+    assert "**" in rows[0]["snippet"]
+    assert metadata_store.search("3474.41")[1][0]["invoice_id"] == "TNB-77"
+    assert metadata_store.search("3,474.4")[0] == 1
+    assert metadata_store.search("widg")[0] == 2
+    assert metadata_store.search("tenaga acme") == (0, [])
+    assert metadata_store.search("  ") == (0, [])
+
+
+def test_search_covers_ocr_text_and_respects_filters(store):
+    _searchable_store(store)
+
+    assert [r["source_file"] for r in metadata_store.search("kinabalu")[1]] == ["acme.json"]
+    assert metadata_store.search("tenaga", role="sales")[0] == 0
+    assert metadata_store.search("tenaga", role="rental")[0] == 1
+    assert metadata_store.search("widgets", vendor="ACME SDN BHD")[0] == 1
+
+
+def test_search_pages_results_best_match_first(store):
+    extraction_dir = store[0]
+    for i in range(5):
+        _write(extraction_dir / f"doc{i}.json", _invoice(f"N{i}"))
+    _write(extraction_dir / "best.json", _invoice("ACME-ACME", vendor="ACME ACME ACME"))
+    _sync(store)
+
+    total, first = metadata_store.search("acme", limit=4)
+    _total, rest = metadata_store.search("acme", limit=4, offset=4)
+    assert total == 6
+    assert (len(first), len(rest)) == (4, 2)
+    assert first[0]["source_file"] == "best.json"
+    assert {r["source_file"] for r in first + rest} == {"best.json", *(f"doc{i}.json" for i in range(5))}
+
+
+def test_repository_items_sort_numerically_and_page_stably(store):
+    extraction_dir = store[0]
+    for i, total in enumerate(["900.00", "1,250.00", "80.50", "12,000.00", "900.00"]):
+        _write(extraction_dir / f"doc{i}.json", _invoice(f"N{i}", total=total), mtime=1_000 + i)
+    _write(extraction_dir / "no_total.json", _invoice("N9", total=""), mtime=2_000)
+    _sync(store)
+
+    _total, rows = metadata_store.repository_items(sort="total", descending=False)
+    assert [r["source_file"] for r in rows] == ["doc2.json", "doc0.json", "doc4.json", "doc1.json", "doc3.json", "no_total.json"]
+    _total, rows = metadata_store.repository_items(sort="total", descending=True)
+    assert rows[0]["source_file"] == "doc3.json" and rows[-1]["source_file"] == "no_total.json"
+
+    pages = [metadata_store.repository_items(limit=4, offset=offset) for offset in (0, 4)]
+    assert [total for total, _rows in pages] == [6, 6]
+    assert [r["source_file"] for _total, rows in pages for r in rows] == \
+        ["no_total.json", "doc4.json", "doc3.json", "doc2.json", "doc1.json", "doc0.json"]
+
+
+def test_documents_filter_by_name_and_team_and_page(store):
+    _extraction_dir, _ocr_dir, database_dir = store
+    for i, name in enumerate(["100%_paid.pdf", "1000_paid.pdf", "a_b.pdf", "axb.pdf", "lease.pdf"]):
+        (database_dir / name).write_bytes(b"%PDF-1.4" + b"0" * i)
+        os.utime(database_dir / name, (1_000 + i, 1_000 + i))
+    metadata_store.assign_team("lease.pdf", "rental")
+    _sync(store)
+
+    assert [d["file_name"] for d in metadata_store.documents(name="100%")[1]] == ["100%_paid.pdf"]
+    assert [d["file_name"] for d in metadata_store.documents(name="a_b")[1]] == ["a_b.pdf"]
+    assert [d["file_name"] for d in metadata_store.documents(team="rental")[1]] == ["lease.pdf"]
+    assert metadata_store.documents(role="rental")[0] == 1
+
+    total, page = metadata_store.documents(sort="size", descending=False, limit=2, offset=2)
+    assert total == 5
+    assert [d["file_name"] for d in page] == ["a_b.pdf", "axb.pdf"]
+    assert [d["file_name"] for d in metadata_store.documents(limit=1)[1]] == ["lease.pdf"]
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import usage_analytics
+
+
+@pytest.fixture
+def logs(tmp_path, monkeypatch):
+    """Empty OCR and extraction usage logs and rollup cache in tmp_path; returns (ocr_log, extraction_log)."""
+    ocr_log, extraction_log = tmp_path / "ocr_usage.jsonl", tmp_path / "extraction_usage.jsonl"
+    monkeypatch.setattr(usage_analytics, "OCR_USAGE_LOG", ocr_log)
+    monkeypatch.setattr(usage_analytics, "EXTRACTION_USAGE_LOG", extraction_log)
+    monkeypatch.setattr(usage_analytics, "ROLLUP_PATH", tmp_path / "analytics" / "usage_rollup.json")
+    monkeypatch.setattr(usage_analytics, "_state", None)
+    return ocr_log, extraction_log
+
+
+def _entry(mode="extraction_from_ocr", latency=1.5, **extra):
+    return {
+        "timestamp_utc": "2026-03-02T10:00:00Z", "request_mode": mode, "model": "gpt-4.1",
+        "prompt_tokens": 1000, "completion_tokens": 200, "total_tokens": 1200, "latency_seconds": latency, **extra,
+    }
+
+
+def _append(path, *entries, partial=""):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(e) + "\n" for e in entries) + partial)
+
+
+def _calls(**filters):
+    return sum(r["calls"] for r in usage_analytics.summary(["day"], filters=filters or None))
+
+
+def test_refresh_parses_only_appended_complete_lines(logs):
+    ocr_log, extraction_log = logs
+    _append(extraction_log, _entry(), _entry())
+    assert _calls() == 2
+
+    line = json.dumps(_entry(file="late.pdf"))
+    _append(extraction_log, _entry(), partial=line[:25])
+    assert _calls() == 3
+    assert usage_analytics.refresh()["logs"][str(extraction_log)]["offset"] < extraction_log.stat().st_size
+
+    _append(extraction_log, partial=line[25:] + "\n")
+    _append(ocr_log, _entry(mode="single_image", file_names=["scan_page_1.png"]), {"note": "no usage"}, partial="")
+    assert _calls() == 5
+    assert _calls(file="late.pdf") == 1
+    assert _calls(stage="ocr", file="scan") == 1
+
+
+def test_cached_rollup_is_not_counted_twice(logs, monkeypatch):
+    _ocr_log, extraction_log = logs
+    _append(extraction_log, _entry(), _entry())
+    assert _calls() == 2
+
+    monkeypatch.setattr(usage_analytics, "_state", None)
+    assert _calls() == 2
+    _append(extraction_log, _entry())
+    monkeypatch.setattr(usage_analytics, "_state", None)
+    assert _calls() == 3
+
+
+def test_replaced_or_truncated_log_is_reread(logs):
+    ocr_log, extraction_log = logs
+    _append(ocr_log, _entry(mode="single_image"))
+    _append(extraction_log, _entry(), _entry(), _entry())
+    assert _calls() == 4
+
+    extraction_log.write_text(json.dumps(_entry()) + "\n", encoding="utf-8")
+    assert _calls() == 2
+    assert usage_analytics.refresh(rebuild=True)["rows"] and _calls() == 2
+
+
+def test_lines_split_across_read_chunks(logs, monkeypatch):
+    _ocr_log, extraction_log = logs
+    monkeypatch.setattr(usage_analytics, "READ_CHUNK_BYTES", 300)
+    _append(extraction_log, *(_entry(file=f"doc{i}.pdf") for i in range(20)))
+
+    assert _calls() == 20
+    assert len(usage_analytics.summary(["file"])) == 20
+
+
+def test_summary_groups_prices_and_latency(logs):
+    _ocr_log, extraction_log = logs
+    _append(extraction_log, *(_entry(latency=1.0) for _ in range(19)), _entry(latency=40.0))
+    _append(extraction_log, _entry(mode="field_repair", latency=0.2, timestamp_utc="2026-03-03T00:00:00Z"))
+
+    rows = {r["stage"]: r for r in usage_analytics.summary(["stage"])}
+    extract = rows["extract"]
+    input_price, output_price = usage_analytics._prices("gpt-4.1")
+    assert extract["calls"] == 20 and extract["total_tokens"] == 24_000
+    assert extract["cost_usd"] == round(20 * (1000 * input_price + 200 * output_price) / 1e6, 4)
+    assert (extract["avg_latency_seconds"], extract["p95_latency_seconds"], extract["max_latency_seconds"]) == (2.95, 1.0, 40.0)
+    assert [r["stage"] for r in usage_analytics.summary(["stage"], since="2026-03-03")] == ["repair"]
+    with pytest.raises(ValueError):
+        usage_analytics.summary(["vendor"])
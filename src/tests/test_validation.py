@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from agents import validation
+
+OCR = json.dumps({"pages": [{"sections": [
+    {"type": "header", "content": "ACME SDN BHD  Tax Invoice"},
+    {"type": "paragraph", "content": "Invoice No: INV-9  Date: 04/02/2026"},
+    {"type": "paragraph", "content": "Thank you for your business"},
+    {"type": "table_header", "content": "Description | Qty | Amount"},
+    {"type": "table_row", "content": "Widgets | 5 | 1,000.00"},
+    {"type": "table_row", "content": "Delivery | 1 | 250.00"},
+    {"type": "subtotal", "content": "Total RM 1,250.00"},
+]}]})
+
+
+def _invoice(**overrides):
+    data = {
+        "vendor_name": "ACME SDN BHD",
+        "invoice_number": "INV-9",
+        "invoice_date": "04/02/2026",
+        "grand_total": "RM 1,250.00",
+        "line_items": [
+            {"description": "Widgets", "quantity": "5", "tax": "6%", "amount": "1,000.00"},
+            {"description": "Delivery", "quantity": "1", "amount": "250.00"},
+        ],
+    }
+    data.update(overrides)
+    return data
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stub repair model: answers with model.answer and records each user prompt and excerpt."""
+    class Model:
+        answer: dict = {}
+        calls: list[tuple[str, str]] = []
+
+    def call(system_prompt, user_prompt, excerpt, deployment, tier, request_mode=None):
+        Model.calls.append((user_prompt, excerpt))
+        return json.dumps(Model.answer)
+
+    Model.calls = []
+    monkeypatch.setattr(validation, "route", lambda stage, doc_type: ("mini", "test-deployment"))
+    monkeypatch.setattr(validation, "call_extraction_agent", call)
+    return Model
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1,234.50", 1234.5), ("RM 20.00", 20.0), ("(12.00)", -12.0), ("45.10 CR", 45.1), (7, 7.0), ("n/a", None), (None, None),
+])
+def test_parse_amount(text, expected):
+    assert validation.parse_amount(text) == expected
+
+
+def test_validate_accepts_a_complete_extraction():
+    assert validation.validate(_invoice(), "commercial_invoice") == []
+    assert validation.validate(_invoice(grand_total="1,250.04"), "commercial_invoice") == []
+
+
+def test_validate_lists_each_bad_path():
+    data = _invoice(invoice_number=" ", subtotal="see page 2")
+    data["line_items"][1] = {"description": "Delivery", "amount": "two fifty"}
+    issues = {i["path"]: i["problem"] for i in validation.validate(data, "commercial_invoice")}
+    assert issues == {
+        "invoice_number": "missing",
+        "subtotal": "not a number: 'see page 2'",
+        "line_items[1]": "not a number: amount",
+    }
+    assert validation.validate([], "commercial_invoice")[0]["path"] == ""
+    assert validation.validate(_invoice(line_items={}), "commercial_invoice") == [{"path": "line_items", "problem": "not an array"}]
+
+
+def test_validate_checks_item_sum_against_any_total():
+    issues = validation.validate(_invoice(grand_total="1,300.00"), "commercial_invoice")
+    assert issues == [{"path": "line_items", "problem": "item amounts sum to 1,250.00, expected grand_total=1,300.00"}]
+    assert validation.validate(_invoice(grand_total="1,300.00", subtotal="1,250.00"), "commercial_invoice") == []
+
+
+def test_repair_excerpt_keeps_only_relevant_sections():
+    ocr = json.loads(OCR)
+    fields = validation.build_repair_excerpt(ocr, ["invoice_number"], "commercial_invoice")
+    assert "Invoice No: INV-9" in fields and "ACME SDN BHD" in fields
+    assert "Thank you" not in fields and "Widgets" not in fields
+
+    items = validation.build_repair_excerpt(ocr, ["line_items[0]"], "commercial_invoice")
+    assert "Widgets | 5" in items and "Description | Qty" in items
+    assert "Invoice No" not in items
+    assert validation.build_repair_excerpt(ocr, ["invoice_number"], "commercial_invoice", token_budget=1) == ""
+
+
+def test_repair_merges_only_requested_paths(model):
+    data = _invoice(invoice_number="", vendor_name="ACME SDN BHD")
+    data["line_items"][1] = {"description": "Delivery"}
+    model.answer = {
+        "invoice_number": "INV-9",
+        "line_items[1]": {"description": "Delivery", "amount": "250.00"},
+        "vendor_name": "SOMEONE ELSE",
+    }
+    issues = validation.validate(data, "commercial_invoice")
+    validation.repair(data, "commercial_invoice", OCR, issues)
+
+    assert data["invoice_number"] == "INV-9"
+    assert data["line_items"][1]["amount"] == "250.00"
+    assert data["vendor_name"] == "ACME SDN BHD"
+    user_prompt, excerpt = model.calls[0]
+    assert "invoice_number, line_items[1]" in user_prompt
+    assert "Delivery | 1" in excerpt
+
+
+def test_repair_keeps_values_the_model_cannot_fill(model):
+    data = _invoice(subtotal="see page 2")
+    model.answer = {"subtotal": None}
+    validation.repair(data, "commercial_invoice", OCR, validation.validate(data, "commercial_invoice"))
+    assert data["subtotal"] == "see page 2"
+
+
+def test_validate_and_repair_stops_when_valid(model):
+    model.answer = {"invoice_number": "INV-9"}
+    data = validation.validate_and_repair(_invoice(invoice_number=None, validation_issues=["old"]), "commercial_invoice", OCR, max_rounds=3)
+    assert data["invoice_number"] == "INV-9" and "validation_issues" not in data
+    assert len(model.calls) == 1
+
+    validation.validate_and_repair(_invoice(), "commercial_invoice", OCR, max_rounds=3)
+    assert len(model.calls) == 1
+
+
+def test_validate_and_repair_records_remaining_issues(model):
+    model.answer = {}
+    data = validation.validate_and_repair(_invoice(invoice_number=None), "commercial_invoice", OCR, max_rounds=2)
+    assert data["validation_issues"] == ["invoice_number: missing"]
+    assert len(model.calls) == 2
+    assert validation.validate_and_repair({"error": "x"}, "commercial_invoice", OCR) == {"error": "x"}
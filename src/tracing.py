@@ -0,0 +1,274 @@
+"""
+Lightweight tracing spans for the document pipeline.
+
+    with tracing.span("ocr.request", model=deployment) as s:
+        ...
+        s.set(tokens=123)
+
+A span opened while no span is active starts a new trace (one per document in
+pipeline.process_pdf). Each finished span is appended to traces/spans.jsonl as
+one OTLP/JSON ExportTraceServiceRequest (resourceSpans[].scopeSpans[].spans[],
+typed attribute values, nanosecond timestamps as strings), the same line format
+the OpenTelemetry collector's file exporter writes, so the file can be replayed
+to an OTLP/HTTP endpoint. load_spans() flattens it back for the Traces page.
+The current span lives in a contextvar; worker threads take it along with
+context() / attach().
+
+Config:
+    TRACING        "0" disables span recording
+    TRACE_LOG_PATH JSONL file (default src/traces/spans.jsonl)
+"""
+
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+DEFAULT_TRACE_LOG_PATH = SRC_DIR / "traces" / "spans.jsonl"
+SERVICE_NAME = "watson"
+SCOPE_NAME = "watson.tracing"
+# OTLP enum values (JSON encodes enums as integers).
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+TAIL_BYTES = 8_000_000
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+_write_lock = threading.Lock()
+
+
+def _get_config_value(name: str) -> str | None:
+    value = os.getenv(name)
+    if value:
+        return value
+
+    try:
+        import streamlit as st
+
+        secret_value = st.secrets.get(name)
+        if secret_value:
+            return str(secret_value)
+    except Exception:
+        pass
+
+    return None
+
+
+ENABLED = (_get_config_value("TRACING") or "1") != "0"
+TRACE_LOG_PATH = Path(_get_config_value("TRACE_LOG_PATH") or DEFAULT_TRACE_LOG_PATH)
+
+
+def _any_value(value: object) -> dict:
+    """An attribute value as an OTLP AnyValue (64-bit ints are strings in OTLP/JSON)."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_any_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _from_any_value(value: dict) -> object:
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "arrayValue" in value:
+        return [_from_any_value(v) for v in value["arrayValue"].get("values", [])]
+    for key in ("stringValue", "boolValue", "doubleValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+def _key_values(attributes: dict) -> list[dict]:
+    return [{"key": k, "value": _any_value(v)} for k, v in attributes.items() if v is not None]
+
+
+class Span:
+    def __init__(self, name: str, parent: "Span | None", attributes: dict):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_otel(self) -> dict:
+        """The span as an OTLP/JSON ExportTraceServiceRequest."""
+        span_ = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _key_values(self.attributes),
+            "status": (
+                {"code": STATUS_CODE_ERROR, "message": self.error} if self.error else {"code": STATUS_CODE_OK}
+            ),
+        }
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _key_values({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": SCOPE_NAME}, "spans": [span_]}],
+            }]
+        }
+
+
+def _write(span: Span) -> None:
+    try:
+        line = json.dumps(span.to_otel(), ensure_ascii=False, default=str)
+        with _write_lock:
+            TRACE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except Exception:
+        pass
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as a child of the current span (or as a new trace's root)."""
+    if not ENABLED:
+        yield Span(name, None, attributes)
+        return
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current.reset(token)
+        _write(current)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole functions; add attributes with annotate()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attributes) -> None:
+    """Set attributes on the active span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def start(name: str, parent: "Span | None" = None, **attributes) -> Span:
+    """Open a span that is finished elsewhere (e.g. a document moving between worker threads)."""
+    return Span(name, parent, attributes)
+
+
+def finish(span_: Span, error: str | None = None) -> None:
+    span_.end_ns = time.time_ns()
+    span_.error = error
+    if ENABLED:
+        _write(span_)
+
+
+def context() -> "Span | None":
+    """The active span, to hand to another thread."""
+    return _current.get()
+
+
+@contextmanager
+def attach(parent: "Span | None"):
+    """Make parent the active span in this thread (for work handed off from another thread)."""
+    token = _current.set(parent)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _flatten(record: dict) -> list[dict]:
+    """
+    Spans of one log line (an OTLP/JSON export request) with plain values:
+    attributes as a dict, times as int nanoseconds, status code as "OK" / "ERROR".
+    """
+    spans = []
+    for resource_spans in record.get("resourceSpans") or []:
+        for scope_spans in resource_spans.get("scopeSpans") or []:
+            for s in scope_spans.get("spans") or []:
+                status = s.get("status") or {}
+                spans.append({
+                    **s,
+                    "startTimeUnixNano": int(s["startTimeUnixNano"]),
+                    "endTimeUnixNano": int(s.get("endTimeUnixNano") or s["startTimeUnixNano"]),
+                    "attributes": {a["key"]: _from_any_value(a.get("value") or {}) for a in s.get("attributes") or []},
+                    "status": {**status, "code": "ERROR" if status.get("code") == STATUS_CODE_ERROR else "OK"},
+                })
+    return spans
+
+
+def load_spans(path: Path | None = None, tail_bytes: int = TAIL_BYTES) -> list[dict]:
+    """Spans from the end of the trace log (most recent tail_bytes), flattened by _flatten()."""
+    path = path or TRACE_LOG_PATH
+    if not path.exists():
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(max(0, size - tail_bytes))
+        lines = f.read().decode("utf-8", errors="ignore").splitlines()
+    if size > tail_bytes:
+        lines = lines[1:]  # first line may be cut
+    spans = []
+    for line in lines:
+        try:
+            spans.extend(_flatten(json.loads(line)))
+        except Exception:
+            continue
+    return spans
+
+
+def traces(spans: list[dict]) -> dict[str, list[dict]]:
+    """Group spans by traceId, each sorted by start time."""
+    grouped: dict[str, list[dict]] = {}
+    for s in spans:
+        grouped.setdefault(s["traceId"], []).append(s)
+    for items in grouped.values():
+        items.sort(key=lambda s: s["startTimeUnixNano"])
+    return grouped
+
+
+def stage_percentiles(spans: list[dict]) -> list[dict]:
+    """p50/p95/max duration (seconds) and count per span name."""
+    durations: dict[str, list[float]] = {}
+    for s in spans:
+        if s.get("endTimeUnixNano"):
+            durations.setdefault(s["name"], []).append((s["endTimeUnixNano"] - s["startTimeUnixNano"]) / 1e9)
+    rows = []
+    for name, values in sorted(durations.items()):
+        values.sort()
+        rows.append({
+            "stage": name,
+            "count": len(values),
+            "p50_seconds": round(values[int(0.5 * (len(values) - 1))], 3),
+            "p95_seconds": round(values[int(0.95 * (len(values) - 1))], 3),
+            "max_seconds": round(values[-1], 3),
+        })
+    return rows
@@ -0,0 +1,271 @@
+"""
+Local cost and latency analytics over the token usage logs.
+
+Reads ocr_output/token_usage_log.jsonl and extraction_output/token_usage_log.jsonl
+(no Azure access needed) and rolls every call up by day, stage, mode, model,
+document type and file. The rollup and each log's byte offset are cached in
+analytics/usage_rollup.json, so a refresh only parses lines appended since the
+last one; a log that shrinks or is replaced is re-read from the start. Costs are
+priced at query time (cost_estimator prices), so changing MODEL_PRICES applies
+to history too.
+
+Usage:
+    python usage_analytics.py                    # totals by day
+    python usage_analytics.py --by stage,mode
+    python usage_analytics.py --by doc_type --since 2026-02-01
+    python usage_analytics.py --rebuild          # discard the cache and re-read the logs
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from cost_estimator import OCR_USAGE_LOG, EXTRACTION_USAGE_LOG, _prices
+
+SRC_DIR = Path(__file__).resolve().parent
+ROLLUP_PATH = SRC_DIR / "analytics" / "usage_rollup.json"
+ROLLUP_VERSION = 1
+
+DIMENSIONS = ("day", "stage", "mode", "model", "doc_type", "file")
+# Latency histogram bucket upper bounds (seconds); the last bucket is open-ended.
+LATENCY_BUCKETS = (0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+READ_CHUNK_BYTES = 8 << 20
+
+STAGE_BY_MODE = {
+    "single_image": "ocr",
+    "batch": "ocr_batch",
+    "classification": "classify",
+    "classification_batch": "classify",
+    "extraction_from_ocr": "extract",
+    "field_repair": "repair",
+}
+PAGE_IMAGE_SUFFIX = re.compile(r"_page_\d+\.\w+$")
+
+_lock = threading.Lock()
+_state: dict | None = None
+
+
+def _empty_state() -> dict:
+    return {"version": ROLLUP_VERSION, "logs": {}, "rows": {}}
+
+
+def _load_state() -> dict:
+    try:
+        state = json.loads(ROLLUP_PATH.read_text(encoding="utf-8"))
+        if state.get("version") == ROLLUP_VERSION:
+            return state
+    except Exception:
+        pass
+    return _empty_state()
+
+
+def _save_state(state: dict) -> None:
+    ROLLUP_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ROLLUP_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, ROLLUP_PATH)
+
+
+def _file_of(entry: dict) -> str:
+    """The source document: tagged by the pipeline, or derived from OCR page image names."""
+    if entry.get("file"):
+        return str(entry["file"])
+    names = entry.get("file_names") or []
+    if names:
+        return PAGE_IMAGE_SUFFIX.sub("", str(names[0]))
+    return "-"
+
+
+def _key(entry: dict) -> str:
+    mode = entry.get("request_mode") or "-"
+    values = (
+        str(entry.get("timestamp_utc") or "")[:10] or "-",
+        entry.get("stage") or STAGE_BY_MODE.get(mode, mode),
+        mode,
+        entry.get("model") or "-",
+        entry.get("doc_type") or "-",
+        _file_of(entry),
+    )
+    return "\t".join(values)
+
+
+def _bucket(seconds: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            return i
+    return len(LATENCY_BUCKETS)
+
+
+def _add(rows: dict, entry: dict) -> None:
+    row = rows.setdefault(_key(entry), {
+        "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+        "latency_sum": 0.0, "latency_count": 0, "latency_max": 0.0, "latency_hist": {},
+    })
+    row["calls"] += 1
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        row[field] += int(entry.get(field) or 0)
+    latency = entry.get("latency_seconds")
+    if isinstance(latency, (int, float)):
+        row["latency_sum"] += latency
+        row["latency_count"] += 1
+        row["latency_max"] = max(row["latency_max"], latency)
+        bucket = str(_bucket(latency))
+        row["latency_hist"][bucket] = row["latency_hist"].get(bucket, 0) + 1
+
+
+class _Rebuild(Exception):
+    pass
+
+
+def _ingest(state: dict, path: Path) -> bool:
+    """Parse lines appended to one log since its cached offset; True when anything changed."""
+    log = state["logs"].get(str(path)) or {"offset": 0, "inode": None}
+    try:
+        stat = path.stat()
+    except OSError:
+        return False
+    if stat.st_ino != log["inode"] or stat.st_size < log["offset"]:
+        # Replaced or truncated: its earlier rows can't be separated out, so start over.
+        if log["offset"]:
+            raise _Rebuild()
+        log = {"offset": 0, "inode": stat.st_ino}
+    if stat.st_size == log["offset"]:
+        state["logs"][str(path)] = log
+        return False
+
+    with open(path, "rb") as f:
+        f.seek(log["offset"])
+        while True:
+            chunk = f.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            end = chunk.rfind(b"\n")
+            if end < 0:
+                if len(chunk) < READ_CHUNK_BYTES:
+                    break  # a partial last line still being written
+                end = len(chunk) - 1
+            for line in chunk[:end + 1].splitlines():
+                try:
+                    entry = json.loads(line)
+                except Exception:
+                    continue
+                if isinstance(entry, dict) and entry.get("total_tokens") is not None:
+                    _add(state["rows"], entry)
+            log["offset"] += end + 1
+            f.seek(log["offset"])
+    state["logs"][str(path)] = log
+    return True
+
+
+def refresh(rebuild: bool = False) -> dict:
+    """Bring the rollup up to date with the logs and return it."""
+    global _state
+    with _lock:
+        if rebuild:
+            _state = _empty_state()
+        elif _state is None:
+            _state = _load_state()
+        try:
+            changed = [_ingest(_state, path) for path in (OCR_USAGE_LOG, EXTRACTION_USAGE_LOG)]
+        except _Rebuild:
+            _state = _empty_state()
+            changed = [_ingest(_state, path) for path in (OCR_USAGE_LOG, EXTRACTION_USAGE_LOG)]
+        if any(changed) or rebuild:
+            _save_state(_state)
+        return _state
+
+
+def _percentile(hist: dict, count: int, q: float, ceiling: float) -> float | None:
+    """Upper bound of the histogram bucket holding the q-th latency (at most the observed max)."""
+    if not count:
+        return None
+    target, seen = q * count, 0
+    for i in range(len(LATENCY_BUCKETS)):
+        seen += hist.get(str(i), 0)
+        if seen >= target:
+            return min(float(LATENCY_BUCKETS[i]), round(ceiling, 2))
+    return round(ceiling, 2)
+
+
+def summary(
+    group_by: list[str] | tuple[str, ...] = ("day",),
+    since: str | None = None,
+    until: str | None = None,
+    filters: dict | None = None,
+) -> list[dict]:
+    """
+    Calls, tokens, cost and latency grouped by any of DIMENSIONS.
+
+    Args:
+        group_by: dimension names, e.g. ["stage", "mode"].
+        since / until: inclusive ISO dates (YYYY-MM-DD).
+        filters: {dimension: value} to restrict to, e.g. {"stage": "extract"}.
+
+    Returns:
+        One dict per group with calls, prompt/completion/total tokens, cost_usd,
+        avg_latency_seconds, p95_latency_seconds (bucket upper bound) and
+        max_latency_seconds, sorted by cost descending.
+    """
+    for dim in group_by:
+        if dim not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension '{dim}'; expected one of {', '.join(DIMENSIONS)}")
+    state = refresh()
+    groups: dict[tuple, dict] = {}
+    with _lock:
+        items = list(state["rows"].items())
+    for key, row in items:
+        values = dict(zip(DIMENSIONS, key.split("\t")))
+        if since and values["day"] < since or until and values["day"] > until:
+            continue
+        if filters and any(values.get(dim) != value for dim, value in filters.items()):
+            continue
+        input_price, output_price = _prices(values["model"])
+        group = groups.setdefault(tuple(values[dim] for dim in group_by), {
+            **{dim: values[dim] for dim in group_by},
+            "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost_usd": 0.0,
+            "latency_sum": 0.0, "latency_count": 0, "latency_max": 0.0, "latency_hist": {},
+        })
+        for field in ("calls", "prompt_tokens", "completion_tokens", "total_tokens", "latency_sum", "latency_count"):
+            group[field] += row[field]
+        group["cost_usd"] += (row["prompt_tokens"] * input_price + row["completion_tokens"] * output_price) / 1e6
+        group["latency_max"] = max(group["latency_max"], row["latency_max"])
+        for bucket, count in row["latency_hist"].items():
+            group["latency_hist"][bucket] = group["latency_hist"].get(bucket, 0) + count
+
+    results = []
+    for group in groups.values():
+        hist, count = group.pop("latency_hist"), group.pop("latency_count")
+        latency_sum, latency_max = group.pop("latency_sum"), group.pop("latency_max")
+        results.append({
+            **group,
+            "cost_usd": round(group["cost_usd"], 4),
+            "avg_latency_seconds": round(latency_sum / count, 2) if count else None,
+            "p95_latency_seconds": _percentile(hist, count, 0.95, latency_max),
+            "max_latency_seconds": round(latency_max, 2) if count else None,
+        })
+    results.sort(key=lambda r: r["cost_usd"], reverse=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token, cost and latency rollups from the usage logs")
+    parser.add_argument("--by", default="day", help=f"Comma-separated dimensions: {', '.join(DIMENSIONS)}")
+    parser.add_argument("--since", default=None, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--until", default=None, help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the cached rollup and re-read the logs")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        refresh(rebuild=True)
+    dims = [d.strip() for d in args.by.split(",") if d.strip()]
+    rows = summary(dims, args.since, args.until)
+    width = max([len(" / ".join(str(r[d]) for d in dims)) for r in rows] + [10])
+    print(f"{'group':<{width}}  {'calls':>6}  {'tokens':>10}  {'cost':>9}  {'avg s':>6}  {'p95 s':>6}")
+    for r in rows:
+        label = " / ".join(str(r[d]) for d in dims)
+        avg = f"{r['avg_latency_seconds']:.1f}" if r["avg_latency_seconds"] is not None else "-"
+        p95 = f"{r['p95_latency_seconds']:g}" if r["p95_latency_seconds"] is not None else "-"
+        print(f"{label:<{width}}  {r['calls']:>6}  {r['total_tokens']:>10,}  ${r['cost_usd']:>8.4f}  {avg:>6}  {p95:>6}")
@@ -0,0 +1,131 @@
+"""
+Background worker for the pipeline job queue (see job_queue.py).
+
+Claims queued jobs and runs PDF → images → OCR → classify + extract for each
+(pipeline.process_pdf, so retries resume from the last checkpointed stage),
+reporting stage and progress to the queue and writing results to
+ocr_output/<stem>.json and extraction_output/<stem>.json. Start one or more:
+
+    python worker.py                  # one job at a time
+    python worker.py --concurrency 4  # four jobs in parallel in this process
+    python worker.py --once           # drain the queue, then exit
+
+Jobs are claimed by priority class (see job_queue.claim). A running job that is
+preempted at a request boundary goes back to the queue and this slot carries on
+with the higher-priority job it yielded to.
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+import job_queue
+from job_queue import JobCancelled, JobPreempted
+from pipeline import process_pdf
+
+POLL_INTERVAL_SECONDS = 2.0
+HEARTBEAT_INTERVAL_SECONDS = 15.0
+
+# Overall progress (percent) at the start of each stage.
+STAGE_PROGRESS = {"render": 5, "ocr": 20, "extract": 65, "save": 95}
+
+
+def process_job(job: dict) -> dict:
+    """Run the full pipeline for one job; raises JobCancelled at a stage boundary when cancelled."""
+    job_id = job["id"]
+    options = job["options"]
+
+    stages = list(STAGE_PROGRESS)
+
+    def progress(stage: str, detail: str | None = None, fraction: float = 0.0) -> None:
+        next_stage = stages[stages.index(stage) + 1] if stage != stages[-1] else None
+        span = (STAGE_PROGRESS[next_stage] if next_stage else 100) - STAGE_PROGRESS[stage]
+        job_queue.update_progress(job_id, stage, STAGE_PROGRESS[stage] + int(span * fraction), detail)
+
+    return process_pdf(
+        job["pdf_path"],
+        forced_type=options.get("forced_type"),
+        batch_ocr=options.get("batch_ocr", True),
+        save_stem=options.get("save_stem"),
+        progress=progress,
+    )
+
+
+def _run_one(job: dict) -> dict | None:
+    """Run a claimed job; returns the job to run next in this slot when it was preempted."""
+    job_id = job["id"]
+    print(f"[job {job_id}] {job['file_name']} [{job['priority']}] (attempt {job['attempts']}/{job['max_attempts']})")
+    try:
+        result = process_job(job)
+    except JobCancelled:
+        job_queue.mark_cancelled(job_id)
+        print(f"[job {job_id}] cancelled")
+        return None
+    except JobPreempted as e:
+        print(f"[job {job_id}] paused for {e.next_job['priority']} job {e.next_job['id']}; requeued")
+        return e.next_job
+    except Exception as e:
+        traceback.print_exc()
+        status = job_queue.fail(job_id, f"{type(e).__name__}: {e}")
+        print(f"[job {job_id}] failed → {status}")
+        return None
+    job_queue.complete(job_id, result)
+    print(f"[job {job_id}] done: {result['doc_type']}{' (unchanged, from checkpoint)' if result['cached'] else ''}")
+    return None
+
+
+def run_worker(concurrency: int = 1, once: bool = False) -> None:
+    """Claim and run jobs until interrupted (or, with once=True, until the queue is empty)."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        while not stop.is_set():
+            job_queue.worker_heartbeat(worker_id, os.getpid(), max(1, concurrency))
+            requeued, failed = job_queue.requeue_stale()
+            if requeued or failed:
+                print(f"Lost workers: requeued {requeued} job(s), failed {failed} out of attempts")
+            stop.wait(HEARTBEAT_INTERVAL_SECONDS)
+
+    def loop() -> None:
+        while not stop.is_set():
+            job = job_queue.claim(worker_id)
+            if job is None:
+                if once:
+                    return
+                stop.wait(POLL_INTERVAL_SECONDS)
+                continue
+            while job is not None:
+                job = _run_one(job)
+
+    threading.Thread(target=heartbeat, name="heartbeat", daemon=True).start()
+    print(f"Worker {worker_id} started with {concurrency} slot(s); queue: {job_queue.db_path()}")
+    threads = [threading.Thread(target=loop, name=f"slot-{i}") for i in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print("Stopping after the current job(s)...")
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        job_queue.remove_worker(worker_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run queued pipeline jobs")
+    parser.add_argument("--concurrency", "-c", type=int, default=1, help="Jobs to run in parallel in this process")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+    run_worker(concurrency=args.concurrency, once=args.once)
+
+
+if __name__ == "__main__":
+    main()